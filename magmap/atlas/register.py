@@ -49,7 +49,7 @@ import SimpleITK as sitk
 from skimage import filters, measure, morphology, transform
 
 from magmap.atlas import atlas_refiner, edge_seg, ontology, transformer
-from magmap.cv import cv_nd
+from magmap.cv import chunking, cv_nd
 from magmap.io import cli, df_io, export_regions, importer, libmag, sitk_io
 from magmap.plot import plot_2d, plot_3d
 from magmap.settings import config
@@ -1274,9 +1274,136 @@ def _setup_vols_df(df_path, max_level):
     return df, df_path, df_level_path
 
 
+def _load_vols_sample(img_path, suffix=None, max_level=None,
+                      extra_metrics=None):
+    """Load the data frame and registered images for a sample.
+    
+    Args:
+        img_path (str): Image path.
+        suffix (str): Modifier to append to end of ``img_path`` basename for
+            registered image files that were output to a modified name;
+            defaults to None.
+        max_level (int): Maximum ontological level to measure; defaults
+            to None.
+        extra_metrics (List[Enum]): List of enums from
+            :class:`config.MetricGroups` specifying additional stats;
+            defaults to None.
+    
+    Returns:
+        Tuple of the data frame, data frame path, data frame level path,
+        and tuple of the intensity image, labels image, labels edge image,
+        labels edge distances image, labels interior image, heat map,
+        blobs, sub-segmentation labels image, and spacing. Images are None
+        if the data frame is available and no stats require the images.
+    
+    """
+    # adjust image path with suffix
+    mod_path = img_path
+    if suffix is not None:
+        mod_path = libmag.insert_before_ext(img_path, suffix)
+    
+    # load data frame if available
+    df_path = "{}_volumes.csv".format(os.path.splitext(mod_path)[0])
+    df, df_path, df_level_path = _setup_vols_df(df_path, max_level)
+    
+    spacing = None
+    img_np = None
+    labels_img_np = None
+    labels_edge = None
+    dist_to_orig = None
+    labels_interior = None
+    heat_map = None
+    blobs = None
+    subseg = None
+    if (df is None or 
+            extra_metrics and config.MetricGroups.SHAPES in extra_metrics):
+        # open images registered to the main image; avoid opening if data
+        # frame is available and not taking any stats requiring images
+        
+        # open intensity image in priority: config > exp > atlas
+        atlas_suffix = config.reg_suffixes[config.RegSuffixes.ATLAS]
+        if not atlas_suffix:
+            atlas_suffix = config.RegNames.IMG_EXP.value
+        try:
+            img_sitk = sitk_io.load_registered_img(
+                mod_path, atlas_suffix, get_sitk=True)
+        except FileNotFoundError as e:
+            print(e)
+            libmag.warn("will load atlas image instead")
+            img_sitk = sitk_io.load_registered_img(
+                mod_path, config.RegNames.IMG_ATLAS.value, get_sitk=True)
+        img_np = sitk.GetArrayFromImage(img_sitk)
+        spacing = img_sitk.GetSpacing()[::-1]
+        
+        # load labels in order of priority: config > full labels
+        # > truncated labels; required so give exception if not found
+        labels_suffix = config.reg_suffixes[config.RegSuffixes.ANNOTATION]
+        if not labels_suffix:
+            labels_suffix = config.RegNames.IMG_LABELS.value
+        try:
+            labels_img_np = sitk_io.load_registered_img(
+                mod_path, labels_suffix)
+        except FileNotFoundError as e:
+            print(e)
+            libmag.warn(
+                "will attempt to load trucated labels image instead")
+            labels_img_np = sitk_io.load_registered_img(
+                mod_path, config.RegNames.IMG_LABELS_TRUNC.value)
+        
+        # load labels edge and edge distances images
+        try:
+            labels_edge = sitk_io.load_registered_img(
+                mod_path, config.RegNames.IMG_LABELS_EDGE.value)
+            dist_to_orig = sitk_io.load_registered_img(
+                mod_path, config.RegNames.IMG_LABELS_DIST.value)
+        except FileNotFoundError as e:
+            print(e)
+            libmag.warn("will ignore edge measurements")
+        
+        # load labels marker image
+        try:
+            labels_interior = sitk_io.load_registered_img(
+                mod_path, config.RegNames.IMG_LABELS_INTERIOR.value)
+        except FileNotFoundError as e:
+            print(e)
+            libmag.warn("will ignore label markers")
+        
+        # load heat map of nuclei per voxel if available
+        try:
+            heat_map = sitk_io.load_registered_img(
+                mod_path, config.RegNames.IMG_HEAT_MAP.value)
+        except FileNotFoundError as e:
+            print(e)
+            libmag.warn("will ignore nuclei stats")
+
+        if (extra_metrics and 
+                config.MetricGroups.POINT_CLOUD in extra_metrics):
+            # load blobs with coordinates, label IDs, and cluster IDs
+            # if available
+            try:
+                blobs = np.load(libmag.combine_paths(
+                    mod_path, config.SUFFIX_BLOB_CLUSTERS))
+                print(blobs)
+            except FileNotFoundError as e:
+                print(e)
+
+        # load sub-segmentation labels if available
+        try:
+            subseg = sitk_io.load_registered_img(
+                mod_path, config.RegNames.IMG_LABELS_SUBSEG.value)
+        except FileNotFoundError as e:
+            print(e)
+            libmag.warn("will ignore labels sub-segmentations")
+        print("tot blobs", np.sum(heat_map))
+    
+    imgs = (img_np, labels_img_np, labels_edge, dist_to_orig, labels_interior,
+            heat_map, blobs, subseg, spacing)
+    return df, df_path, df_level_path, imgs
+
+
 def volumes_by_id(img_paths, labels_ref_path, suffix=None, unit_factor=None,
                   groups=None, max_level=None, combine_sides=True, 
-                  extra_metrics=None):
+                  extra_metrics=None, prefetch=1, prefetch_max_bytes=None):
     """Get volumes and additional label metrics for each single labels ID.
     
     Atlas (intensity) and annotation (labels) images can be configured
@@ -1299,6 +1426,15 @@ def volumes_by_id(img_paths, labels_ref_path, suffix=None, unit_factor=None,
         extra_metrics (List[Enum]): List of enums from 
             :class:`config.MetricGroups` specifying additional stats; 
             defaults to None.
+        prefetch (int): Number of samples to load in the background ahead
+            of the sample being measured; defaults to 1. Use 0 to load
+            each sample only when it is measured. If the multiprocessing
+            start method is "fork", loading is paused while each sample
+            is measured so that the loader is idle when measurement
+            processes are forked.
+        prefetch_max_bytes (int): Memory cap for images of loaded samples,
+            beyond which no further samples are loaded ahead; defaults to
+            None for no cap.
     
     Returns:
         Tuple of Pandas data frames with volume-related metrics for each 
@@ -1335,106 +1471,15 @@ def volumes_by_id(img_paths, labels_ref_path, suffix=None, unit_factor=None,
     
     dfs = []
     dfs_all = []
-    for i, img_path in enumerate(img_paths):
-        # adjust image path with suffix
-        mod_path = img_path
-        if suffix is not None:
-            mod_path = libmag.insert_before_ext(img_path, suffix)
-        
-        # load data frame if available
-        df_path = "{}_volumes.csv".format(os.path.splitext(mod_path)[0])
-        df, df_path, df_level_path = _setup_vols_df(df_path, max_level)
+    # load registered images for upcoming samples in the background while
+    # measuring the current sample
+    loader = sitk_io.PrefetchLoader(
+        _load_vols_sample,
+        [(p, suffix, max_level, extra_metrics) for p in img_paths],
+        prefetch, prefetch_max_bytes)
+    for i, (img_path, sample_data) in enumerate(zip(img_paths, loader)):
+        df, df_path, df_level_path, imgs = sample_data
         
-        spacing = None
-        img_np = None
-        labels_img_np = None
-        labels_edge = None
-        dist_to_orig = None
-        labels_interior = None
-        heat_map = None
-        blobs = None
-        subseg = None
-        if (df is None or 
-                extra_metrics and config.MetricGroups.SHAPES in extra_metrics):
-            # open images registered to the main image; avoid opening if data
-            # frame is available and not taking any stats requiring images
-            
-            # open intensity image in priority: config > exp > atlas
-            atlas_suffix = config.reg_suffixes[config.RegSuffixes.ATLAS]
-            if not atlas_suffix:
-                atlas_suffix = config.RegNames.IMG_EXP.value
-            try:
-                img_sitk = sitk_io.load_registered_img(
-                    mod_path, atlas_suffix, get_sitk=True)
-            except FileNotFoundError as e:
-                print(e)
-                libmag.warn("will load atlas image instead")
-                img_sitk = sitk_io.load_registered_img(
-                    mod_path, config.RegNames.IMG_ATLAS.value, get_sitk=True)
-            img_np = sitk.GetArrayFromImage(img_sitk)
-            spacing = img_sitk.GetSpacing()[::-1]
-            
-            # load labels in order of priority: config > full labels
-            # > truncated labels; required so give exception if not found
-            labels_suffix = config.reg_suffixes[config.RegSuffixes.ANNOTATION]
-            if not labels_suffix:
-                labels_suffix = config.RegNames.IMG_LABELS.value
-            try:
-                labels_img_np = sitk_io.load_registered_img(
-                    mod_path, labels_suffix)
-            except FileNotFoundError as e:
-                print(e)
-                libmag.warn(
-                    "will attempt to load trucated labels image instead")
-                labels_img_np = sitk_io.load_registered_img(
-                    mod_path, config.RegNames.IMG_LABELS_TRUNC.value)
-            
-            # load labels edge and edge distances images
-            try:
-                labels_edge = sitk_io.load_registered_img(
-                    mod_path, config.RegNames.IMG_LABELS_EDGE.value)
-                dist_to_orig = sitk_io.load_registered_img(
-                    mod_path, config.RegNames.IMG_LABELS_DIST.value)
-            except FileNotFoundError as e:
-                print(e)
-                libmag.warn("will ignore edge measurements")
-            
-            # load labels marker image
-            try:
-                labels_interior = sitk_io.load_registered_img(
-                    mod_path, config.RegNames.IMG_LABELS_INTERIOR.value)
-            except FileNotFoundError as e:
-                print(e)
-                libmag.warn("will ignore label markers")
-            
-            # load heat map of nuclei per voxel if available
-            try:
-                heat_map = sitk_io.load_registered_img(
-                    mod_path, config.RegNames.IMG_HEAT_MAP.value)
-            except FileNotFoundError as e:
-                print(e)
-                libmag.warn("will ignore nuclei stats")
-
-            if (extra_metrics and 
-                    config.MetricGroups.POINT_CLOUD in extra_metrics):
-                # load blobs with coordinates, label IDs, and cluster IDs
-                # if available
-                try:
-                    blobs = np.load(libmag.combine_paths(
-                        mod_path, config.SUFFIX_BLOB_CLUSTERS))
-                    print(blobs)
-                except FileNotFoundError as e:
-                    print(e)
-
-            # load sub-segmentation labels if available
-            try:
-                subseg = sitk_io.load_registered_img(
-                    mod_path, config.RegNames.IMG_LABELS_SUBSEG.value)
-            except FileNotFoundError as e:
-                print(e)
-                libmag.warn("will ignore labels sub-segmentations")
-            print("tot blobs", np.sum(heat_map))
-            
         # prepare sample name with original name for comparison across 
         # conditions and add an arbitrary number of metadata grouping cols
         sample = libmag.get_filename_without_ext(img_path)
@@ -1444,12 +1489,14 @@ def volumes_by_id(img_paths, labels_ref_path, suffix=None, unit_factor=None,
                 grouping[key] = groups[key][i]
             
         # measure stats per label for the given sample; max_level already 
-        # takes care of combining sides
+        # takes care of combining sides; forking measurement processes
+        # while the loader is reading an image can deadlock them
+        if chunking.is_fork():
+            loader.pause()
         df, df_all = vols.measure_labels_metrics(
-            img_np, labels_img_np, labels_edge, dist_to_orig, labels_interior,
-            heat_map, blobs, subseg, spacing, unit_factor, 
-            combine_sides and max_level is None, label_ids, grouping, df, 
-            extra_metrics)
+            *imgs, unit_factor, combine_sides and max_level is None,
+            label_ids, grouping, df, extra_metrics)
+        loader.resume()
         
         # output volume stats CSV to atlas directory and append for 
         # combined CSVs
@@ -1460,6 +1507,9 @@ def volumes_by_id(img_paths, labels_ref_path, suffix=None, unit_factor=None,
                 [df], df_level_path, sort_cols=_SORT_VOL_COLS)
         dfs.append(df)
         dfs_all.append(df_all)
+        
+        # release images before the loader replaces them with another sample
+        del sample_data, imgs
     
     # combine data frames from all samples by region for each sample
     df_combined = df_io.data_frames_to_csv(
@@ -70,6 +70,51 @@ class Downsampler(object):
             rescaled = transform.resize(
                 sub_roi, target_size, mode="reflect", anti_aliasing=True)
         return coord, rescaled
+    
+    @classmethod
+    def rescale_sub_roi_args(cls, args):
+        """Rescale or resize a sub-ROI from a single sequence of arguments
+        for mapping functions such as :meth:`multiprocessing.Pool.imap`.
+        
+        Args:
+            args (List): Sequence of arguments to
+                :meth:`rescale_sub_roi`.
+
+        Returns:
+            Tuple of ``coord`` and the rescaled sub-ROI.
+
+        """
+        return cls.rescale_sub_roi(*args)
+    
+    @staticmethod
+    def get_rescaled_shape(shape, rescale, target_size, multichannel):
+        """Get the shape of a sub-ROI after rescaling or resizing.
+        
+        Args:
+            shape (List[int]): Shape of the sub-ROI.
+            rescale: Rescaling factor. Can be None, in which case 
+                ``target_size`` will be used instead.
+            target_size: Target rescaling size for the given sub-ROI in 
+               (z, y, x).
+            multichannel: True if the final dimension is for channels.
+
+        Returns:
+            tuple[int]: Shape of the rescaled sub-ROI, matching the
+            output of :meth:`rescale_sub_roi`.
+
+        """
+        shape = np.array(shape)
+        if rescale is not None:
+            # output shape as determined by scikit-image's rescale
+            rescaled = np.maximum(np.round(np.multiply(shape, rescale)), 1)
+        else:
+            rescaled = np.array(target_size)
+            if len(rescaled) < len(shape):
+                # preserve the channel dimension
+                rescaled = np.concatenate((rescaled, shape[len(rescaled):]))
+        if multichannel:
+            rescaled[-1] = shape[-1]
+        return tuple(rescaled.astype(int))
 
 
 def make_modifier_plane(plane):
@@ -199,15 +244,18 @@ def transpose_img(filename, series, plane=None, rescale=None, target_size=None):
     offset = 0 if image5d.ndim <= 3 else 1
     multichannel = image5d.ndim >= 5
     image5d_swapped = image5d
+    axes = list(range(image5d.ndim))
     
     if plane is not None and plane != config.PLANE[0]:
         # swap z-y to get (y, z, x) order for xz orientation
         image5d_swapped = np.swapaxes(image5d_swapped, offset, offset + 1)
+        axes = libmag.swap_elements(axes, offset, offset + 1)
         config.resolutions[0] = libmag.swap_elements(
             config.resolutions[0], 0, 1)
         if plane == config.PLANE[2]:
             # swap new y-x to get (x, z, y) order for yz orientation
             image5d_swapped = np.swapaxes(image5d_swapped, offset, offset + 2)
+            axes = libmag.swap_elements(axes, offset, offset + 2)
             config.resolutions[0] = libmag.swap_elements(
                 config.resolutions[0], 0, 2)
     
@@ -244,38 +292,55 @@ def transpose_img(filename, series, plane=None, rescale=None, target_size=None):
         is_fork = chunking.is_fork()
         if is_fork:
             Downsampler.set_data(rescaled)
-        sub_rois = np.zeros_like(sub_roi_slices)
+        
+        # get the output shape and offsets from the shapes that the
+        # rescaled chunks will take, using memory-free placeholders
+        sub_rois_shapes = np.zeros_like(sub_roi_slices)
+        for coord in np.ndindex(sub_roi_slices.shape):
+            chunk_shape = [len(range(*s.indices(n))) for s, n in zip(
+                sub_roi_slices[coord], rescaled.shape)]
+            sub_rois_shapes[coord] = np.broadcast_to(
+                0, Downsampler.get_rescaled_shape(
+                    chunk_shape + list(rescaled.shape[3:]), rescale,
+                    sub_roi_size, multichannel))
+        rescaled_shape = chunking.get_split_stack_total_shape(sub_rois_shapes)
+        sub_roi_shape = np.array(sub_rois_shapes[0, 0, 0].shape[:3])
+        if offset > 0:
+            rescaled_shape = np.concatenate(([1], rescaled_shape))
+        print("rescaled_shape: {}".format(rescaled_shape))
+        
+        def get_args():
+            for coord in np.ndindex(sub_roi_slices.shape):
+                slices = sub_roi_slices[coord]
+                args = [coord, slices, rescale, sub_roi_size, multichannel]
+                if not is_fork:
+                    # pickle chunk if img not directly available
+                    args.append(rescaled[slices])
+                yield args
+        
+        # write each chunk directly into a memmap-backed array as soon as it
+        # is rescaled to minimize RAM usage, opening the array once the
+        # first chunk gives its data type
+        image5d_transposed = None
         pool = chunking.get_mp_pool()
-        pool_results = []
-        for z in range(sub_roi_slices.shape[0]):
-            for y in range(sub_roi_slices.shape[1]):
-                for x in range(sub_roi_slices.shape[2]):
-                    coord = (z, y, x)
-                    slices = sub_roi_slices[coord]
-                    args = [coord, slices, rescale, sub_roi_size,
-                            multichannel]
-                    if not is_fork:
-                        # pickle chunk if img not directly available
-                        args.append(rescaled[slices])
-                    pool_results.append(pool.apply_async(
-                        Downsampler.rescale_sub_roi, args=args))
-        for result in pool_results:
-            coord, sub_roi = result.get()
+        for coord, sub_roi in pool.imap_unordered(
+                Downsampler.rescale_sub_roi_args, get_args()):
             print("replacing sub_roi at {} of {}"
                   .format(coord, np.add(sub_roi_slices.shape, -1)))
-            sub_rois[coord] = sub_roi
-        
+            if image5d_transposed is None:
+                image5d_transposed = np.lib.format.open_memmap(
+                    filename_image5d_npz, mode="w+", dtype=sub_roi.dtype,
+                    shape=tuple(rescaled_shape))
+                output = (image5d_transposed[0] if offset > 0
+                          else image5d_transposed)
+            start = np.multiply(coord, sub_roi_shape)
+            end = start + sub_roi.shape[:3]
+            output[start[0]:end[0], start[1]:end[1], start[2]:end[2]] = sub_roi
+            del sub_roi
         pool.close()
         pool.join()
-        rescaled_shape = chunking.get_split_stack_total_shape(sub_rois)
-        if offset > 0:
-            rescaled_shape = np.concatenate(([1], rescaled_shape))
-        print("rescaled_shape: {}".format(rescaled_shape))
-        # rescale chunks directly into memmap-backed array to minimize RAM usage
-        image5d_transposed = np.lib.format.open_memmap(
-            filename_image5d_npz, mode="w+", dtype=sub_rois[0, 0, 0].dtype,
-            shape=tuple(rescaled_shape))
-        chunking.merge_split_stack2(sub_rois, None, offset, image5d_transposed)
+        Downsampler.set_data(None)
+        image5d_transposed.flush()
         
         if rescale is not None:
             # scale resolutions based on single rescaling factor
@@ -289,18 +354,16 @@ def transpose_img(filename, series, plane=None, rescale=None, target_size=None):
         sizes[0] = rescaled_shape
         scaling = importer.calc_scaling(image5d_swapped, image5d_transposed)
     else:
-        # transfer directly to memmap-backed array
+        # transfer directly to memmap-backed array in blocks to avoid
+        # reading the original image with large strides
         image5d_transposed = np.lib.format.open_memmap(
             filename_image5d_npz, mode="w+", dtype=image5d_swapped.dtype, 
             shape=image5d_swapped.shape)
+        image5d_src = image5d
         if plane == config.PLANE[1] or plane == config.PLANE[2]:
             # flip upside-down if re-orienting planes
-            if offset:
-                image5d_transposed[0, :] = np.fliplr(image5d_swapped[0, :])
-            else:
-                image5d_transposed[:] = np.fliplr(image5d_swapped[:])
-        else:
-            image5d_transposed[:] = image5d_swapped[:]
+            image5d_src = np.flip(image5d_src, axes[offset + 1])
+        cv_nd.transpose_blocked(image5d_src, axes, image5d_transposed)
         sizes[0] = image5d_swapped.shape
     
     # save image metadata
@@ -310,7 +373,8 @@ def transpose_img(filename, series, plane=None, rescale=None, target_size=None):
     importer.save_image_info(
         filename_info_npz, info["names"], sizes, config.resolutions, 
         info["magnification"], info["zoom"], 
-        *importer.calc_intensity_bounds(image5d_transposed), scaling, plane)
+        *importer.calc_intensity_bounds(image5d_transposed, stream=True),
+        scaling, plane)
     print("saved transposed file to {} with shape {}".format(
         filename_image5d_npz, image5d_transposed.shape))
     print("time elapsed (s): {}".format(time() - time_start))
@@ -3,6 +3,9 @@
 """Computer vision library functions for n-dimensions.
 """
 
+import itertools
+import os
+
 import numpy as np
 from scipy import interpolate
 from scipy import ndimage
@@ -15,6 +18,10 @@ from magmap.settings import config
 from magmap.cv import segmenter
 from magmap.io import libmag
 
+#: int: Default maximum number of bytes per tile for blocked transposition,
+# small enough for tiles to remain in CPU cache.
+TRANSPOSE_BLOCK_BYTES = 2 ** 20
+
 
 def in_paint(roi, to_fill):
     """In-paint to interpolate values into pixels to fill from nearest 
@@ -554,7 +561,11 @@ def get_label_props(labels_img_np, label_id):
     return props
 
 
-def get_label_bbox(labels_img_np, label_id):
+#: int: Maximum range of integer label IDs to index without compacting IDs.
+_MAX_DIRECT_LABEL_IDS = 2 ** 16
+
+
+def get_label_bbox(labels_img_np, label_id, bbox_index=None):
     """Get bounding box for a label or set of labels.
     
     Assumes that only one set of properties will be found for a given label, 
@@ -564,18 +575,149 @@ def get_label_bbox(labels_img_np, label_id):
         labels_img_np: Image as Numpy array.
         label_id: Scalar or sequence of scalars of the label IDs to include 
             in the bounding box.
+        bbox_index (:obj:`LabelBBoxIndex`): Bounding box index for
+            ``labels_img_np`` to look up the box instead of measuring the
+            whole image; defaults to None.
     
     Returns:
         Bounding box from :func:``measure.regionprops``. If more than 
         one set of properties are found, only the box from the first 
         property will be returned.
     """
+    if bbox_index is not None:
+        return bbox_index.get_bbox(label_id)
     props = get_label_props(labels_img_np, label_id)
     bbox = None
     if len(props) >= 1: bbox = props[0].bbox
     return bbox
 
 
+def _merge_bboxes(bboxes):
+    # get the bounding box surrounding all the given boxes
+    bboxes = np.array(bboxes)
+    dims = bboxes.shape[1] // 2
+    return (*np.amin(bboxes[:, :dims], axis=0).tolist(),
+            *np.amax(bboxes[:, dims:], axis=0).tolist())
+
+
+def _find_bboxes(img, offset=None):
+    # find the bounding box of each label in an image in one pass by
+    # compacting label IDs to consecutive integers for find_objects
+    lo = np.amin(img) if img.size > 0 else 0
+    hi = np.amax(img) if img.size > 0 else 0
+    if (np.can_cast(img.dtype, np.int64) and img.ndim > 0
+            and int(hi) - int(lo) < _MAX_DIRECT_LABEL_IDS):
+        # shift a small range of IDs directly, skipping the sort, one
+        # plane at a time to limit memory
+        inv = np.empty(
+            img.shape, dtype=np.min_scalar_type(int(hi) - int(lo) + 1))
+        for i, plane in enumerate(img):
+            inv[i] = np.subtract(plane, lo, dtype=np.int64)
+        ids = np.arange(int(lo), int(hi) + 1)
+    else:
+        ids, inv = np.unique(img, return_inverse=True)
+        inv = inv.reshape(img.shape).astype(np.min_scalar_type(len(ids)))
+    inv += 1
+    if offset is None:
+        offset = np.zeros(img.ndim, dtype=int)
+    bboxes = {}
+    for label_id, sl in zip(ids.tolist(), ndimage.find_objects(inv)):
+        if sl is None: continue
+        bboxes[label_id] = (
+            *[s.start + o for s, o in zip(sl, offset)],
+            *[s.stop + o for s, o in zip(sl, offset)])
+    return bboxes
+
+
+class LabelBBoxIndex:
+    """Index of the bounding box of each label in a labels image.
+    
+    Boxes are found for all labels in a single pass through the image when
+    first needed and are updated incrementally for edited regions, so that
+    lookups after edits only search within the edited labels' boxes.
+    
+    Attributes:
+        labels_img (:obj:`np.ndarray`): Labels image, which is indexed in
+            place rather than copied.
+    
+    """
+    def __init__(self, labels_img):
+        """Initialize the index without building it."""
+        self.labels_img = labels_img
+        self._bboxes = None  # label ID to bounding box
+        # labels whose boxes may have shrunk, to recompute within their box
+        self._stale = set()
+    
+    def _get_bbox(self, label_id):
+        # get the box for a single label, recomputing it within its prior
+        # box if the label may have been partially overwritten
+        if label_id in self._stale:
+            self._stale.remove(label_id)
+            slices = get_bbox_region(self._bboxes[label_id])[1]
+            mask = self.labels_img[tuple(slices)] == label_id
+            sl = ndimage.find_objects(mask.astype(np.uint8))
+            if sl:
+                self._bboxes[label_id] = (
+                    *[s.start + o.start for s, o in zip(sl[0], slices)],
+                    *[s.stop + o.start for s, o in zip(sl[0], slices)])
+            else:
+                # label was completely overwritten
+                del self._bboxes[label_id]
+        return self._bboxes.get(label_id)
+    
+    def get_bbox(self, label_id):
+        """Get the bounding box for a label or set of labels.
+        
+        Args:
+            label_id: Scalar or sequence of scalars of the label IDs to
+                include in the bounding box.
+
+        Returns:
+            Bounding box in the format of :func:``measure.regionprops``,
+            or None if none of the labels are present.
+
+        """
+        if self._bboxes is None:
+            self._bboxes = _find_bboxes(self.labels_img)
+        label_ids = label_id if isinstance(
+            label_id, (tuple, list)) else [label_id]
+        bboxes = [self._get_bbox(i) for i in label_ids]
+        bboxes = [b for b in bboxes if b is not None]
+        return _merge_bboxes(bboxes) if bboxes else None
+    
+    def update(self, slices):
+        """Update the index after editing a region of the labels image.
+        
+        Args:
+            slices (Sequence[slice]): Slices of the edited region in the
+                labels image.
+
+        """
+        if self._bboxes is None:
+            # will be built from the edited image
+            return
+        slices = [slice(*s.indices(n)[:2])
+                  for s, n in zip(slices, self.labels_img.shape)]
+        region = self.labels_img[tuple(slices)]
+        if region.size == 0:
+            return
+        region_bbox = (*[s.start for s in slices], *[s.stop for s in slices])
+        dims = len(slices)
+        
+        # labels whose boxes overlap the region may have been overwritten
+        for label_id, bbox in self._bboxes.items():
+            if all(bbox[i] < region_bbox[i + dims]
+                   and region_bbox[i] < bbox[i + dims] for i in range(dims)):
+                self._stale.add(label_id)
+        
+        # extend boxes for labels in the region
+        for label_id, bbox in _find_bboxes(
+                region, region_bbox[:dims]).items():
+            bbox_prev = self._bboxes.get(label_id)
+            self._bboxes[label_id] = bbox if bbox_prev is None else \
+                _merge_bboxes((bbox_prev, bbox))
+
+
 def meas_region(mask, res):
     """Measure the dimensions of a masked region.
 
@@ -730,7 +872,8 @@ def interpolate_contours(bottom, top, fracs):
     return interpolated
 
 
-def interpolate_label_between_planes(labels_img, label_id, axis, bounds):
+def interpolate_label_between_planes(labels_img, label_id, axis, bounds,
+                                     bbox_index=None):
     """Interpolate between two planes for the given labeled region. 
     
     Assume that the given label ID has only been extended and not erased 
@@ -744,10 +887,17 @@ def interpolate_label_between_planes(labels_img, label_id, axis, bounds):
             interpolate. The list will be sorted, and the lower bound 
             will mark the starting plane, while the upper bound will mark 
             the ending plane, inclusive.
+        bbox_index (:obj:`LabelBBoxIndex`): Bounding box index for
+            ``labels_img`` to find the label's box, which will be updated
+            for the interpolated region; defaults to None.
+    
+    Returns:
+        List[slice]: Slices of the region that may have been updated, or
+        None if the label was not found.
     """
     # get bounding box for label to limit the volume needed to resize
-    bbox = get_label_bbox(labels_img, label_id)
-    if bbox is None: return
+    bbox = get_label_bbox(labels_img, label_id, bbox_index)
+    if bbox is None: return None
     shape, slices = get_bbox_region(bbox)
     region = labels_img[tuple(slices)]
     
@@ -789,6 +939,9 @@ def interpolate_label_between_planes(labels_img, label_id, axis, bounds):
     region_within_bounds[interpolated] = label_id
     region[tuple(slices_planes)] = region_within_bounds
     labels_img[tuple(slices)] = region
+    if bbox_index is not None:
+        bbox_index.update(slices)
+    return slices
 
 
 def build_heat_map(shape, coords):
@@ -939,6 +1092,127 @@ def get_selem(ndim):
     return morphology.ball if ndim >= 3 else morphology.disk
 
 
+def transpose_blocked(img, axes=None, out=None, max_bytes=None):
+    """Transpose an image by copying blocks that fit in a memory budget.
+    
+    Transposing a memory-mapped image by indexing a transposed view reads
+    with large strides, thrashing the page cache when the image does not
+    fit in memory. Instead, copy tiles iterated in the order of the
+    source's memory layout, where each tile spans the axes contiguous in
+    both the source and output as far as the budget allows, so that tiles
+    are read and written once in contiguous runs.
+    
+    Args:
+        img (:class:`numpy.ndarray`): Image array, typically a memmap or
+            view of it, such as a flipped view.
+        axes (Sequence[int]): Permutation of axes as in
+            :func:`numpy.transpose`; defaults to None to copy ``img``
+            as given, such as an already transposed view.
+        out (:class:`numpy.ndarray`): Output array in the transposed shape,
+            typically a memmap; defaults to None to create a new array.
+        max_bytes (int): Maximum number of bytes per tile; defaults to
+            None to use :const:`TRANSPOSE_BLOCK_BYTES`.
+
+    Returns:
+        :class:`numpy.ndarray`: ``out`` with the transposed image.
+
+    """
+    view = img if axes is None else np.transpose(img, axes)
+    if out is None:
+        out = np.empty(view.shape, dtype=view.dtype)
+    if max_bytes is None:
+        max_bytes = TRANSPOSE_BLOCK_BYTES
+    ndim = view.ndim
+    if ndim == 0 or view.size == 0:
+        out[...] = view
+        return out
+    
+    # order axes of the view from the slowest to fastest varying in memory
+    mem_order = np.argsort([-abs(s) for s in view.strides], kind="stable")
+    
+    # shrink tiles first along leading axes in the same order in both
+    # source and output, then the largest of the transposed axes, keeping
+    # trailing axes contiguous in both whole as long as possible
+    nprefix = 0
+    while nprefix < ndim and mem_order[nprefix] == nprefix:
+        nprefix += 1
+    nsuffix = 0
+    while (nsuffix < ndim - nprefix
+           and mem_order[ndim - 1 - nsuffix] == ndim - 1 - nsuffix):
+        nsuffix += 1
+    tile = list(view.shape)
+    max_elems = max(1, max_bytes // view.itemsize)
+    axes_groups = (range(nprefix), range(nprefix, ndim - nsuffix),
+                   range(ndim - nsuffix, ndim))
+    while np.prod(tile) > max_elems:
+        for i, group in enumerate(axes_groups):
+            axes_shrink = [a for a in group if tile[a] > 1]
+            if axes_shrink:
+                break
+        if i == 0:
+            # shrink leading axes from the fastest
+            axis = axes_shrink[-1]
+        elif i == 1:
+            axis = max(axes_shrink, key=lambda a: tile[a])
+        else:
+            # shrink the contiguous axes from the slowest
+            axis = axes_shrink[0]
+        tile[axis] = -(-tile[axis] // 2)
+    
+    # copy tiles in the source's memory order, reading each tile in the
+    # same order before transposing it into the output
+    mem_inv = np.argsort(mem_order)
+    starts = [range(0, view.shape[a], tile[a]) for a in mem_order]
+    for start in itertools.product(*starts):
+        slices = [None] * ndim
+        for a, st in zip(mem_order, start):
+            slices[a] = slice(st, st + tile[a])
+        slices = tuple(slices)
+        block = np.array(view[slices].transpose(mem_order), order="C")
+        out[slices] = block.transpose(mem_inv)
+    return out
+
+
+def _benchmark_transpose_blocked(path, shape=(200, 1024, 1024),
+                                 axes=(2, 1, 0), max_bytes=None):
+    """Benchmark blocked against direct transposition of a memmap.
+    
+    Args:
+        path (str): Path to the NPY file to create, with the output
+            saved alongside it.
+        shape (List[int]): Shape of the synthetic image.
+        axes (Sequence[int]): Permutation of axes.
+        max_bytes (int): Maximum number of bytes per tile; defaults to None.
+
+    Returns:
+        float, float: Times in seconds for direct and blocked transposition.
+
+    """
+    from time import time
+    img = np.lib.format.open_memmap(
+        path, mode="w+", dtype=np.uint16, shape=tuple(shape))
+    rng = np.random.default_rng(0)
+    for i in range(shape[0]):
+        img[i] = rng.integers(0, 4000, shape[1:], dtype=np.uint16)
+    img.flush()
+    img = np.load(path, mmap_mode="r")
+    out = np.lib.format.open_memmap(
+        "{}_transposed.npy".format(os.path.splitext(path)[0]), mode="w+",
+        dtype=img.dtype, shape=np.transpose(img, axes).shape)
+    
+    start = time()
+    out[:] = np.transpose(img, axes)
+    out.flush()
+    time_direct = time() - start
+    start = time()
+    transpose_blocked(img, axes, out, max_bytes)
+    out.flush()
+    time_blocked = time() - start
+    print("transposed shape {} by {} in {} s directly, {} s blocked"
+          .format(shape, axes, time_direct, time_blocked))
+    return time_direct, time_blocked
+
+
 def _test_interpolate_between_planes():
     '''
     img = np.zeros((2, 4, 4), dtype=int)
@@ -41,8 +41,12 @@ class StackDetector(object):
         coloc (bool): True to perform blob co-localizations; defaults to False.
         channel (Sequence[int]): Sequence of channels; defaults to None to
             detect in all channels.
+        sub_rois (:obj:`np.ndarray`): Numpy object array of preprocessed
+            sub-ROIs to detect in place of slicing :attr:`img`; defaults
+            to None.
     """
     img = None
+    sub_rois = None
     last_coord = None
     denoise_max_shape = None
     exclude_border = None
@@ -66,10 +70,83 @@ class StackDetector(object):
             identify the sub-ROI position and an array of detected blobs.
 
         """
+        sub_roi = (cls.img[sub_roi_slices] if cls.sub_rois is None
+                   else cls.sub_rois[coord])
         return cls.detect_sub_roi(
             coord, offset, cls.last_coord,
-            cls.denoise_max_shape, cls.exclude_border, cls.img[sub_roi_slices],
+            cls.denoise_max_shape, cls.exclude_border, sub_roi,
             cls.channel, coloc=cls.coloc)
+    
+    @classmethod
+    def preprocess_sub_roi_from_data(cls, sub_roi_slices):
+        """Preprocess a sub-ROI using data stored as class attributes for
+        forked multiprocessing.
+
+        Args:
+            sub_roi_slices (Tuple[slice]): Sequence of slices within
+                :attr:``img`` defining the sub-ROI.
+
+        Returns:
+            :obj:`np.ndarray`: The preprocessed sub-ROI.
+
+        """
+        return cls.preprocess_sub_roi(
+            cls.img[sub_roi_slices], cls.denoise_max_shape, cls.channel)
+    
+    @classmethod
+    def preprocess_sub_roi(cls, sub_roi, denoise_max_shape, channel,
+                           img_path=None):
+        """Saturate and denoise a sub-ROI in smaller units.
+        
+        Args:
+            sub_roi (:obj:`np.ndarray`): Array to preprocess.
+            denoise_max_shape (Tuple[int]): Maximum shape of each unit within
+                the sub-ROI for denoising.
+            channel (Sequence[int]): Sequence of channels, where None
+                preprocesses all channels.
+            img_path (str): Path from which to load metadata; defaults to
+                None. If given, the command line arguments will be reloaded
+                as for :meth:`detect_sub_roi`.
+
+        Returns:
+            :obj:`np.ndarray`: The preprocessed sub-ROI.
+
+        """
+        if img_path:
+            # reload command-line parameters and image metadata for
+            # spawned processes
+            cli.process_cli_args()
+            _, orig_info = importer.make_filenames(img_path)
+            importer.load_metadata(orig_info)
+        
+        # further split sub-ROI for preprocessing locally
+        denoise_roi_slices, _ = chunking.stack_splitter(
+            sub_roi.shape, denoise_max_shape)
+        for z in range(denoise_roi_slices.shape[0]):
+            for y in range(denoise_roi_slices.shape[1]):
+                for x in range(denoise_roi_slices.shape[2]):
+                    denoise_coord = (z, y, x)
+                    denoise_roi = sub_roi[denoise_roi_slices[denoise_coord]]
+                    libmag.printv_format(
+                        "preprocessing sub-sub-ROI {} of {} (shape {}"
+                        " within sub-ROI shape {})", 
+                        (denoise_coord,
+                         np.subtract(denoise_roi_slices.shape, 1),
+                         denoise_roi.shape, sub_roi.shape))
+                    denoise_roi = plot_3d.saturate_roi(
+                        denoise_roi, channel=channel)
+                    denoise_roi = plot_3d.denoise_roi(
+                        denoise_roi, channel=channel)
+                    # replace slices with denoised ROI
+                    denoise_roi_slices[denoise_coord] = denoise_roi
+        
+        # re-merge back into the sub-ROI
+        merged_shape = chunking.get_split_stack_total_shape(
+            denoise_roi_slices)
+        merged = np.zeros(
+            tuple(merged_shape), dtype=denoise_roi_slices[0, 0, 0].dtype)
+        chunking.merge_split_stack2(denoise_roi_slices, None, 0, merged)
+        return merged
 
     @classmethod
     def detect_sub_roi(cls, coord, offset, last_coord, denoise_max_shape,
@@ -110,34 +187,8 @@ class StackDetector(object):
                       sub_roi.shape))
         
         if denoise_max_shape is not None:
-            # further split sub-ROI for preprocessing locally
-            denoise_roi_slices, _ = chunking.stack_splitter(
-                sub_roi.shape, denoise_max_shape)
-            for z in range(denoise_roi_slices.shape[0]):
-                for y in range(denoise_roi_slices.shape[1]):
-                    for x in range(denoise_roi_slices.shape[2]):
-                        denoise_coord = (z, y, x)
-                        denoise_roi = sub_roi[denoise_roi_slices[denoise_coord]]
-                        libmag.printv_format(
-                            "preprocessing sub-sub-ROI {} of {} (shape {}"
-                            " within sub-ROI shape {})", 
-                            (denoise_coord,
-                             np.subtract(denoise_roi_slices.shape, 1),
-                             denoise_roi.shape, sub_roi.shape))
-                        denoise_roi = plot_3d.saturate_roi(
-                            denoise_roi, channel=channel)
-                        denoise_roi = plot_3d.denoise_roi(
-                            denoise_roi, channel=channel)
-                        # replace slices with denoised ROI
-                        denoise_roi_slices[denoise_coord] = denoise_roi
-            
-            # re-merge back into the sub-ROI
-            merged_shape = chunking.get_split_stack_total_shape(
-                denoise_roi_slices)
-            merged = np.zeros(
-                tuple(merged_shape), dtype=denoise_roi_slices[0, 0, 0].dtype)
-            chunking.merge_split_stack2(denoise_roi_slices, None, 0, merged)
-            sub_roi = merged
+            sub_roi = cls.preprocess_sub_roi(
+                sub_roi, denoise_max_shape, channel)
         
         if exclude_border is None:
             exclude = None
@@ -161,10 +212,83 @@ class StackDetector(object):
             #print("segs after:\n{}".format(segments))
         return coord, segments
     
+    @classmethod
+    def preprocess_sub_rois(cls, img, sub_roi_slices, denoise_max_shape,
+                            channel):
+        """Preprocess chunked sub-ROIs via multiprocessing.
+        
+        Args:
+            img (:obj:`np.ndarray`): Array to preprocess.
+            sub_roi_slices (:obj:`np.ndarray`): Numpy object array containing
+                chunked sub-ROIs within a stack.
+            denoise_max_shape (Tuple[int]): Maximum shape of each unit within
+                each sub-ROI for denoising.
+            channel (Sequence[int]): Sequence of channels, where None
+                preprocesses all channels.
+
+        Returns:
+            :obj:`np.ndarray`: Numpy object array of preprocessed sub-ROIs
+            corresponding to ``sub_roi_slices``.
+
+        """
+        is_fork = chunking.is_fork()
+        if is_fork:
+            cls.img = img
+            cls.denoise_max_shape = denoise_max_shape
+            cls.channel = channel
+        
+        pool = chunking.get_mp_pool()
+        pool_results = {}
+        for coord in np.ndindex(sub_roi_slices.shape):
+            if is_fork:
+                pool_results[coord] = pool.apply_async(
+                    StackDetector.preprocess_sub_roi_from_data,
+                    args=(sub_roi_slices[coord],))
+            else:
+                pool_results[coord] = pool.apply_async(
+                    StackDetector.preprocess_sub_roi,
+                    args=(img[sub_roi_slices[coord]], denoise_max_shape,
+                          channel, config.filename))
+        
+        sub_rois = np.zeros(sub_roi_slices.shape, dtype=object)
+        for coord, result in pool_results.items():
+            sub_rois[coord] = result.get()
+        pool.close()
+        pool.join()
+        return sub_rois
+    
+    @staticmethod
+    def get_preproc_key(sub_roi_slices, denoise_max_shape, channel):
+        """Get a key identifying preprocessed sub-ROIs.
+        
+        Preprocessed sub-ROIs depend only on the block settings and the
+        preprocessing settings of each channel's profile, allowing them
+        to be reused when only downstream settings such as detection
+        settings change.
+        
+        Args:
+            sub_roi_slices (:obj:`np.ndarray`): Numpy object array containing
+                chunked sub-ROIs within a stack.
+            denoise_max_shape (Tuple[int]): Maximum shape of each unit within
+                each sub-ROI for denoising.
+            channel (Sequence[int]): Sequence of channels.
+
+        Returns:
+            str: Key for the preprocessed sub-ROIs.
+
+        """
+        slices = [(s.start, s.stop) for sl in sub_roi_slices.flat for s in sl]
+        profs = (config.roi_profiles if channel is None
+                 else [config.get_roi_profile(c) for c in channel])
+        preproc = [[p[k] for k in roi_prof.ROIProfile.BLOB_PREPROCESSING]
+                   for p in profs]
+        return repr((slices, np.asarray(denoise_max_shape).tolist(),
+                     channel, preproc))
+    
     @classmethod
     def detect_blobs_sub_rois(cls, img, sub_roi_slices, sub_rois_offsets,
                               denoise_max_shape, exclude_border, coloc,
-                              channel):
+                              channel, preproc_cache=None):
         """Process blobs in chunked sub-ROIs via multiprocessing.
 
         Args:
@@ -183,6 +307,10 @@ class StackDetector(object):
                 False.
             channel (Sequence[int]): Sequence of channels, where None detects
                 in all channels.
+            preproc_cache (dict): Dictionary of preprocessed sub-ROIs by
+                keys from :meth:`get_preproc_key`. If given, sub-ROIs are
+                preprocessed separately from detection and stored in this
+                cache, or taken from it if already present. Defaults to None.
 
         Returns:
             :obj:`np.ndarray`: Numpy object array of blobs corresponding to
@@ -191,6 +319,20 @@ class StackDetector(object):
             elements as given in :meth:``StackDetect.detect_sub_roi``.
         
         """
+        sub_rois = None
+        if preproc_cache is not None and denoise_max_shape is not None:
+            # reuse sub-ROIs preprocessed with the same settings
+            key = cls.get_preproc_key(
+                sub_roi_slices, denoise_max_shape, channel)
+            sub_rois = preproc_cache.get(key)
+            if sub_rois is None:
+                sub_rois = cls.preprocess_sub_rois(
+                    img, sub_roi_slices, denoise_max_shape, channel)
+                preproc_cache[key] = sub_rois
+            else:
+                print("Reusing preprocessed sub-ROIs")
+            denoise_max_shape = None
+        
         # detect nuclei in each sub-ROI, passing an index to access each 
         # sub-ROI to minimize pickling
         is_fork = chunking.is_fork()
@@ -199,6 +341,7 @@ class StackDetector(object):
             # set data as class attributes for direct access during forked
             # multiprocessing
             cls.img = img
+            cls.sub_rois = sub_rois
             cls.last_coord = last_coord
             cls.denoise_max_shape = denoise_max_shape
             cls.exclude_border = exclude_border
@@ -220,12 +363,13 @@ class StackDetector(object):
                     else:
                         # pickle full set of variables including sub-ROI and
                         # filename from which to load image parameters
+                        sub_roi = (img[sub_roi_slices[coord]]
+                                   if sub_rois is None else sub_rois[coord])
                         pool_results.append(pool.apply_async(
                             StackDetector.detect_sub_roi,
                             args=(coord, sub_rois_offsets[coord], last_coord,
                                   denoise_max_shape, exclude_border,
-                                  img[sub_roi_slices[coord]], channel,
-                                  config.filename, coloc)))
+                                  sub_roi, channel, config.filename, coloc)))
     
         # retrieve blobs and assign to object array corresponding to sub_rois
         seg_rois = np.zeros(sub_roi_slices.shape, dtype=object)
@@ -238,6 +382,7 @@ class StackDetector(object):
     
         pool.close()
         pool.join()
+        cls.sub_rois = None
         return seg_rois
 
 
@@ -306,7 +451,7 @@ def setup_blocks(settings, shape):
 
 def detect_blobs_blocks(filename_base, image5d, offset, size, channels,
                         verify=False, save_dfs=True, full_roi=False,
-                        coloc=False):
+                        coloc=False, preproc_cache=None):
     """Detect blobs by block processing of a large image.
     
     All channels are processed in the same blocks.
@@ -324,6 +469,8 @@ def detect_blobs_blocks(filename_base, image5d, offset, size, channels,
         full_roi (bool): True to treat ``image5d`` as the full ROI; defaults
             to False.
         coloc (bool): True to perform blob co-localizations; defaults to False.
+        preproc_cache (dict): Cache of preprocessed sub-ROIs; defaults to
+            None. See :meth:`StackDetector.detect_blobs_sub_rois`.
     
     Returns:
         tuple[int, int, int], str, :class:`magmap.cv.detector.Blobs`:
@@ -368,7 +515,7 @@ def detect_blobs_blocks(filename_base, image5d, offset, size, channels,
     # for blob detection
     seg_rois = StackDetector.detect_blobs_sub_rois(
         roi, sub_roi_slices, sub_rois_offsets, denoise_max_shape,
-        exclude_border, coloc, channels)
+        exclude_border, coloc, channels, preproc_cache)
     detection_time = time() - time_detection_start
     print("blob detection time (s):", detection_time)
     
@@ -475,7 +622,8 @@ def detect_blobs_blocks(filename_base, image5d, offset, size, channels,
     return stats_detection, fdbk, blobs
 
 
-def detect_blobs_stack(filename_base, subimg_offset, subimg_size, coloc=False):
+def detect_blobs_stack(filename_base, subimg_offset, subimg_size, coloc=False,
+                       preproc_cache=None):
     """Detect blobs in a full stack, such as a whole large image.
     
     Process channels in separate sets of blocks if their profiles specify
@@ -492,6 +640,8 @@ def detect_blobs_stack(filename_base, subimg_offset, subimg_size, coloc=False):
             use the ``coloc_match`` task
             (:meth:`magmap.colocalizer.StackColocalizer.colocalize_stack`)
             instead.
+        preproc_cache (dict): Cache of preprocessed sub-ROIs; defaults to
+            None. See :meth:`StackDetector.detect_blobs_sub_rois`.
 
     Returns:
         tuple[int, int, int], str, :class:`magmap.cv.detector.Blobs`:
@@ -520,7 +670,8 @@ def detect_blobs_stack(filename_base, subimg_offset, subimg_size, coloc=False):
         blobs_out = detect_blobs_blocks(
             filename_base, config.image5d, subimg_offset, subimg_size,
             chl, config.truth_db_mode is config.TruthDBModes.VERIFY, 
-            not config.grid_search_profile, config.image5d_is_roi, coloc)
+            not config.grid_search_profile, config.image5d_is_roi, coloc,
+            preproc_cache)
         for col, val in zip(cols, blobs_out):
             detection_out.setdefault(col, []).append(val)
         print("{}\n".format("-" * 80))
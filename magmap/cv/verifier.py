@@ -5,8 +5,8 @@ import numpy as np
 from scipy import optimize
 from scipy.spatial import distance
 
-from magmap.cv import colocalizer, detector
-from magmap.io import df_io, libmag, sqlite
+from magmap.cv import chunking, colocalizer, detector
+from magmap.io import cli, df_io, libmag, sqlite
 from magmap.settings import config
 from magmap.stats import atlas_stats, mlearn
 
@@ -252,8 +252,113 @@ def match_blobs_roi(blobs, blobs_base, offset, size, thresh, scaling,
         matches
 
 
+class StackVerifier:
+    """Verify blobs in truth set ROIs in parallel.
+    
+    Blobs are binned by ROI before verification so that each ROI only
+    matches its own blobs. Support shared class attributes in forked
+    multiprocessing, with fallback to pickling in spawned multiprocessing.
+    
+    Attributes:
+        blobs_rois (list[:obj:`np.ndarray`]): Detected blobs binned by ROI.
+        blobs_truth_rois (list[:obj:`np.ndarray`]): Truth blobs binned by ROI.
+        match_params (tuple): Parameters for matching blobs in each ROI,
+            given as ``thresh, scaling, inner_padding, resize`` from
+            :meth:`setup_match_blobs_roi`.
+    
+    """
+    blobs_rois = None
+    blobs_truth_rois = None
+    match_params = None
+    
+    @classmethod
+    def verify_roi(cls, i, offset, size, blobs=None, blobs_truth=None,
+                   match_params=None, setup_cli=False):
+        """Verify blobs in a single ROI.
+        
+        Args:
+            i (int): Index of the ROI.
+            offset (List[int]): ROI offset in x,y,z.
+            size (List[int]): ROI size in x,y,z.
+            blobs (:obj:`np.ndarray`): Detected blobs in the ROI; defaults
+                to None to use the ``i`` element of :attr:`blobs_rois`.
+            blobs_truth (:obj:`np.ndarray`): Truth blobs in the ROI; defaults
+                to None to use the ``i`` element of :attr:`blobs_truth_rois`.
+            match_params (tuple): Matching parameters; defaults to None to
+                use :attr:`match_params`.
+            setup_cli (bool): True to set up CLI arguments, typically for
+                a spawned (rather than forked) environment; defaults to False.
+
+        Returns:
+            int, tuple: ``i`` for tracking multiprocessing and the output of
+            :meth:`match_blobs_roi`.
+
+        """
+        if blobs is None:
+            blobs = cls.blobs_rois[i]
+        if blobs_truth is None:
+            blobs_truth = cls.blobs_truth_rois[i]
+        if match_params is None:
+            match_params = cls.match_params
+        if setup_cli:
+            # reload command-line parameters
+            cli.process_cli_args()
+        return i, match_blobs_roi(
+            blobs, blobs_truth, offset, size, *match_params)
+    
+    @classmethod
+    def verify_rois(cls, rois_params, blobs, blobs_truth, match_params):
+        """Verify ROIs in a multiprocessing pool.
+        
+        Args:
+            rois_params (list[tuple[List[int], List[int]]]): Sequence of
+                ROI ``offset, size`` tuples, each in x,y,z.
+            blobs (:obj:`np.ndarray`): Detected blobs.
+            blobs_truth (:obj:`np.ndarray`): Truth blobs.
+            match_params (tuple): Matching parameters.
+
+        Returns:
+            list[tuple]: Output of :meth:`match_blobs_roi` for each ROI, in
+            the order of ``rois_params``.
+
+        """
+        # bin blobs by ROI to avoid scanning all blobs in each ROI
+        blobs_rois = []
+        blobs_truth_rois = []
+        for offset, size in rois_params:
+            blobs_rois.append(detector.get_blobs_in_roi(blobs, offset, size)[0])
+            blobs_truth_rois.append(
+                detector.get_blobs_in_roi(blobs_truth, offset, size)[0])
+        
+        is_fork = chunking.is_fork()
+        if is_fork:
+            # set shared data in forked multiprocessing
+            cls.blobs_rois = blobs_rois
+            cls.blobs_truth_rois = blobs_truth_rois
+            cls.match_params = match_params
+        pool = chunking.get_mp_pool()
+        pool_results = []
+        for i, (offset, size) in enumerate(rois_params):
+            if is_fork:
+                # use variables stored as class attributes
+                args = (i, offset, size)
+            else:
+                # pickle full set of variables
+                args = (i, offset, size, blobs_rois[i], blobs_truth_rois[i],
+                        match_params, True)
+            pool_results.append(pool.apply_async(cls.verify_roi, args=args))
+        
+        results = [None] * len(rois_params)
+        for result in pool_results:
+            i, match_output = result.get()
+            results[i] = match_output
+        pool.close()
+        pool.join()
+        return results
+
+
 def verify_rois(rois, blobs, blobs_truth, tol, output_db, exp_id, exp_name,
-                channel):
+                channel, parallel=False):
     """Verify blobs in ROIs by comparing detected blobs with truth sets
     of blobs stored in a database.
     
@@ -281,6 +386,9 @@ def verify_rois(rois, blobs, blobs_truth, tol, output_db, exp_id, exp_name,
         exp_name (str): Name of experiment to store as the sample name for
             each row in the output data frame.
         channel (List[int]): Filter ``blobs_truth`` by this channel.
+        parallel (bool): True to verify ROIs in a multiprocessing pool
+            through :class:`StackVerifier`; defaults to False. Results are
+            identical to those from serial verification.
     
     Returns:
         tuple[int, int, int], str, :class:`pandas.DataFrame`: Tuple of
@@ -289,11 +397,10 @@ def verify_rois(rois, blobs, blobs_truth, tol, output_db, exp_id, exp_name,
     
     """
     blobs_truth = detector.blobs_in_channel(blobs_truth, channel)
-    blobs_truth_rois = None
-    blobs_rois = None
     rois_falsehood = []
     thresh, scaling, inner_padding, resize, blobs = setup_match_blobs_roi(
         blobs, tol)
+    match_params = (thresh, scaling, inner_padding, resize)
     
     # set up metrics dict for accuracy metrics of each ROI
     metrics = {}
@@ -308,26 +415,33 @@ def verify_rois(rois, blobs, blobs_truth, tol, output_db, exp_id, exp_name,
         mlearn.GridSearchStats.FN,
     )
     
-    for roi in rois:
-        # get ROI from database for ground truth blobs
-        offset = (roi["offset_x"], roi["offset_y"], roi["offset_z"])
-        size = (roi["size_x"], roi["size_y"], roi["size_z"])
-        series = roi["series"]
-        
-        # find matches between truth and detected blobs
+    # get ROI parameters from database rows for ground truth blobs
+    rois_params = [(sqlite.get_roi_offset(roi), sqlite.get_roi_size(roi))
+                   for roi in rois]
+    
+    # find matches between truth and detected blobs
+    if parallel:
+        results = StackVerifier.verify_rois(
+            rois_params, blobs, blobs_truth, match_params)
+    else:
+        results = [match_blobs_roi(
+            blobs, blobs_truth, offset, size, *match_params)
+            for offset, size in rois_params]
+    
+    for roi, result in zip(rois, results):
         blobs_inner_plus, blobs_truth_inner_plus, offset_inner, size_inner, \
-            matches = match_blobs_roi(
-                blobs, blobs_truth, offset, size, thresh, scaling,
-                inner_padding, resize)
+            matches = result
         
-        # store blobs in separate verified DB
-        roi_id, _ = sqlite.insert_roi(output_db.conn, output_db.cur, exp_id,
-                                      series, offset_inner, size_inner)
+        # store blobs in separate verified DB, deferring the commit to
+        # write all ROIs in a single transaction
+        roi_id, _ = sqlite.insert_roi(
+            output_db.conn, output_db.cur, exp_id, roi["series"],
+            offset_inner, size_inner, commit=False)
         sqlite.insert_blobs(output_db.conn, output_db.cur, roi_id,
-                            blobs_inner_plus)
+                            blobs_inner_plus, commit=False)
         sqlite.insert_blobs(output_db.conn, output_db.cur, roi_id,
-                            blobs_truth_inner_plus)
-        output_db.insert_blob_matches(roi_id, matches)
+                            blobs_truth_inner_plus, commit=False)
+        output_db.insert_blob_matches(roi_id, matches, commit=False)
         
         # compute accuracy metrics for the ROI
         pos = len(blobs_truth_inner_plus)  # condition pos
@@ -341,17 +455,7 @@ def verify_rois(rois, blobs, blobs_truth, tol, output_db, exp_id, exp_name,
                 pos, true_pos, false_pos, pos - true_pos)
         for key, val in zip(cols, vals):
             metrics.setdefault(key, []).append(val)
-        
-        # combine blobs into total lists for stats across ROIs
-        if blobs_truth_rois is None:
-            blobs_truth_rois = blobs_truth_inner_plus
-        else:
-            blobs_truth_rois = np.concatenate(
-                (blobs_truth_inner_plus, blobs_truth_rois))
-        if blobs_rois is None:
-            blobs_rois = blobs_inner_plus
-        else:
-            blobs_rois = np.concatenate((blobs_inner_plus, blobs_rois))
+    output_db.conn.commit()
     
     # generate and show data frame of accuracy metrics for each ROI
     df = df_io.dict_to_data_frame(metrics, show=" ")
@@ -414,7 +518,7 @@ def verify_stack(filename_base, subimg_path_base, settings, segments_all,
         stats_detection, fdbk, df_verify = verify_rois(
             rois, segments_all, config.truth_db.blobs_truth,
             verify_tol, config.verified_db, exp_id, exp_name,
-            channels)
+            channels, settings["verify_mp"])
         df_io.data_frames_to_csv(df_verify, libmag.combine_paths(
             exp_name, "verify.csv"))
     except FileNotFoundError:
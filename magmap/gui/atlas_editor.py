@@ -10,10 +10,11 @@ from matplotlib import pyplot as plt
 from matplotlib import figure
 from matplotlib import gridspec
 from matplotlib.widgets import Slider, Button, TextBox
+import numpy as np
 
 from magmap.cv import cv_nd
 from magmap.gui import plot_editor
-from magmap.io import libmag, naming, sitk_io
+from magmap.io import edit_journal, libmag, naming, sitk_io
 from magmap.plot import colormaps, plot_support
 from magmap.settings import config
 
@@ -54,13 +55,29 @@ class AtlasEditor(plot_support.ImageSyncMixin):
             in :class:`pixel_display.PixelDisplay`; defaults to None.
         fn_update_coords (func): Handler for coordinate updates, which
             takes coordinates in z-plane orientation; defaults to None.
+        labels_bbox_index (:obj:`magmap.cv.cv_nd.LabelBBoxIndex`): Index of
+            label bounding boxes in ``labels_img``, updated as labels are
+            edited; defaults to None to create a new index.
+        labels_journal (:obj:`magmap.io.edit_journal.EditJournal`): Journal
+            of regions in ``labels_img`` edited since the last save, shared
+            by Atlas Editors of the same labels image so that any of them
+            saves all edits; defaults to None to create a new journal.
+        labels_history (:obj:`magmap.gui.plot_editor.LabelsEditHistory`):
+            Undo history of painting strokes in ``labels_img`` shared by
+            the Plot Editors; defaults to None to create a new history.
     """
 
     _EDIT_BTN_LBLS = ("Edit", "Editing")
+    
+    #: float: Maximum size of the labels edit journal as a fraction of the
+    # labels image size before saving the full image instead.
+    JOURNAL_MAX_FRAC = 0.5
 
     def __init__(self, image5d, labels_img, channel, offset, fn_close_listener, 
                  borders_img=None, fn_show_label_3d=None, title=None,
-                 fn_refresh_atlas_eds=None, fig=None, fn_status_bar=None):
+                 fn_refresh_atlas_eds=None, fig=None, fn_status_bar=None,
+                 labels_bbox_index=None, labels_history=None,
+                 labels_journal=None):
         """Plot ROI as sequence of z-planes containing only the ROI itself."""
         super().__init__()
         self.image5d = image5d
@@ -74,6 +91,15 @@ class AtlasEditor(plot_support.ImageSyncMixin):
         self.fn_refresh_atlas_eds = fn_refresh_atlas_eds
         self.fig = fig
         self.fn_status_bar = fn_status_bar
+        if labels_bbox_index is None and labels_img is not None:
+            labels_bbox_index = cv_nd.LabelBBoxIndex(labels_img)
+        self.labels_bbox_index = labels_bbox_index
+        if labels_journal is None:
+            labels_journal = edit_journal.EditJournal()
+        self.labels_journal = labels_journal
+        if labels_history is None and labels_img is not None:
+            labels_history = plot_editor.LabelsEditHistory(labels_img)
+        self.labels_history = labels_history
         
         self.alpha_slider = None
         self.alpha_reset_btn = None
@@ -169,6 +195,17 @@ class AtlasEditor(plot_support.ImageSyncMixin):
             
             # plot editor
             max_size = max_sizes[axis] if max_sizes else None
+            img3d_pyramid = None
+            if max_size:
+                downsample = max(img3d_tr.shape[1:3]) // max_size
+                if downsample > 1:
+                    # block-mean the main image to the coarsest pyramid
+                    # level within the downsampling factor, skipping finer
+                    # levels to save memory
+                    nlevels = int(np.log2(downsample))
+                    img3d_pyramid = [None] * (nlevels - 1) + [
+                        plot_support.downsample_planes(
+                            img3d_tr, 2 ** nlevels)]
             plot_ed = plot_editor.PlotEditor(
                 ax, img3d_tr, labels_img_tr, config.cmap_labels,
                 plane, aspect, origin, self.update_coords, self.refresh_images, 
@@ -177,7 +214,11 @@ class AtlasEditor(plot_support.ImageSyncMixin):
                 fn_show_label_3d=self.fn_show_label_3d, 
                 interp_planes=self.interp_planes,
                 fn_update_intensity=self.update_color_picker,
-                max_size=max_size, fn_status_bar=self.fn_status_bar)
+                max_size=max_size, fn_status_bar=self.fn_status_bar,
+                img3d_pyramid=img3d_pyramid,
+                labels_bbox_index=self.labels_bbox_index,
+                labels_journal=self.labels_journal,
+                labels_history=self.labels_history)
             return plot_ed
         
         # setup plot editors for all 3 orthogonal directions
@@ -251,6 +292,10 @@ class AtlasEditor(plot_support.ImageSyncMixin):
             # ctrl-s will bring up save dialog from fig, but cmd/win-S
             # will bypass
             self.save_fig(self.get_save_path())
+        elif event.key in ("ctrl+z", "cmd+z"):
+            self.undo_edit()
+        elif event.key in ("ctrl+y", "cmd+y", "ctrl+Z", "cmd+Z"):
+            self.undo_edit(True)
     
     def update_coords(self, coord, plane_src=config.PLANE[0]):
         """Update all plot editors with given coordinates.
@@ -349,32 +394,87 @@ class AtlasEditor(plot_support.ImageSyncMixin):
             event: Button event, currently ignored.
         """
         try:
-            self.interp_planes.interpolate(self.labels_img)
+            slices = self.interp_planes.interpolate(
+                self.labels_img, self.labels_bbox_index)
+            if slices is not None:
+                self.labels_journal.mark(slices)
             # flag Plot Editors as edited so labels can be saved
             for ed in self.plot_eds.values(): ed.edited = True
             self.refresh_images(None, True)
         except ValueError as e:
             print(e)
     
+    def undo_edit(self, redo=False):
+        """Undo or redo a painting stroke in :attr:`labels_history`.
+        
+        Args:
+            redo (bool): True to redo the last undone stroke; defaults to
+                False to undo the last stroke.
+        
+        Returns:
+            bool: True if a stroke was undone or redone.
+        """
+        if self.labels_history is None:
+            return False
+        slices = (self.labels_history.redo() if redo
+                  else self.labels_history.undo())
+        if slices is None:
+            print("No edits to", "redo" if redo else "undo")
+            return False
+        if self.labels_bbox_index is not None:
+            self.labels_bbox_index.update(slices)
+        self.labels_journal.mark(slices)
+        # flag Plot Editors as edited so labels can be saved
+        for ed in self.plot_eds.values(): ed.edited = True
+        self.refresh_images(None, True)
+        return True
+    
     def save_atlas(self, event):
         """Save atlas labels using the registered image suffix given by
         :attr:`config.reg_suffixes[config.RegSuffixes.ANNOTATION]`.
         
+        After the full labels image has been saved once by this editor,
+        later saves append only the edited regions to an edit journal
+        alongside the image, which is replayed when loading the image.
+        The full image is saved again, replacing the journal, when the
+        journal exceeds :attr:`JOURNAL_MAX_FRAC` of the image size or
+        when Shift-clicking to compact the journal.
+        
         Args:
-            event: Button event, currently not used.
+            event: Button event, where the "shift" key compacts the journal
+                into the full image.
         
         """
-        # only save if at least one editor has been edited
-        if not any([ed.edited for ed in self.plot_eds.values()]): return
+        # only save if at least one editor has been edited or edits from
+        # other Atlas Editors are pending
+        if (not any([ed.edited for ed in self.plot_eds.values()])
+                and not self.labels_journal.is_dirty()): return
         
-        # save to the labels reg suffix; use sitk Image if loaded and store
-        # any Image loaded during saving
         reg_name = config.reg_suffixes[config.RegSuffixes.ANNOTATION]
-        if self._labels_img_sitk is None:
-            self._labels_img_sitk = config.labels_img_sitk
-        self._labels_img_sitk = sitk_io.write_registered_image(
-            self.labels_img, config.filename, reg_name, self._labels_img_sitk,
-            overwrite=True)
+        path = sitk_io.reg_out_path(config.filename, reg_name)
+        journal_path = edit_journal.get_journal_path(path)
+        journal_size = os.path.getsize(journal_path) if os.path.exists(
+            journal_path) else 0
+        compact = getattr(event, "key", None) == "shift"
+        if (not compact and self.labels_journal.is_dirty()
+                and path == self.labels_journal.saved_path
+                and os.path.exists(path)
+                and journal_size
+                < self.labels_img.nbytes * self.JOURNAL_MAX_FRAC):
+            # append edited regions to the journal for the saved image
+            nbytes = self.labels_journal.write(self.labels_img, journal_path)
+            print("Journaled {} bytes of labels edits to {}"
+                  .format(nbytes, journal_path))
+        else:
+            # save to the labels reg suffix; use sitk Image if loaded and
+            # store any Image loaded during saving
+            if self._labels_img_sitk is None:
+                self._labels_img_sitk = config.labels_img_sitk
+            self._labels_img_sitk = sitk_io.write_registered_image(
+                self.labels_img, config.filename, reg_name,
+                self._labels_img_sitk, overwrite=True)
+            self.labels_journal.clear()
+            self.labels_journal.saved_path = path
         
         # reset edited flag in all editors and show save button as disabled
         for ed in self.plot_eds.values(): ed.edited = False
@@ -554,19 +654,25 @@ class InterpolatePlanes:
         self.bounds = i
         self.update_btn()
     
-    def interpolate(self, labels_img):
+    def interpolate(self, labels_img, bbox_index=None):
         """Interpolate between :attr:`bounds` in the given :attr:`plane` 
         direction in the bounding box surrounding :attr:`label_id`.
         
         Args:
             labels_img: Labels image as a Numpy array of x,y,z dimensions.
+            bbox_index (:obj:`magmap.cv.cv_nd.LabelBBoxIndex`): Index of
+                label bounding boxes in ``labels_img``; defaults to None.
+        
+        Returns:
+            List[slice]: Slices of the region that may have been updated,
+            or None if the label was not found.
         """
         if not all(self.bounds):
             raise ValueError("boundaries not fully set: {}".format(self.bounds))
         print("interpolating edits between planes", self.bounds)
-        cv_nd.interpolate_label_between_planes(
+        return cv_nd.interpolate_label_between_planes(
             labels_img, self.label_id, config.PLANE.index(self.plane), 
-            self.bounds)
+            self.bounds, bbox_index)
     
     def __str__(self):
         return "{}: {} (ID: {})".format(
@@ -6,7 +6,10 @@ Integrates with :class:``atlas_editor.AtlasEditor`` for synchronized 3D
 view of orthogonal planes.
 """
 
+from collections import OrderedDict
+import queue
 import textwrap
+import threading
 
 from matplotlib import patches
 import numpy as np
@@ -41,6 +44,311 @@ class PlotAxImg:
         self.img = np.copy(self.ax_img.get_array())
 
 
+class PlaneCache:
+    """Least-recently-used cache of 2D planes with background prefetching.
+
+    Planes are extracted by a function given to the cache and stored by
+    key. Prefetched planes are extracted in a background thread, which
+    runs until no prefetches remain. Each prefetch request supersedes any
+    pending prefetches from prior requests.
+
+    Attributes:
+        fn_get_plane (func): Function to extract a plane, taking a cache key.
+        max_size (int): Maximum number of planes to cache.
+        hits (int): Number of planes retrieved from the cache.
+        misses (int): Number of planes extracted on request.
+
+    """
+    def __init__(self, fn_get_plane, max_size=32):
+        self.fn_get_plane = fn_get_plane
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        
+        self._planes = OrderedDict()
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._generation = 0
+        self._thread = None
+
+    def _store(self, key, plane, generation=None):
+        # store a plane, evicting the least recently used planes; skip
+        # planes from a prefetch generation that has since been cleared
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._planes[key] = plane
+            self._planes.move_to_end(key)
+            while len(self._planes) > self.max_size:
+                self._planes.popitem(last=False)
+
+    def get(self, key):
+        """Get a plane, extracting it if not cached.
+
+        Args:
+            key (tuple): Cache key, passed to :attr:`fn_get_plane`.
+
+        Returns:
+            :obj:`np.ndarray`: The plane.
+
+        """
+        with self._lock:
+            plane = self._planes.get(key)
+            if plane is not None:
+                self._planes.move_to_end(key)
+                self.hits += 1
+                return plane
+            self.misses += 1
+        plane = self.fn_get_plane(key)
+        self._store(key, plane)
+        return plane
+
+    def _prefetch(self):
+        # extract planes from the queue, stopping once it is empty
+        while True:
+            with self._lock:
+                try:
+                    generation, key = self._queue.get_nowait()
+                except queue.Empty:
+                    self._thread = None
+                    return
+            try:
+                if generation != self._generation:
+                    # skip stale prefetches
+                    continue
+                with self._lock:
+                    cached = key in self._planes
+                if not cached:
+                    # avoid storing planes cleared during extraction
+                    self._store(key, self.fn_get_plane(key), generation)
+            except Exception as e:
+                # prefetching is optional, so only report errors
+                print("Unable to prefetch plane {}: {}".format(key, e))
+            finally:
+                self._queue.task_done()
+
+    def prefetch(self, keys):
+        """Prefetch planes in a background thread, canceling any pending
+        prefetches.
+
+        Args:
+            keys (List[tuple]): Sequence of cache keys to prefetch in order.
+
+        """
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+        for key in keys:
+            self._queue.put((generation, key))
+        with self._lock:
+            if self._thread is None and keys:
+                # start a thread, which stops after the queue is emptied
+                self._thread = threading.Thread(
+                    target=self._prefetch, daemon=True)
+                self._thread.start()
+
+    def wait(self):
+        """Wait for pending prefetches to complete."""
+        self._queue.join()
+
+    def clear(self, fn_filter=None):
+        """Remove planes from the cache and cancel pending prefetches.
+
+        Args:
+            fn_filter (func): Function taking a cache key and returning True
+                to remove the plane; defaults to None to remove all planes.
+
+        """
+        with self._lock:
+            self._generation += 1
+            for key in list(self._planes.keys()):
+                if fn_filter is None or fn_filter(key):
+                    del self._planes[key]
+
+
+class MaxIntensProjCache:
+    """Cache of block maxima for maximum intensity projections (MIPs) of a
+    sliding window of planes.
+
+    Planes are grouped into blocks the size of the window, storing the
+    running maxima from the start of each block to each plane and from each
+    plane to the end of its block. Any window is then the maximum of at
+    most two cached planes. Blocks are computed when first needed, so
+    scrolling through planes reads each plane about once rather than once
+    per window.
+
+    Attributes:
+        img3d (:obj:`np.ndarray`): 3D image from which to project planes.
+        nplanes (int): Number of planes in each projection.
+        max_blocks (int): Maximum number of blocks to cache.
+        planes_read (int): Number of planes read from :attr:`img3d`.
+
+    """
+    def __init__(self, img3d, nplanes, max_blocks=4):
+        self.img3d = img3d
+        self.nplanes = max(1, nplanes)
+        self.max_blocks = max_blocks
+        self.planes_read = 0
+        self._blocks = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_block(self, blocki):
+        # get the running maxima from the start and to the end of a block
+        block = self._blocks.get(blocki)
+        if block is None:
+            start = blocki * self.nplanes
+            planes = np.asarray(self.img3d[start:start + self.nplanes])
+            self.planes_read += len(planes)
+            block = (np.maximum.accumulate(planes, axis=0),
+                     np.maximum.accumulate(planes[::-1], axis=0)[::-1])
+            self._blocks[blocki] = block
+            while len(self._blocks) > self.max_blocks:
+                self._blocks.popitem(last=False)
+        self._blocks.move_to_end(blocki)
+        return block
+
+    def get(self, z):
+        """Get the maximum intensity projection for a window of planes.
+
+        Args:
+            z (int): First plane in the window, which extends for
+                :attr:`nplanes` planes or to the last plane.
+
+        Returns:
+            :obj:`np.ndarray`: The projected 2D plane.
+
+        """
+        with self._lock:
+            z_end = min(z + self.nplanes, len(self.img3d)) - 1
+            blocki, offset = divmod(z, self.nplanes)
+            block_endi, offset_end = divmod(z_end, self.nplanes)
+            img2d = self._get_block(blocki)[1][offset]
+            if block_endi != blocki:
+                # combine with the start of the next block
+                img2d = np.maximum(
+                    img2d, self._get_block(block_endi)[0][offset_end])
+            return img2d
+
+
+class LabelsEditHistory:
+    """Undo/redo history of label painting strokes.
+
+    Each stroke is stored as a diff of the flat indices of the pixels it
+    changed in the labels image with their old and new values. Values
+    are recorded as a stroke paints and combined when the stroke ends,
+    keeping the value before the first paint of each pixel. The oldest
+    strokes are discarded to keep the history within a memory limit.
+
+    Attributes:
+        labels_img (:obj:`np.ndarray`): Labels image in ``z,y,x``.
+        max_bytes (int): Maximum memory for the stored strokes, in bytes.
+
+    """
+    #: int: Default maximum memory for the stored strokes, in bytes.
+    MAX_BYTES = 64 * 1024 ** 2
+
+    def __init__(self, labels_img, max_bytes=MAX_BYTES):
+        self.labels_img = labels_img
+        self.max_bytes = max_bytes
+        self._undo = []
+        self._redo = []
+        # indices and old values recorded in the current stroke
+        self._stroke = []
+        # smallest data type for flat indices into the labels image
+        self._index_dtype = np.uint32 if labels_img.size <= np.iinfo(
+            np.uint32).max else np.int64
+
+    @property
+    def nbytes(self):
+        """Memory used by the stored strokes, in bytes."""
+        return sum([sum([a.nbytes for a in diff])
+                    for diff in self._undo + self._redo])
+
+    def can_undo(self):
+        """Check whether a stroke can be undone."""
+        return bool(self._undo)
+
+    def can_redo(self):
+        """Check whether an undone stroke can be redone."""
+        return bool(self._redo)
+
+    def record(self, coords):
+        """Record the current values of pixels about to be painted.
+
+        Args:
+            coords (Sequence[:obj:`np.ndarray`]): Coordinates of the pixels
+                in each axis of :attr:`labels_img`.
+
+        """
+        indices = np.ravel_multi_index(
+            tuple(coords), self.labels_img.shape).astype(self._index_dtype)
+        self._stroke.append((indices, self.labels_img[tuple(coords)]))
+
+    def end_stroke(self):
+        """End the current stroke and add it to the history.
+
+        Returns:
+            bool: True if the stroke changed any pixels and was stored.
+
+        """
+        if not self._stroke:
+            return False
+        indices = np.concatenate([s[0] for s in self._stroke])
+        old = np.concatenate([s[1] for s in self._stroke])
+        self._stroke = []
+        
+        # keep the values before the first paint of each pixel
+        indices, first = np.unique(indices, return_index=True)
+        old = old[first]
+        new = self.labels_img.flat[indices]
+        changed = old != new
+        if not np.any(changed):
+            return False
+        self._undo.append((indices[changed], old[changed], new[changed]))
+        self._redo = []
+        
+        # discard the oldest strokes to stay within the memory limit
+        nbytes = self.nbytes
+        while self._undo and nbytes > self.max_bytes:
+            nbytes -= sum([a.nbytes for a in self._undo.pop(0)])
+        return bool(self._undo)
+
+    def _apply(self, diff, vals_i):
+        # set the stroke's old or new values and get their bounding box
+        indices = diff[0]
+        self.labels_img.flat[indices] = diff[vals_i]
+        coords = np.unravel_index(indices, self.labels_img.shape)
+        return [slice(int(np.amin(c)), int(np.amax(c)) + 1) for c in coords]
+
+    def undo(self):
+        """Undo the last stroke.
+
+        Returns:
+            List[slice]: Slices of the bounding box of the changed pixels
+            in :attr:`labels_img`, or None if no stroke can be undone.
+
+        """
+        if not self._undo:
+            return None
+        diff = self._undo.pop()
+        self._redo.append(diff)
+        return self._apply(diff, 1)
+
+    def redo(self):
+        """Redo the last undone stroke.
+
+        Returns:
+            List[slice]: Slices of the bounding box of the changed pixels
+            in :attr:`labels_img`, or None if no stroke can be redone.
+
+        """
+        if not self._redo:
+            return None
+        diff = self._redo.pop()
+        self._undo.append(diff)
+        return self._apply(diff, 2)
+
+
 class PlotEditor:
     """Show a scrollable, editable plot of sequential planes in a 3D image.
 
@@ -58,9 +366,17 @@ class PlotEditor:
             planes are taken starting from the given z-value in ``coord``,
             limited by the number of planes available. Applied to the first
             intensity image.
+        plane_cache (:obj:`PlaneCache`): Cache of 2D planes for each image.
+        prefetch_planes (int): Number of planes to prefetch in the scrolling
+            direction for each image; defaults to
+            :const:`PREFETCH_PLANES`.
 
     """
     ALPHA_DEFAULT = 0.5
+    #: int: Default number of planes to prefetch for each image.
+    PREFETCH_PLANES = 3
+    #: int: Default number of planes to cache across images.
+    PLANE_CACHE_SIZE = 32
     _KEY_MODIFIERS = ("shift", "alt", "control")
     
     def __init__(self, axes, img3d, img3d_labels, cmap_labels, plane, 
@@ -68,7 +384,9 @@ class PlotEditor:
                  scaling=None, plane_slider=None, img3d_borders=None,
                  cmap_borders=None, fn_show_label_3d=None, interp_planes=None,
                  fn_update_intensity=None, max_size=None, fn_status_bar=None,
-                 img3d_extras=None):
+                 img3d_extras=None, img3d_pyramid=None,
+                 labels_bbox_index=None, labels_journal=None,
+                 labels_history=None):
         """Initialize the plot editor.
         
         Args:
@@ -109,6 +427,21 @@ class PlotEditor:
                 in :class:`pixel_display.PixelDisplay`; defaults to None.
             img3d_extras (List[:obj:`np.ndarray`]): Sequence of additional
                 intensity images to display; defaults to None.
+            img3d_pyramid (List[:obj:`np.ndarray`]): Sequence of
+                ``img3d`` downsampled in ``y,x`` by 2x for each level, such
+                as from :meth:`plot_support.make_plane_pyramid`, to display
+                in place of strided planes from ``img3d`` when downsampling
+                to ``max_size``. Levels may be None to skip them. Defaults
+                to None.
+            labels_bbox_index (:obj:`magmap.cv.cv_nd.LabelBBoxIndex`): Index
+                of label bounding boxes in the untransposed labels image, to
+                update for painted labels; defaults to None.
+            labels_journal (:obj:`magmap.io.edit_journal.EditJournal`):
+                Journal in which to mark painted regions of the untransposed
+                labels image; defaults to None.
+            labels_history (:obj:`LabelsEditHistory`): Undo history in
+                which to record painting strokes in the untransposed labels
+                image; defaults to None.
 
         """
         self.axes = axes
@@ -132,6 +465,9 @@ class PlotEditor:
         self.fn_update_intensity = fn_update_intensity
         self.fn_status_bar = fn_status_bar
         self.img3d_extras = img3d_extras
+        self.labels_bbox_index = labels_bbox_index
+        self.labels_journal = labels_journal
+        self.labels_history = labels_history
         
         self.intensity = None  # picked intensity of underlying img3d_label
         self.intensity_spec = None  # specified intensity
@@ -160,6 +496,8 @@ class PlotEditor:
         self.scale_bar = False
         self.max_intens_proj = 0
         self.enable_painting = True
+        self.plane_cache = PlaneCache(self._extract_img2d, self.PLANE_CACHE_SIZE)
+        self.prefetch_planes = self.PREFETCH_PLANES
 
         self._plot_ax_imgs = None
         self._ax_img_labels = None  # displayed labels image
@@ -169,6 +507,11 @@ class PlotEditor:
         self._show_labels = True  # show atlas labels on mouseover
         self._show_crosslines = False  # show crosslines to orthogonal views
 
+        # last displayed plane to track the scrolling direction
+        self._z_last = None
+        # block maxima for max intensity projections of the main image
+        self._mip_cache = None
+
         # ROI offset and size in z,y,x
         self._roi_offset = None
         self._roi_size = None
@@ -179,6 +522,7 @@ class PlotEditor:
         img3ds = [self.img3d, self.img3d_labels, self.img3d_borders]
         if self.img3d_extras is not None:
             img3ds.extend(self.img3d_extras)
+        self._img3ds = img3ds
         num_img3ds = len(img3ds)
         self._img3d_shapes = [None] * num_img3ds
         self._img3d_scales = [None] * num_img3ds
@@ -196,6 +540,29 @@ class PlotEditor:
                 if downsample > 1:
                     # only downsample if factor is over 1
                     self._downsample[i] = downsample
+        
+        # pyramid level and its downsampling factor for the main image
+        self._pyramid_level = None
+        self._pyramid_factor = 1
+        if img3d_pyramid and self._downsample[0] > 1:
+            # take the coarsest level not exceeding the downsampling factor
+            downsample = self._downsample[0]
+            for leveli, level in enumerate(img3d_pyramid):
+                if level is None: continue
+                factor = 2 ** (leveli + 1)
+                if self._pyramid_factor < factor <= downsample:
+                    self._pyramid_level = level
+                    self._pyramid_factor = factor
+            if self._pyramid_level is not None:
+                # stride through the level for any remaining factor, using
+                # the same total factor for images of the main image's shape
+                downsample_pyr = (
+                    self._pyramid_factor
+                    * (downsample // self._pyramid_factor))
+                for i, shape in enumerate(self._img3d_shapes):
+                    if (shape is not None and self._downsample[i] == downsample
+                            and shape[1:3] == self.img3d.shape[1:3]):
+                        self._downsample[i] = downsample_pyr
         print("plane {} downsampling factors by image: {}"
               .format(self.plane, self._downsample))
 
@@ -305,45 +672,143 @@ class PlotEditor:
                 self.hline.set_ydata(coord[1])
                 self.vline.set_xdata(coord[2])
 
-    def _get_img2d(self, i, img, max_intens=0):
-        """Get the 2D image from the given 3D image, scaling and downsampling
-        as necessary.
+    def _get_plane_index(self, i, z):
+        """Get the plane index in an image corresponding to the main image.
 
         Args:
-            i (int): Index of 3D image in sequence of 3D images, assuming
-                order of ``(main_image, labels_img, borders_img)``.
-            img (:obj:`np.ndarray`): 3D image from which to extract a 2D plane.
-            max_intens (int): Number of planes to incorporate for maximum
-                intensity projection; defaults to 0 to not perform this
-                projection.
+            i (int): Index of 3D image in sequence of 3D images.
+            z (int): Plane index in the main image.
 
         Returns:
-            :obj:`np.ndarray`: 2D plane, downsampled if necessary.
+            int: Plane index rescaled for the given image.
 
         """
-        z = self.coord[0]
-        z_scale = 1
         if self._img3d_scales[i] is not None:
             # rescale z-coordinate based on image scaling to the main image
+            z = int(z * self._img3d_scales[i][0])
+        return z
+
+    def _extract_img2d(self, key):
+        """Extract a 2D plane, downsampling as necessary.
+
+        Args:
+            key (tuple): Plane cache key in the format,
+                ``(i, z, max_intens)``, where ``i`` is the index of the image
+                in sequence of 3D images, ``z`` is the plane index already
+                rescaled for the image, and ``max_intens`` is the number of
+                planes for maximum intensity projection.
+
+        Returns:
+            :obj:`np.ndarray`: 2D plane, downsampled if necessary, copied
+            from the 3D image.
+
+        """
+        i, z, max_intens = key
+        img = self._img3ds[i]
+        z_scale = 1
+        if self._img3d_scales[i] is not None:
             z_scale = self._img3d_scales[i][0]
-            z = int(z * z_scale)
         # downsample to reduce access time; use same factor for both x and y
         # to retain aspect ratio
         downsample = self._downsample[i]
+        if i == 0 and self._pyramid_level is not None:
+            # take planes from the pyramid level instead of striding
+            img = self._pyramid_level
+            downsample //= self._pyramid_factor
         img = img[:, ::downsample, ::downsample]
         if max_intens:
             # max intensity projection (MIP) across the given number of
-            # planes available
-            z_stop = z + int(max_intens * z_scale)
-            num_z = len(img)
-            if z_stop > num_z:
-                z_stop = num_z
-            z_range = np.arange(z, z_stop)
-            img2d = plot_support.extract_planes(
-                img[None], z_range, max_intens_proj=True)[0]
+            # planes available, reusing maxima across overlapping windows
+            nplanes = int(max_intens * z_scale)
+            mip_cache = self._mip_cache if i == 0 else None
+            if mip_cache is None or mip_cache.nplanes != nplanes:
+                # reset the cache for a new image or number of planes
+                mip_cache = MaxIntensProjCache(img, nplanes)
+                if i == 0:
+                    self._mip_cache = mip_cache
+            img2d = mip_cache.get(z)
         else:
             img2d = img[z]
-        return img2d
+        return np.array(img2d)
+
+    def _get_img2d(self, i, img, max_intens=0):
+        """Get the 2D image from the given 3D image, scaling and downsampling
+        as necessary.
+
+        Args:
+            i (int): Index of 3D image in sequence of 3D images, assuming
+                order of ``(main_image, labels_img, borders_img)``.
+            img (:obj:`np.ndarray`): 3D image from which to extract a 2D plane.
+            max_intens (int): Number of planes to incorporate for maximum
+                intensity projection; defaults to 0 to not perform this
+                projection.
+
+        Returns:
+            :obj:`np.ndarray`: 2D plane, downsampled if necessary.
+
+        """
+        if img is not self._img3ds[i]:
+            # replace the image and its cached planes
+            self._img3ds[i] = img
+            self.plane_cache.clear(lambda k: k[0] == i)
+            if i == 0:
+                self._mip_cache = None
+        return self.plane_cache.get(
+            (i, self._get_plane_index(i, self.coord[0]), max_intens))
+
+    def prefetch(self):
+        """Prefetch planes following the current plane in the scrolling
+        direction for each image in the background.
+
+        Pending prefetches are canceled, including those in the opposite
+        direction after the scrolling direction changes.
+
+        """
+        if not self.prefetch_planes:
+            return
+        z = self.coord[0]
+        step = -1 if self._z_last is not None and z < self._z_last else 1
+        self._z_last = z
+        keys = []
+        for n in range(1, self.prefetch_planes + 1):
+            z_next = z + n * step
+            if not 0 <= z_next < self._img3d_shapes[0][0]:
+                break
+            for i, img in enumerate(self._img3ds):
+                if img is None: continue
+                keys.append((
+                    i, self._get_plane_index(i, z_next),
+                    self.max_intens_proj if i == 0 else 0))
+        self.plane_cache.prefetch(keys)
+
+    def clear_labels_cache(self):
+        """Clear cached planes of the labels image, such as after editing."""
+        self.plane_cache.clear(lambda k: k[0] == 1)
+
+    def _mark_labels_edited(self, rows, cols):
+        """Update the label bounding box index and journal for a painted
+        region.
+
+        Args:
+            rows (:obj:`np.ndarray`): Painted row indices in the current
+                plane of the labels image.
+            cols (:obj:`np.ndarray`): Painted column indices.
+
+        """
+        if (self.labels_bbox_index is None and self.labels_journal is None
+                or len(rows) == 0):
+            return
+        # transpose the region's bounds back to the index's orientation
+        start = np.array((self.coord[0], np.amin(rows), np.amin(cols)))
+        stop = np.array(
+            (self.coord[0] + 1, np.amax(rows) + 1, np.amax(cols) + 1))
+        start, stop = plot_support.transpose_images(
+            self.plane, arrs_1d=(start, stop), rev=True)[1]
+        slices = [slice(a, b) for a, b in zip(start, stop)]
+        if self.labels_bbox_index is not None:
+            self.labels_bbox_index.update(slices)
+        if self.labels_journal is not None:
+            self.labels_journal.mark(slices)
 
     def show_overview(self):
         """Show the main 2D plane, taken as a z-plane."""
@@ -408,6 +873,9 @@ class PlotEditor:
                 vmaxs.append(None)
                 vmins.append(None)
 
+        # load upcoming planes in the background
+        self.prefetch()
+
         # overlay all images and set labels for footer value on mouseover;
         # if first time showing image, need to check for images with single
         # value since they fail to update on subsequent updates for unclear
@@ -536,6 +1004,7 @@ class PlotEditor:
     def refresh_img3d_labels(self):
         """Replace the displayed labels image with underlying plane's data.
         """
+        self.clear_labels_cache()
         if self._ax_img_labels is not None:
             # underlying plane may need to be translated to a linear
             # scale for the colormap before display
@@ -841,8 +1310,16 @@ class PlotEditor:
                                 coord[1], coord[2],
                                 self.radius * self._downsample[0],
                                 self.img3d_labels[self.coord[0]].shape)
+                            if self.labels_history is not None:
+                                # record coordinates in the untransposed image
+                                self.labels_history.record(
+                                    libmag.transpose_1d_rev([
+                                        np.full_like(rr, self.coord[0]), rr,
+                                        cc], self.plane))
                             self.img3d_labels[
                                 self.coord[0], rr, cc] = self.intensity
+                            self.clear_labels_cache()
+                            self._mark_labels_edited(rr, cc)
                             print("changed intensity at x,y,z = {},{},{} to {}"
                                   .format(*coord[::-1], self.intensity))
                             if self.fn_refresh_images is None:
@@ -905,7 +1382,8 @@ class PlotEditor:
         """Respond to mouse button release events.
 
         If labels were edited during the current mouse press, update
-        plane interpolation values. Also reset any specified intensity value.
+        plane interpolation values and end the stroke in the undo history.
+        Also reset any specified intensity value.
         
         Args:
             event: Key press event.
@@ -914,6 +1392,8 @@ class PlotEditor:
             if self.interp_planes is not None:
                 self.interp_planes.update_plane(
                     self.plane, self.coord[0], self.intensity)
+            if self.labels_history is not None:
+                self.labels_history.end_stroke()
             self._editing = False
 
         if self.intensity_spec is not None:
@@ -16,11 +16,13 @@ import re
 from time import time
 
 import numpy as np
+from matplotlib import colors
 from matplotlib import figure
 from matplotlib import gridspec
 from matplotlib import patches
 from matplotlib import pyplot as plt
 from matplotlib.collections import PatchCollection
+from scipy import spatial
 
 from magmap.cv import detector
 from magmap.gui import pixel_display, plot_editor
@@ -33,7 +35,7 @@ verify = False
 
 class DraggableCircle:
     """Circle representation of a blob to allow the user to manipulate 
-    blob position, size, and status.
+    blob position and size by dragging.
     
     Attributes:
         BLOB_COLORS (:obj:`dict`): Mapping of integers to ``Matplotlib`` 
@@ -46,6 +48,8 @@ class DraggableCircle:
             `(segment_new, segment_old)` to call when updating the blob.
         picked (:obj:`list`): List of picked, active blobs in the 
             tuple format, `(segment, pick_flag)`.
+        fn_release (func): Function that takes this object to call after
+            the drag is completed.
     
     """
     
@@ -64,7 +68,8 @@ class DraggableCircle:
 
     picked = None
 
-    def __init__(self, circle, segment, fn_update_seg, picked, color="none"):
+    def __init__(self, circle, segment, fn_update_seg, picked, color="none",
+                 fn_release=None):
         """Initialize a circle from a blob.
         
         Args:
@@ -77,6 +82,8 @@ class DraggableCircle:
                 tuple format, `(segment, pick_flag)`.
             color (str, optional): ``Matplotlib`` color string for the circle; 
                 defaults to "none".
+            fn_release (func): Function that takes this object to call after
+                the drag is completed; defaults to None.
         
         """
         self.circle = circle
@@ -88,6 +95,7 @@ class DraggableCircle:
         self.segment = segment
         self.fn_update_seg = fn_update_seg
         self.picked = picked
+        self.fn_release = fn_release
 
         self._press = None  # event position
         self._background = None  # bbox of bkgd for blitting
@@ -96,7 +104,6 @@ class DraggableCircle:
         self._cidpress = None
         self._cidrelease = None
         self._cidmotion = None
-        self._cidpick = None
 
     def connect(self):
         """Connect events to functions.
@@ -107,8 +114,6 @@ class DraggableCircle:
             "button_release_event", self.on_release)
         self._cidmotion = self.circle.figure.canvas.mpl_connect(
             "motion_notify_event", self.on_motion)
-        self._cidpick = self.circle.figure.canvas.mpl_connect(
-            "pick_event", self.on_pick)
         #print("connected circle at {}".format(self.circle.center))
 
     def remove_self(self):
@@ -188,61 +193,253 @@ class DraggableCircle:
         DraggableCircle.lock = None
         self.circle.set_animated(False)
         self._background = None
-        self.circle.figure.canvas.draw()
+        canvas = self.circle.figure.canvas
+        if self.fn_release:
+            self.fn_release(self)
+        canvas.draw()
+
+    def disconnect(self):
+        """Disconnect event listeners.
+        """
+        self.circle.figure.canvas.mpl_disconnect(self._cidpress)
+        self.circle.figure.canvas.mpl_disconnect(self._cidrelease)
+        self.circle.figure.canvas.mpl_disconnect(self._cidmotion)
+
+
+class BlobCircles:
+    """Pickable circles for the blobs in a plot, drawn as a single
+    collection.
+    
+    Blobs are drawn in one :class:`PatchCollection` rather than as separate
+    artists, and mouse presses are resolved to blobs through a KD-tree of
+    blob centers. A :class:`DraggableCircle` is created only for a blob
+    while it is dragged.
+    
+    Attributes:
+        ax (:obj:`matplotlib.axes.Axes`): Plot axes.
+        fn_update_seg (func): Function that takes
+            ``(segment_new, segment_old)`` to call when updating a blob.
+        picked (list): List of picked, active blobs in the tuple format,
+            ``(segment, pick_flag)``.
+        linewidth (float): Edge line width.
+        alpha (float): Alpha transparency level.
+        edgecolor (str): Circle edge color.
+        segments (List[:obj:`np.ndarray`]): Blobs in the format,
+            ``[z, y, x, r, confirmation, truth, ...]``, which are updated
+            in place.
+        collection (:obj:`PatchCollection`): Collection of the blob circles.
+    
+    """
+    def __init__(self, ax, fn_update_seg, picked, linewidth, alpha=0.5,
+                 edgecolor="w"):
+        """Initialize the blob circles.
+        
+        Args:
+            ax (:obj:`matplotlib.axes.Axes`): Plot axes.
+            fn_update_seg (func): Function that takes
+                ``(segment_new, segment_old)`` to call when updating a blob.
+            picked (list): List of picked, active blobs in the tuple format,
+                ``(segment, pick_flag)``.
+            linewidth (float): Edge line width.
+            alpha (float): Alpha transparency level; defaults to 0.5.
+            edgecolor (str): Circle edge color; defaults to "w" for white.
+        
+        """
+        self.ax = ax
+        self.fn_update_seg = fn_update_seg
+        self.picked = picked
+        self.linewidth = linewidth
+        self.alpha = alpha
+        self.edgecolor = edgecolor
+        self.segments = []
+        self._linestyles = []
+        self._tree = None  # KD-tree of x,y blob centers
+        self._radii = None
+        self._drag = None  # DraggableCircle for the blob being dragged
+        
+        self.collection = PatchCollection([], linewidth=linewidth)
+        ax.add_collection(self.collection)
+    
+    @staticmethod
+    def _get_facecolor(segment):
+        # get the face color for the blob's confirmation flag
+        return DraggableCircle.BLOB_COLORS[
+            detector.get_blob_confirmed(segment)]
+    
+    def _to_rgba(self, color):
+        # apply alpha to colors except "none", which remains transparent
+        return (0, 0, 0, 0) if color == "none" else colors.to_rgba(
+            color, self.alpha)
+    
+    def add(self, segments, linestyles):
+        """Add blobs.
+        
+        Args:
+            segments (Sequence[:obj:`np.ndarray`]): Blobs to add.
+            linestyles (Sequence): Edge line style for each blob.
+
+        """
+        self.segments.extend(segments)
+        self._linestyles.extend(linestyles)
+        self.update()
+    
+    def remove(self, i):
+        """Remove a blob.
+        
+        Args:
+            i (int): Index of the blob in :attr:`segments`.
 
-    def on_pick(self, event):
-        """Select the verification flag with button press on a circle when
-        not dragging the circle.
         """
-        if (event.mouseevent.key in ("control", "shift", "alt")
-                or event.artist != self.circle):
+        del self.segments[i]
+        del self._linestyles[i]
+        self.update()
+    
+    def update(self):
+        """Update the collection with blob positions, sizes, and flags."""
+        circles = []
+        facecolors = []
+        for seg in self.segments:
+            # hide the blob being dragged
+            radius = 0 if self._drag is not None and self._drag.segment is seg \
+                else ROIEditor._get_radius(seg)
+            circles.append(patches.Circle((seg[2], seg[1]), radius=radius))
+            facecolors.append(self._to_rgba(self._get_facecolor(seg)))
+        self.collection.set_paths(circles)
+        self.collection.set_facecolor(facecolors)
+        self.collection.set_edgecolor(self._to_rgba(self.edgecolor))
+        if self._linestyles:
+            self.collection.set_linestyle(self._linestyles)
+        self._tree = None
+    
+    def get_blob_at(self, x, y):
+        """Get the blob at a position.
+        
+        Args:
+            x (float): x-coordinate in data units.
+            y (float): y-coordinate in data units.
+
+        Returns:
+            int: Index in :attr:`segments` of the blob whose circle contains
+            the position and whose center is closest to it, or None if no
+            circle contains the position.
+
+        """
+        if not self.segments:
+            return None
+        if self._tree is None:
+            # build the tree lazily after blobs change
+            self._tree = spatial.cKDTree(
+                [(seg[2], seg[1]) for seg in self.segments])
+            self._radii = np.array(
+                [ROIEditor._get_radius(seg) for seg in self.segments])
+        inds = self._tree.query_ball_point((x, y), np.amax(self._radii))
+        if not inds:
+            return None
+        inds = np.array(inds)
+        dists = np.linalg.norm(self._tree.data[inds] - (x, y), axis=1)
+        within = dists <= self._radii[inds]
+        if not np.any(within):
+            return None
+        return int(inds[within][np.argmin(dists[within])])
+    
+    def on_press(self, event):
+        """Handle a mouse press on a blob.
+        
+        Shift- or Alt-click to move or resize the blob. Click to cycle
+        through verification flags, or "r"-click to cycle in reverse. Press
+        "x", "c", or "d" while clicking to cut, copy, or delete the blob.
+        
+        Args:
+            event (:obj:`matplotlib.backend_bases.MouseEvent`): Mouse event.
+
+        """
+        if (self._drag is not None or event.inaxes != self.ax
+                or event.xdata is None or event.key is not None
+                and (event.key == "control" or event.key.startswith("ctrl"))):
             return
-        #print("color: {}".format(self.facecolori))
-        if event.mouseevent.key == "x":
+        i = self.get_blob_at(event.xdata, event.ydata)
+        if i is None:
+            return
+        if event.key in ("shift", "alt"):
+            self._start_drag(i, event)
+        else:
+            self.pick(i, event.key)
+    
+    def _start_drag(self, i, event):
+        # replace the blob with a draggable circle until the drag is done
+        seg = self.segments[i]
+        facecolor = self._get_facecolor(seg)
+        circle = patches.Circle(
+            (seg[2], seg[1]), radius=ROIEditor._get_radius(seg),
+            edgecolor=self.edgecolor, facecolor=facecolor,
+            linewidth=self.linewidth, linestyle=self._linestyles[i],
+            alpha=self.alpha)
+        self.ax.add_patch(circle)
+        self._drag = DraggableCircle(
+            circle, seg, self.fn_update_seg, self.picked, facecolor,
+            self._end_drag)
+        self._drag.connect()
+        self.update()
+        self._drag.on_press(event)
+        if self._drag._press is None:
+            # drag not initiated
+            self._end_drag(self._drag)
+            self.ax.figure.canvas.draw_idle()
+    
+    def _end_drag(self, drag):
+        # remove the draggable circle and show the blob at its new position
+        drag.disconnect()
+        drag.circle.remove()
+        self._drag = None
+        self.update()
+    
+    def pick(self, i, key=None):
+        """Pick a blob to change its verification flag or to cut, copy,
+        or delete it.
+        
+        Args:
+            i (int): Index of the blob in :attr:`segments`.
+            key (str): Key pressed during the pick; defaults to None.
+
+        """
+        seg = self.segments[i]
+        if key == "x":
             # "cut" segment
-            self.picked.append((self, self.CUT))
-            self.remove_self()
-            print("cut seg: {}".format(self.segment))
-        elif event.mouseevent.key == "c":
+            self.picked.append((seg, DraggableCircle.CUT))
+            self.remove(i)
+            print("cut seg: {}".format(seg))
+        elif key == "c":
             # "copy" segment
-            self.picked.append((self, self._COPY))
-            print("copied seg: {}".format(self.segment))
-        elif event.mouseevent.key == "d":
+            self.picked.append((seg, DraggableCircle._COPY))
+            print("copied seg: {}".format(seg))
+        elif key == "d":
             # delete segment, which will be stored as cut segment to allow
             # undoing the deletion by pasting
-            self.picked.append((self, self.CUT))
-            self.remove_self()
-            self.fn_update_seg(self.segment, remove=True)
-            print("deleted seg: {}".format(self.segment))
+            self.picked.append((seg, DraggableCircle.CUT))
+            self.remove(i)
+            self.fn_update_seg(seg, remove=True)
+            print("deleted seg: {}".format(seg))
         else:
             # change verification flag
-            seg_old = np.copy(self.segment)
+            seg_old = np.copy(seg)
             # "r"-click to change flag in reverse order
-            change = -1 if event.mouseevent.key == "r" else 1
-            i = self._facecolori + change
+            change = -1 if key == "r" else 1
+            flag = int(detector.get_blob_confirmed(seg)) + change
             # wrap around keys if exceeding min/max
-            if i > max(self.BLOB_COLORS.keys()):
-                if self.segment[3] < config.POS_THRESH:
+            blob_colors = DraggableCircle.BLOB_COLORS
+            if flag > max(blob_colors.keys()):
+                if seg[3] < config.POS_THRESH:
                     # user-added segments simply disappear when exceeding
-                    self.picked.append((self, self.CUT))
-                    self.remove_self()
-                i = -1
-            elif i < min(self.BLOB_COLORS.keys()):
-                i = max(self.BLOB_COLORS.keys())
-            self.circle.set_facecolor(self.BLOB_COLORS[i])
-            self._facecolori = i
-            self.segment[4] = i
-            self.fn_update_seg(self.segment, seg_old)
-            print("picked segment: {}".format(self.segment))
-        self.circle.figure.canvas.draw()
-
-    def disconnect(self):
-        """Disconnect event listeners.
-        """
-        self.circle.figure.canvas.mpl_disconnect(self._cidpress)
-        self.circle.figure.canvas.mpl_disconnect(self._cidrelease)
-        self.circle.figure.canvas.mpl_disconnect(self._cidmotion)
-        self.circle.figure.canvas.mpl_disconnect(self._cidpick)
+                    self.picked.append((seg, DraggableCircle.CUT))
+                    self.remove(i)
+                flag = -1
+            elif flag < min(blob_colors.keys()):
+                flag = max(blob_colors.keys())
+            seg[4] = flag
+            self.update()
+            self.fn_update_seg(seg, seg_old)
+            print("picked segment: {}".format(seg))
+        self.ax.figure.canvas.draw()
 
 
 class ROIEditor(plot_support.ImageSyncMixin):
@@ -253,7 +450,7 @@ class ROIEditor(plot_support.ImageSyncMixin):
     zoom levels, which can be synchronized with the selected 2D plane or
     scrolled to other planes.
 
-    Overlays detected blobs as :class:``DraggableCircle`` objects to
+    Overlays detected blobs as :class:``BlobCircles`` collections to
     flag, reposition, or add/subtract annotations.
 
     :attr:`plot_eds` are dictionaries where keys are zoom levels and values
@@ -357,8 +554,8 @@ class ROIEditor(plot_support.ImageSyncMixin):
         self._z_overview = None
         self._channel = None  # list of channel lists
         
-        # store DraggableCircles objects to prevent premature garbage collection
-        self._draggable_circles = []
+        # pickable blob circles for each zoomed plot
+        self._blob_circles = {}
         self._circle_last_picked = []
         self._ax_subplots = OrderedDict()  # PlotAxImg for each zoomed plot
 
@@ -514,8 +711,8 @@ class ROIEditor(plot_support.ImageSyncMixin):
         """Shows a figure of 2D plots to compare with the 3D plot.
 
         Args:
-            fn_update_seg (func): Callback when updating a 
-                :obj:`DraggableCircle`.
+            fn_update_seg (func): Callback when updating a blob in
+                :obj:`BlobCircles`.
             filename (str): Path to use when saving the plot.
             channel: Channel of the image to display.
             roi_size: List of x,y,z dimensions of the ROI.
@@ -586,6 +783,7 @@ class ROIEditor(plot_support.ImageSyncMixin):
             fig = figure.Figure()
         fig.clear()
         self.fig = fig
+        self._blob_circles = {}
 
         # black text with transluscent background the color of the figure
         # background in case the title is a 2D plot
@@ -733,7 +931,7 @@ class ROIEditor(plot_support.ImageSyncMixin):
                 scroll_overview(event)
 
         def on_btn_release(event):
-            # respond to mouse button presses for DraggableCircle management
+            # respond to mouse button presses for blob circle management
             inax = event.inaxes
             print("event key: {}".format(event.key))
             subplots = list(self._ax_subplots.keys())
@@ -770,37 +968,15 @@ class ROIEditor(plot_support.ImageSyncMixin):
                         detector.set_blob_confirmed(blob, 1)
                         blob = fn_update_seg(blob[0])
                         # adds a circle to denote the new segment
-                        patch = self._plot_circle(
-                            inax, blob, self._BLOB_LINEWIDTH, "-",
+                        self._plot_circles(
+                            inax, [blob], self._BLOB_LINEWIDTH, "-",
                             fn_update_seg)
                 except ValueError as e:
                     print(e)
                     print("not on a plot to select a point")
                 fig.canvas.draw_idle()
             elif event.key == "v":
-                _circle_last_picked_len = len(self._circle_last_picked)
-                if _circle_last_picked_len < 1:
-                    print("No previously picked circle to paste")
-                    return
-                moved_item = self._circle_last_picked[
-                    _circle_last_picked_len - 1]
-                circle, move_type = moved_item
-                axi = subplots.index(inax)
-                dz = axi - self._z_planes_padding - circle.segment[0]
-                seg_old = np.copy(circle.segment)
-                seg_new = np.copy(circle.segment)
-                seg_new[0] += dz
-                if move_type == DraggableCircle.CUT:
-                    print("Pasting a cut segment")
-                    self._draggable_circles.remove(circle)
-                    self._circle_last_picked.remove(moved_item)
-                    seg_new = fn_update_seg(seg_new, seg_old)
-                else:
-                    print("Pasting a copied in segment")
-                    detector.shift_blob_abs_coords(seg_new, (dz, 0, 0))
-                    seg_new = fn_update_seg(seg_new)
-                self._plot_circle(
-                    inax, seg_new, self._BLOB_LINEWIDTH, None, fn_update_seg)
+                self._paste_circle(inax, subplots.index(inax), fn_update_seg)
                 fig.canvas.draw_idle()
 
         # overview images taken from the bottom plane of the offset, with
@@ -915,6 +1091,8 @@ class ROIEditor(plot_support.ImageSyncMixin):
             regex_key_chl = re.compile(r"\+[0-9]+$")
             
             fig.canvas.mpl_connect("button_release_event", on_btn_release)
+            # pick and drag blob circles
+            fig.canvas.mpl_connect("button_press_event", self._on_circle_press)
             # reset circles window flag
             fig.canvas.mpl_connect("close_event", fn_close_listener)
 
@@ -1296,11 +1474,11 @@ class ROIEditor(plot_support.ImageSyncMixin):
                                 (segments_z, segs_out_z_confirmed))
                             print("segs_out_z_confirmed:\n{}"
                                   .format(segs_out_z_confirmed))
-                if segments_z is not None:
+                if segments_z is not None and len(segments_z) > 0:
                     # show pickable circles
-                    for seg in segments_z:
-                        self._plot_circle(
-                            ax, seg, self._BLOB_LINEWIDTH, None, fn_update_seg)
+                    self._plot_circles(
+                        ax, segments_z, self._BLOB_LINEWIDTH, None,
+                        fn_update_seg)
                 
                 if (self.blobs is not None
                         and self.blobs.blob_matches is not None):
@@ -1363,41 +1541,79 @@ class ROIEditor(plot_support.ImageSyncMixin):
         collection.set_linewidth(linewidth)
         return collection
 
-    def _plot_circle(self, ax, segment, linewidth, linestyle, fn_update_seg,
-                     alpha=0.5, edgecolor="w"):
-        """Create and draw a DraggableCircle from the given segment.
+    def _plot_circles(self, ax, segments, linewidth, linestyle,
+                      fn_update_seg, alpha=0.5, edgecolor="w"):
+        """Add pickable circles for the given segments to the axes'
+        :class:`BlobCircles`.
 
         Args:
             ax: Matplotlib axes.
-            segment: Numpy array of segments, generally as an (n, 4)
-                dimension array, where each segment is in (z, y, x, radius).
-            linewidth: Edge line width.
-            linestyle: Edge line style.
-            fn_update_seg: Function to call from DraggableCircle.
+            segments: Sequence of segments, where each segment is generally
+                in (z, y, x, radius, confirmed, truth, channel). Segments
+                are updated in place when the circles are edited.
+            linewidth: Edge line width, used only when creating the
+                blob circles for the axes.
+            linestyle: Edge line style, or None to use the style for
+                each segment's channel.
+            fn_update_seg: Function to call when updating a segment.
             alpha: Alpha transparency level; defaults to 0.5.
             edgecolor: String of circle edge color; defaults to "w" for white.
 
         Returns:
-            The DraggableCircle object.
+            The :class:`BlobCircles` object for the axes.
         """
-        channel = detector.get_blob_channel(segment)
-        facecolor = DraggableCircle.BLOB_COLORS[
-            detector.get_blob_confirmed(segment)]
-        if linestyle is None:
-            linestyle = self._BLOB_LINESTYLES[channel]
-        circle = patches.Circle(
-            (segment[2], segment[1]), radius=self._get_radius(segment),
-            edgecolor=edgecolor, facecolor=facecolor, linewidth=linewidth,
-            linestyle=linestyle, alpha=alpha)
-        ax.add_patch(circle)
-        #print("added circle: {}".format(circle))
-        draggable_circle = DraggableCircle(
-            circle, segment, fn_update_seg, self._circle_last_picked, facecolor)
-        draggable_circle.connect()
-        self._draggable_circles.append(draggable_circle)
-        return draggable_circle
-
-    def _get_radius(self, seg):
+        blob_circles = self._blob_circles.get(ax)
+        if blob_circles is None:
+            blob_circles = BlobCircles(
+                ax, fn_update_seg, self._circle_last_picked, linewidth, alpha,
+                edgecolor)
+            self._blob_circles[ax] = blob_circles
+        linestyles = [
+            self._BLOB_LINESTYLES[detector.get_blob_channel(seg)]
+            if linestyle is None else linestyle for seg in segments]
+        blob_circles.add(list(segments), linestyles)
+        return blob_circles
+
+    def _paste_circle(self, ax, axi, fn_update_seg):
+        """Paste the last cut or copied blob into a zoomed plot.
+        
+        Args:
+            ax: Matplotlib axes of the zoomed plot.
+            axi (int): Index of the plot among the zoomed plots.
+            fn_update_seg: Function to call when updating a segment.
+
+        Returns:
+            The pasted segment, or None if no blob has been cut or copied.
+        """
+        if len(self._circle_last_picked) < 1:
+            print("No previously picked circle to paste")
+            return None
+        seg, move_type = self._circle_last_picked[-1]
+        dz = axi - self._z_planes_padding - seg[0]
+        seg_old = np.copy(seg)
+        seg_new = np.copy(seg)
+        seg_new[0] += dz
+        if move_type == DraggableCircle.CUT:
+            print("Pasting a cut segment")
+            # the pasted item is always the last one
+            self._circle_last_picked.pop()
+            seg_new = fn_update_seg(seg_new, seg_old)
+        else:
+            print("Pasting a copied in segment")
+            detector.shift_blob_abs_coords(seg_new, (dz, 0, 0))
+            seg_new = fn_update_seg(seg_new)
+        self._plot_circles(
+            ax, [seg_new], self._BLOB_LINEWIDTH, None, fn_update_seg)
+        return seg_new
+
+    def _on_circle_press(self, event):
+        """Handle mouse presses on the blob circles in the pressed axes."""
+        blob_circles = self._blob_circles.get(event.inaxes)
+        if blob_circles is not None:
+            blob_circles.on_press(event)
+
+    @staticmethod
+    def _get_radius(seg):
         """Gets the radius for a segments, defaulting to 5 if the segment's
         radius is close to 0.
 
@@ -1460,11 +1676,9 @@ class ROIEditor(plot_support.ImageSyncMixin):
                 invisibility.
 
         """
-        for circle in self._draggable_circles:
-            # change the visibility of selectable circles
-            circle.circle.set_visible(visible)
         for ax in self._ax_subplots.keys():
             for collection in ax.collections:
-                # change the visibility of colored circle collections
+                # change the visibility of colored and selectable circle
+                # collections
                 collection.set_visible(visible)
         self.fig.canvas.draw_idle()
@@ -12,6 +12,139 @@ from magmap.plot import colormaps, plot_3d
 from magmap.settings import config
 
 
+def get_3d_points(roi, channel, flipz=False, offset=None, max_points=None):
+    """Get the coordinates and intensities of ROI pixels as 3D points.
+    
+    The ROI is saturated and denoised, and pixels below a threshold based
+    on the Otsu threshold and the ``points_3d_thresh`` ROI profile setting
+    are removed. Coordinates are only generated for the remaining pixels.
+    
+    Args:
+        roi (:class:`numpy.ndarray`): Region of interest either as a 3D
+            ``z,y,x`` or 4D ``z,y,x,c`` array.
+        channel (int): Channel to select, which can be None to indicate all
+            channels.
+        flipz (bool): True to invert the ROI along the z-axis to match
+            the handedness of Matplotlib with z progressing upward;
+            defaults to False.
+        offset (Sequence[int]): Origin coordinates in ``z,y,x``; defaults
+            to None.
+        max_points (int): Maximum number of points for each channel, taking
+            every n-th point to stay within this number; defaults to None
+            to use the ``points_3d_max`` ROI profile setting for the channel.
+    
+    Returns:
+        List[tuple[int, :class:`numpy.ndarray`, :class:`numpy.ndarray`]]:
+        List of ``(channel, coords, scalars)`` for each channel, where
+        ``coords`` is an ``(n, 3)`` array of ``z,y,x`` coordinates in the same
+        order as the pixels in ``roi``, scaled for isotropy and shifted by
+        ``offset``, and ``scalars`` is the corresponding pixel intensities
+        normalized to 0.6-1.0.
+    
+    """
+    # streamline the image
+    roi = plot_3d.saturate_roi(roi, clip_vmax=98.5, channel=channel)
+    roi = np.clip(roi, 0.2, 0.8)
+    roi = restoration.denoise_tv_chambolle(roi, weight=0.1)
+    
+    isotropic = plot_3d.get_isotropic_vis(config.roi_profile)
+    scale = np.array(isotropic, dtype=float)
+    if flipz:
+        # invert along z-axis to match handedness of Matplotlib with z up
+        scale[0] *= -1
+    if offset is not None:
+        offset = np.multiply(offset, scale)
+    
+    points = []
+    multichannel, channels = plot_3d.setup_channels(roi, channel, 3)
+    for chl in channels:
+        roi_show = roi[..., chl] if multichannel else roi
+        settings = config.get_roi_profile(chl)
+        
+        # clear background points to see remaining structures
+        thresh = 0
+        if len(np.unique(roi_show)) > 1:
+            # need > 1 val to threshold
+            try:
+                thresh = filters.threshold_otsu(roi_show, 64)
+            except ValueError:
+                thresh = np.median(roi_show)
+                print("could not determine Otsu threshold, taking median "
+                      "({}) instead".format(thresh))
+            thresh *= settings["points_3d_thresh"]
+        print("removing 3D points below threshold of {}".format(thresh))
+        keep = ~(roi_show < thresh)
+        scalars = roi_show[keep]
+        
+        # scale coordinates of remaining points for isotropy and translate
+        # by offset
+        coords = np.column_stack(np.nonzero(keep)).astype(float)
+        coords *= scale
+        if offset is not None:
+            coords += offset
+        
+        # adjust range from 0-1 to region of colormap to use
+        scalars = libmag.normalize(scalars, 0.6, 1.0)
+        
+        # take every n-th point to stay within the max number of points
+        max_pts = settings["points_3d_max"] if max_points is None \
+            else max_points
+        if max_pts and len(scalars) > max_pts:
+            step = math.ceil(len(scalars) / max_pts)
+            coords = coords[::step]
+            scalars = scalars[::step]
+            print("decimated 3D points by {} to {}".format(step, len(scalars)))
+        points.append((chl, coords, scalars))
+    return points
+
+
+def bin_blobs(coords, bin_size, detail_offset=None, detail_size=None,
+              coords_avg=None):
+    """Aggregate blobs into bins of a voxel grid outside of a detail region.
+    
+    Args:
+        coords (:class:`numpy.ndarray`): Blob coordinates as a 2D array
+            in ``[[z, y, x], ...]`` format.
+        bin_size (Union[float, Sequence[float]]): Size of each bin, either
+            as a scalar or sequence in ``z,y,x``.
+        detail_offset (Sequence[float]): Offset of the detail region in
+            ``z,y,x``, where blobs are not aggregated; defaults to None to
+            aggregate all blobs.
+        detail_size (Sequence[float]): Size of the detail region in ``z,y,x``;
+            defaults to None.
+        coords_avg (:class:`numpy.ndarray`): Coordinates to average for
+            each bin, in the same order as ``coords``, such as coordinates
+            transformed for display; defaults to None to use ``coords``.
+    
+    Returns:
+        :class:`numpy.ndarray`, :class:`numpy.ndarray`,
+        :class:`numpy.ndarray`: Boolean mask of blobs within the detail
+        region, which are not aggregated; mean coordinates of the blobs in
+        each bin as a 2D array; and number of blobs in each bin.
+    
+    """
+    if coords_avg is None:
+        coords_avg = coords
+    detail_mask = np.zeros(len(coords), dtype=bool)
+    if detail_offset is not None and detail_size is not None:
+        detail_mask = np.all(np.logical_and(
+            coords >= detail_offset,
+            coords < np.add(detail_offset, detail_size)), axis=1)
+    
+    # group the remaining blobs by their bin in the grid
+    bins = np.floor_divide(coords[~detail_mask], bin_size).astype(int)
+    if len(bins) == 0:
+        return detail_mask, np.zeros((0, coords_avg.shape[1])), np.zeros(
+            0, dtype=int)
+    _, inverse, counts = np.unique(
+        bins, axis=0, return_inverse=True, return_counts=True)
+    inverse = inverse.reshape(-1)
+    centers = np.column_stack([
+        np.bincount(inverse, weights=c, minlength=len(counts)) / counts
+        for c in coords_avg[~detail_mask].T])
+    return detail_mask, centers, counts
+
+
 class Vis3D:
     """3D visualization object for handling Mayavi/VTK tasks.
     
@@ -89,87 +222,26 @@ class Vis3D:
         
         """
         print("Plotting ROI as 3D points")
-    
-        # streamline the image
         if roi is None or roi.size < 1: return False
-        roi = plot_3d.saturate_roi(roi, clip_vmax=98.5, channel=channel)
-        roi = np.clip(roi, 0.2, 0.8)
-        roi = restoration.denoise_tv_chambolle(roi, weight=0.1)
-    
-        # separate parallel arrays for each dimension of all coordinates for
-        # Mayavi input format, with the ROI itself given as a 1D scalar array ;
-        # TODO: consider using np.mgrid to construct the x,y,z arrays
         time_start = time()
-        shape = roi.shape
         isotropic = plot_3d.get_isotropic_vis(config.roi_profile)
-        z = np.ones((shape[0], shape[1] * shape[2]))
-        for i in range(shape[0]):
-            z[i] = z[i] * i
-        if flipz:
-            # invert along z-axis to match handedness of Matplotlib with z up
-            z *= -1
-            if offset is not None:
-                offset = np.copy(offset)
-                offset[0] *= -1
-        y = np.ones((shape[0] * shape[1], shape[2]))
-        for i in range(shape[0]):
-            for j in range(shape[1]):
-                y[i * shape[1] + j] = y[i * shape[1] + j] * j
-        x = np.ones((shape[0] * shape[1], shape[2]))
-        for i in range(shape[0] * shape[1]):
-            x[i] = np.arange(shape[2])
-        
-        if offset is not None:
-            offset = np.multiply(offset, isotropic)
-        coords = [z, y, x]
-        for i, _ in enumerate(coords):
-            # scale coordinates for isotropy
-            coords[i] *= isotropic[i]
-            if offset is not None:
-                # translate by offset
-                coords[i] += offset[i]
         
-        multichannel, channels = plot_3d.setup_channels(roi, channel, 3)
-        for chl in channels:
-            roi_show = roi[..., chl] if multichannel else roi
-            roi_show_1d = roi_show.reshape(roi_show.size)
-            if chl == 0:
-                x = np.reshape(x, roi_show.size)
-                y = np.reshape(y, roi_show.size)
-                z = np.reshape(z, roi_show.size)
-            settings = config.get_roi_profile(chl)
-        
-            # clear background points to see remaining structures
-            thresh = 0
-            if len(np.unique(roi_show)) > 1:
-                # need > 1 val to threshold
-                try:
-                    thresh = filters.threshold_otsu(roi_show, 64)
-                except ValueError as e:
-                    thresh = np.median(roi_show)
-                    print("could not determine Otsu threshold, taking median "
-                          "({}) instead".format(thresh))
-                thresh *= settings["points_3d_thresh"]
-            print("removing 3D points below threshold of {}".format(thresh))
-            remove = np.where(roi_show_1d < thresh)
-            roi_show_1d = np.delete(roi_show_1d, remove)
-        
-            # adjust range from 0-1 to region of colormap to use
-            roi_show_1d = libmag.normalize(roi_show_1d, 0.6, 1.0)
-            points_len = roi_show_1d.size
+        # get coordinates and intensities of points above threshold
+        for chl, coords, scalars in get_3d_points(roi, channel, flipz, offset):
+            points_len = scalars.size
             if points_len == 0:
                 print("no 3D points to display")
                 return False
-            mask = math.ceil(points_len / self._MASK_DIVIDEND)
-            print("points: {}, mask: {}".format(points_len, mask))
-            if any(np.isnan(roi_show_1d)):
+            print("points: {}".format(points_len))
+            if any(np.isnan(scalars)):
                 # TODO: see if some NaNs are permissible
                 print("NaN values for 3D points, will not show 3D visualization")
                 return False
+            # separate parallel arrays for each dimension of all coordinates
+            # for Mayavi input format
             pts = self.scene.mlab.points3d(
-                np.delete(x, remove), np.delete(y, remove), np.delete(z, remove),
-                roi_show_1d, mode="sphere",
-                scale_mode="scalar", mask_points=mask, line_width=1.0, vmax=1.0,
+                coords[:, 2], coords[:, 1], coords[:, 0], scalars,
+                mode="sphere", scale_mode="scalar", line_width=1.0, vmax=1.0,
                 vmin=0.0, transparent=True)
             cmap = colormaps.get_cmap(config.cmaps, chl)
             if cmap is not None:
@@ -343,7 +415,7 @@ class Vis3D:
         return pts_shadows
 
     def show_blobs(self, segments, segs_in_mask, cmap, roi_offset, roi_size,
-                   show_shadows=False, flipz=None):
+                   show_shadows=False, flipz=None, detail_box=None):
         """Show 3D blobs as points.
 
         Args:
@@ -361,6 +433,13 @@ class Vis3D:
             flipz (bool): True to invert blobs along the z-axis to match
                 the handedness of Matplotlib with z progressing upward;
                 defaults to False.
+            detail_box (Sequence[Sequence[int]]): Offset and size in
+                ``z,y,x`` relative to the ROI of the region in which to show
+                each blob when the number of blobs in the ROI exceeds the
+                ``blobs_3d_lod_thresh`` ROI profile setting. Other blobs in
+                the ROI are aggregated into bins given by
+                ``blobs_3d_lod_bin`` and shown sized by their counts.
+                Defaults to None to use the central half of the ROI.
 
         Returns:
             A 3-element tuple containing ``pts_in``, the 3D points within the 
@@ -380,6 +459,12 @@ class Vis3D:
         # the coordinates callback when a blob is selected
         segs = np.concatenate((segments[:, :4], segments[:, :4]), axis=1)
         
+        if detail_box is None:
+            # default to the central half of the ROI in the blobs' original
+            # coordinates, before flipping or isotropic scaling
+            detail_box = (np.divide(roi_size[:3], 4),
+                          np.divide(roi_size[:3], 2))
+        
         isotropic = plot_3d.get_isotropic_vis(settings)
         if flipz:
             # invert along z-axis within the same original space, eg to match
@@ -402,6 +487,21 @@ class Vis3D:
         # colormap has to be at least 2 colors
         segs_in = segs[segs_in_mask]
         cmap_indices = np.arange(segs_in.shape[0])
+        
+        # show only blobs within a detail region individually for large
+        # numbers of blobs, aggregating the rest into bins
+        lod_thresh = settings["blobs_3d_lod_thresh"]
+        detail_inds = cmap_indices
+        centers = None
+        if lod_thresh is not None and len(segs_in) > lod_thresh:
+            detail_mask, centers, counts = bin_blobs(
+                segs_in[:, 4:7], settings["blobs_3d_lod_bin"], *detail_box,
+                coords_avg=segs_in[:, :3])
+            detail_inds = cmap_indices[detail_mask]
+            print("showing {} blobs in detail, {} in {} bins".format(
+                len(detail_inds), np.sum(counts), len(counts)))
+            segs_in = segs_in[detail_mask]
+            cmap_indices = detail_inds
     
         if show_shadows:
             # show projections onto side planes, assumed to be at -10 units
@@ -427,19 +527,33 @@ class Vis3D:
         # show blobs within the ROI
         points_len = len(segs)
         mask = math.ceil(points_len / self._MASK_DIVIDEND)
-        print("points: {}, mask: {}".format(points_len, mask))
+        mask_in = mask
+        if centers is not None:
+            # mask only from the blobs left for detail to show each of them
+            # and keep picked glyphs mapped to these blobs
+            mask_in = math.ceil(len(segs_in) / self._MASK_DIVIDEND)
+        print("points: {}, mask: {}, detail mask: {}".format(
+            points_len, mask, mask_in))
         pts_in = None
         self.blobs = []
         if len(segs_in) > 0:
             # each Glyph contains multiple 3D points, one for each blob
+            # fix the scalar range to keep each blob's color in the colormap
             pts_in = self.scene.mlab.points3d(
                 segs_in[:, 2], segs_in[:, 1],
                 segs_in[:, 0], cmap_indices,
-                mask_points=mask, scale_mode="none", scale_factor=scale,
-                resolution=50)
+                mask_points=mask_in, scale_mode="none", scale_factor=scale,
+                resolution=50, vmin=0, vmax=max(len(cmap) - 1, 1))
             pts_in.module_manager.scalar_lut_manager.lut.table = cmap
             self.blobs.append(pts_in)
         
+        if centers is not None and len(centers) > 0:
+            # show aggregated blobs sized and colored by count
+            self.blobs.append(self.scene.mlab.points3d(
+                centers[:, 2], centers[:, 1], centers[:, 0], np.cbrt(counts),
+                colormap="viridis", scale_mode="scalar", scale_factor=scale,
+                resolution=8, opacity=0.5))
+        
         # show blobs within padding or border region as black and more
         # transparent
         segs_out_mask = np.logical_not(segs_in_mask)
@@ -452,10 +566,11 @@ class Vis3D:
         
         def pick_callback(pick):
             # handle picking blobs/glyphs
-            if pick.actor in pts_in.actor.actors:
+            blobi = None
+            if pts_in is not None and pick.actor in pts_in.actor.actors:
                 # get the blob corresponding to the picked glyph actor
                 blobi = pick.point_id // glyph_points.shape[0]
-            else:
+            elif len(segs_in) > 0:
                 # find the closest blob to the pick position
                 dists = np.linalg.norm(
                     segs_in[:, :3] - pick.pick_position[::-1], axis=1)
@@ -481,8 +596,8 @@ class Vis3D:
         # blobs within 20% of the longest ROI edge to be picked if present
         outline = self.show_roi_outline(roi_offset, roi_size)
         print(outline)
-        glyph_points = pts_in.glyph.glyph_source.glyph_source.output.points.\
-            to_array()
+        glyph_points = None if pts_in is None else \
+            pts_in.glyph.glyph_source.glyph_source.output.points.to_array()
         max_dist = max(roi_size) * 0.2
         self.scene.mlab.gcf().on_mouse_pick(pick_callback)
         
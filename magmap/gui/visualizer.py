@@ -55,8 +55,10 @@ import vtk
 from magmap.atlas import ontology
 from magmap.cv import chunking, colocalizer, cv_nd, detector, segmenter,\
     verifier
-from magmap.gui import atlas_editor, import_threads, roi_editor, vis_3d
-from magmap.io import cli, importer, libmag, naming, np_io, sitk_io, sqlite
+from magmap.gui import atlas_editor, import_threads, plot_editor, roi_editor,\
+    vis_3d
+from magmap.io import cli, edit_journal, importer, libmag, naming, np_io,\
+    sitk_io, sqlite
 from magmap.plot import colormaps, plot_2d, plot_3d
 from magmap.settings import config
 
@@ -532,6 +534,11 @@ class Visualization(HasTraits):
     # Image viewers
 
     atlas_eds = []  # open atlas editors
+    # label bounding box index, undo history, and edit journal shared by
+    # atlas editors for the labels image
+    _labels_bbox_index = None
+    _labels_history = None
+    _labels_journal = None
     flipz = True  # True to invert 3D vis along z-axis
     controls_created = Bool(False)
     mpl_fig_active = Any
@@ -2376,12 +2383,23 @@ class Visualization(HasTraits):
             # distinguish multiple Atlas Editor windows with number since
             # using the same title causes the windows to overlap
             title += " ({})".format(len(self.atlas_eds) + 1)
+        if (config.labels_img is not None
+                and (self._labels_bbox_index is None
+                     or self._labels_bbox_index.labels_img
+                     is not config.labels_img)):
+            # share index among editors of the same labels image, which
+            # they all edit
+            self._labels_bbox_index = cv_nd.LabelBBoxIndex(config.labels_img)
+            self._labels_history = plot_editor.LabelsEditHistory(
+                config.labels_img)
+            self._labels_journal = edit_journal.EditJournal()
         atlas_ed = atlas_editor.AtlasEditor(
             config.image5d, config.labels_img, config.channel, 
             self._curr_offset(center=False), self._atlas_ed_close_listener,
             config.borders_img, self.show_label_3d, title,
             self._refresh_atlas_eds, self._atlas_ed_fig,
-            self.update_status_bar_msg)
+            self.update_status_bar_msg, self._labels_bbox_index,
+            self._labels_history, self._labels_journal)
         self.atlas_eds.append(atlas_ed)
         
         # show the Atlas Editor
@@ -0,0 +1,342 @@
+# Chunked image storage
+# Copyright The MagellanMapper Contributors
+"""Chunked, compressed image storage with multiscale pyramid levels.
+
+Images are stored in a directory with a JSON index and a subdirectory
+for each resolution level, where each chunk is a separately compressed
+file. Stored images are accessed through :class:`ChunkedImage`, which
+supports memmap-like indexing to load only the chunks in the selection.
+"""
+
+from collections import OrderedDict
+import json
+import os
+import shutil
+import zlib
+
+import numpy as np
+
+#: str: Filename of the store index.
+INDEX_NAME = "index.json"
+
+#: tuple[int]: Default chunk shape in ``t,z,y,x``, with all channels
+# in each chunk.
+CHUNK_SHAPE = (1, 32, 256, 256)
+
+#: int: Default zlib compression level.
+COMPRESSION_LEVEL = 1
+
+#: int: Default number of decompressed chunks to cache.
+CACHE_SIZE = 64
+
+# store format version
+_STORE_VER = 1
+
+
+def get_store_path(path):
+    """Get the chunked store path for an image path.
+
+    Args:
+        path (str): Path to the image, typically a NPY file.
+
+    Returns:
+        str: Path to the chunked store.
+
+    """
+    return "{}.chunks".format(os.path.splitext(path)[0])
+
+
+def downsample_level(img):
+    """Downsample an image by 2x block-mean for the next pyramid level.
+
+    Spatial axes of size 1 are not downsampled, and a remaining odd
+    plane, row, or column is dropped.
+
+    Args:
+        img (:obj:`np.ndarray`): Image in ``t,z,y,x[,c]`` format.
+
+    Returns:
+        :obj:`np.ndarray`: Downsampled image in the same data type,
+        rounded for integer types.
+
+    """
+    factors = [1, *[2 if n > 1 else 1 for n in img.shape[1:4]]]
+    shape = np.floor_divide(img.shape[:4], factors)
+    img = img[tuple(slice(0, n * f) for n, f in zip(shape, factors))]
+
+    # group each block into its own axes to take the mean
+    shape_blocks = []
+    for n, f in zip(shape, factors):
+        shape_blocks.extend((n, f))
+    shape_blocks.extend(img.shape[4:])
+    downsampled = np.mean(
+        img.reshape(shape_blocks), axis=(1, 3, 5, 7), dtype=np.float64)
+    if np.issubdtype(img.dtype, np.integer):
+        downsampled = np.round(downsampled)
+    return downsampled.astype(img.dtype)
+
+
+def _get_level_shape(shape):
+    # get the shape of the next pyramid level
+    shape = list(shape)
+    for i in range(1, 4):
+        if shape[i] > 1:
+            shape[i] //= 2
+    return shape
+
+
+class ChunkedImage:
+    """Image in a chunked store, accessed like a read-only memmap.
+
+    Indexing with integers, slices, and ellipses loads and decompresses
+    only the chunks overlapping the selection, keeping recently used chunks
+    in a small cache.
+
+    Attributes:
+        path (str): Path to the store directory.
+        level (int): Pyramid level, where 0 is full resolution.
+        shape (tuple[int]): Shape of the image at this level.
+        dtype (:obj:`np.dtype`): Data type.
+        chunks (tuple[int]): Chunk shape.
+        nlevels (int): Number of levels in the store.
+
+    """
+    def __init__(self, path, level=0, cache_size=CACHE_SIZE):
+        """Open a chunked image.
+
+        Args:
+            path (str): Path to the store directory.
+            level (int): Pyramid level; defaults to 0.
+            cache_size (int): Number of decompressed chunks to cache;
+                defaults to :const:`CACHE_SIZE`.
+
+        Raises:
+            FileNotFoundError: if the store index cannot be found.
+            IndexError: if ``level`` is not in the store.
+
+        """
+        with open(os.path.join(path, INDEX_NAME), "r") as f:
+            index = json.load(f)
+        self.path = path
+        self.level = level
+        levels = index["levels"]
+        if not 0 <= level < len(levels):
+            raise IndexError("Level {} not found in store with {} levels"
+                             .format(level, len(levels)))
+        self.nlevels = len(levels)
+        self.shape = tuple(levels[level])
+        self.dtype = np.dtype(index["dtype"])
+        self.chunks = tuple(index["chunks"])
+        self._cache_size = cache_size
+        self._cache = OrderedDict()
+
+    @property
+    def ndim(self):
+        """Number of dimensions."""
+        return len(self.shape)
+
+    @property
+    def size(self):
+        """Number of elements."""
+        return int(np.prod(self.shape))
+
+    @property
+    def nbytes(self):
+        """Number of bytes when decompressed."""
+        return self.size * self.dtype.itemsize
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __array__(self, dtype=None):
+        arr = self[...]
+        return arr if dtype is None else arr.astype(dtype)
+
+    def get_level(self, level):
+        """Get another pyramid level of the image.
+
+        Args:
+            level (int): Pyramid level.
+
+        Returns:
+            :obj:`ChunkedImage`: The image at the given level.
+
+        """
+        return ChunkedImage(self.path, level, self._cache_size)
+
+    def flush(self):
+        """Flush changes, for compatibility with memmaps, which has no
+        effect since the image is read-only."""
+        pass
+
+    def _read_chunk(self, coord):
+        # read and decompress a chunk, using the cache if available
+        chunk = self._cache.get(coord)
+        if chunk is not None:
+            self._cache.move_to_end(coord)
+            return chunk
+        path = os.path.join(
+            self.path, str(self.level), ".".join([str(c) for c in coord]))
+        shape = [min(c, n - i * c) for i, c, n in zip(
+            coord, self.chunks, self.shape)]
+        shape.extend(self.shape[len(self.chunks):])
+        with open(path, "rb") as f:
+            chunk = np.frombuffer(
+                zlib.decompress(f.read()), dtype=self.dtype).reshape(shape)
+        self._cache[coord] = chunk
+        if len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+        return chunk
+
+    def _parse_key(self, key):
+        # convert an index into bounds and in-bounds selections per axis
+        if not isinstance(key, tuple):
+            key = (key,)
+        if any([k is None for k in key]):
+            raise TypeError("New axes are not supported in chunked images")
+        nell = sum([k is Ellipsis for k in key])
+        if nell > 1:
+            raise IndexError("An index can only have a single ellipsis")
+        nkeys = len(key) - nell
+        if nkeys > self.ndim:
+            raise IndexError("Too many indices for image with {} dimensions"
+                             .format(self.ndim))
+        if nell:
+            i = key.index(Ellipsis)
+            key = key[:i] + (slice(None),) * (self.ndim - nkeys) + key[i + 1:]
+        key = key + (slice(None),) * (self.ndim - len(key))
+
+        bounds = []
+        sels = []
+        for k, n in zip(key, self.shape):
+            if isinstance(k, slice):
+                rng = range(*k.indices(n))
+                if len(rng) == 0:
+                    bounds.append((0, 0))
+                    sels.append(slice(0, 0))
+                    continue
+                start, stop = min(rng[0], rng[-1]), max(rng[0], rng[-1]) + 1
+                bounds.append((start, stop))
+                if rng.step > 0:
+                    sels.append(slice(0, stop - start, rng.step))
+                else:
+                    # reverse from the end of the bounds
+                    sels.append(slice(stop - start - 1, None, rng.step))
+            else:
+                k = int(k)
+                if k < 0:
+                    k += n
+                if not 0 <= k < n:
+                    raise IndexError("Index {} out of bounds for axis with "
+                                     "size {}".format(k, n))
+                bounds.append((k, k + 1))
+                sels.append(0)
+        return bounds, tuple(sels)
+
+    def __getitem__(self, key):
+        bounds, sels = self._parse_key(key)
+        out = np.empty([b[1] - b[0] for b in bounds], dtype=self.dtype)
+        if out.size > 0:
+            # copy the overlapping region from each chunk in the bounds
+            nchunked = len(self.chunks)
+            chunk_rngs = [range(b[0] // c, (b[1] - 1) // c + 1)
+                          for b, c in zip(bounds, self.chunks)]
+            for coord in np.ndindex(*[len(r) for r in chunk_rngs]):
+                coord = tuple(r[i] for r, i in zip(chunk_rngs, coord))
+                chunk = self._read_chunk(coord)
+                src = []
+                dst = []
+                for i, c, b in zip(coord, self.chunks, bounds):
+                    start = max(b[0], i * c)
+                    stop = min(b[1], (i + 1) * c)
+                    src.append(slice(start - i * c, stop - i * c))
+                    dst.append(slice(start - b[0], stop - b[0]))
+                src.extend(slice(*b) for b in bounds[nchunked:])
+                out[tuple(dst)] = chunk[tuple(src)]
+        return out[sels]
+
+
+def save_chunked(img, path, chunks=None, nlevels=None,
+                 compression=COMPRESSION_LEVEL):
+    """Save an image to a chunked store with multiscale pyramid levels.
+
+    Each level is written from slabs of the previous level so that only
+    a slab of chunks is held in memory at a time.
+
+    Args:
+        img (:obj:`np.ndarray`): Image in ``t,z,y,x[,c]`` format, typically
+            a memmap.
+        path (str): Output store directory, which will be overwritten.
+        chunks (Sequence[int]): Chunk shape in ``t,z,y,x``; defaults to
+            None to use :const:`CHUNK_SHAPE`.
+        nlevels (int): Number of levels, including the full resolution
+            level; defaults to None to downsample until each chunk covers
+            an entire level.
+        compression (int): zlib compression level; defaults to
+            :const:`COMPRESSION_LEVEL`.
+
+    Returns:
+        :obj:`ChunkedImage`: The full resolution stored image.
+
+    """
+    if chunks is None:
+        chunks = CHUNK_SHAPE
+    chunks = tuple(int(c) for c in chunks[:4])
+    if img.ndim < 4:
+        raise ValueError("Image must have at least t,z,y,x dimensions")
+
+    # get shapes for all levels
+    shapes = [list(img.shape)]
+    while nlevels is None and any(np.greater(shapes[-1][1:4], chunks[1:4])) \
+            or nlevels is not None and len(shapes) < nlevels:
+        shape = _get_level_shape(shapes[-1])
+        if shape == shapes[-1]:
+            break
+        shapes.append(shape)
+
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    os.makedirs(path)
+
+    src = img
+    for level, shape in enumerate(shapes):
+        # write slabs of chunks along z, downsampling from the prior level
+        level_dir = os.path.join(path, str(level))
+        os.makedirs(level_dir)
+        factor_z = 1 if level == 0 or shapes[level - 1][1] <= 1 else 2
+        for t in range(0, shape[0], chunks[0]):
+            for z in range(0, shape[1], chunks[1]):
+                slab = src[t:t + chunks[0],
+                           z * factor_z:(z + chunks[1]) * factor_z]
+                slab = np.asarray(slab)
+                if level > 0:
+                    slab = downsample_level(slab)
+                    slab = slab[:, :, :shape[2], :shape[3]]
+                for y in range(0, shape[2], chunks[2]):
+                    for x in range(0, shape[3], chunks[3]):
+                        chunk = np.ascontiguousarray(slab[
+                            :, :, y:y + chunks[2], x:x + chunks[3]])
+                        coord = np.floor_divide((t, z, y, x), chunks)
+                        with open(os.path.join(
+                                level_dir, ".".join(
+                                    [str(c) for c in coord])), "wb") as f:
+                            f.write(zlib.compress(
+                                chunk.tobytes(), compression))
+        if level == 0:
+            _write_index(path, img.dtype, chunks, shapes)
+        src = ChunkedImage(path, level)
+    print("saved chunked image with {} levels to {}".format(len(shapes), path))
+    return ChunkedImage(path)
+
+
+def _write_index(path, dtype, chunks, shapes):
+    # write the store index
+    index = {
+        "ver": _STORE_VER,
+        "dtype": np.dtype(dtype).str,
+        "chunks": [int(c) for c in chunks],
+        "levels": [[int(n) for n in s] for s in shapes],
+        "compression": "zlib",
+    }
+    with open(os.path.join(path, INDEX_NAME), "w") as f:
+        json.dump(index, f)
@@ -59,7 +59,8 @@ import numpy as np
 from magmap.atlas import register, transformer
 from magmap.cloud import notify
 from magmap.cv import chunking, colocalizer, stack_detect
-from magmap.io import df_io, export_stack, importer, libmag, np_io, sqlite
+from magmap.io import chunked_io, df_io, export_stack, importer, libmag, np_io
+from magmap.io import sqlite
 from magmap.plot import colormaps, plot_2d
 from magmap.settings import atlas_prof, config, grid_search_prof, roi_prof
 from magmap.stats import mlearn
@@ -945,6 +946,72 @@ def _detect_subimgs(path, series, subimg_offsets, subimg_sizes):
     return stat, summaries
 
 
+def _detect_subimgs_combos(combos, path, series, subimg_offsets,
+                           subimg_sizes):
+    """Detect blobs in an image across sub-image offsets for multiple
+    grid search hyperparameter combinations.
+    
+    Each sub-image is loaded only once for all combinations. Combinations
+    that share block and preprocessing settings are evaluated together
+    to reuse their preprocessed blocks.
+    
+    Args:
+        combos (list[dict]): Sequence of hyperparameter combinations, each
+            given as a dictionary of profile keys to values.
+        path (str): Path to image from which MagellanMapper-style paths will 
+            be generated.
+        series (int): Image series number.
+        subimg_offsets (List[List[int]]): Nested list of sub-image offset sets
+            given as ``[[offset_z1, offset_y1, offset_x1], ...]``.
+        subimg_sizes (List[List[int]]): Nested list of sub-image size sets
+            given as ``[[offset_z1, offset_y1, offset_x1], ...]`` and
+            corresponding to ``subimg_offsets``.
+    
+    Returns:
+        list[tuple[:obj:`np.ndarray`, list[str]]]: Summed stats array and
+        summaries for each combination, as given by :meth:`_detect_subimgs`.
+    
+    """
+    settings = config.roi_profile
+    stats = [np.zeros(3) for _ in combos]
+    summaries = [[] for _ in combos]
+    if not combos:
+        return []
+    
+    # use whole image if sub-image parameters are not set
+    if subimg_offsets is None:
+        subimg_offsets = [None]
+    if subimg_sizes is None:
+        subimg_sizes = [None]
+    roi_sizes_len = len(subimg_sizes)
+    groups = mlearn.group_combos_by_stage(combos)
+    
+    for i in range(len(subimg_offsets)):
+        size = (subimg_sizes[i] if roi_sizes_len > 1
+                else subimg_sizes[0])
+        np_io.setup_images(
+            path, series, subimg_offsets[i], size, config.proc_type)
+        for group in groups:
+            # share preprocessed blocks only within the group to limit memory
+            preproc_cache = {}
+            for j in group:
+                print("===============================================\n"
+                      "Grid search hyperparameters {} for offset {}"
+                      .format(dict(combos[j]), subimg_offsets[i]))
+                settings.update(combos[j])
+                stat_roi, fdbk, _ = stack_detect.detect_blobs_stack(
+                    importer.filename_to_base(path, series), subimg_offsets[i],
+                    size, preproc_cache=preproc_cache)
+                if stat_roi is not None:
+                    stats[j] = np.add(stats[j], stat_roi)
+                summaries[j].append(
+                    "Offset {}:\n{}".format(subimg_offsets[i], fdbk))
+    
+    # leave settings at the last combination as in serial grid searches
+    settings.update(combos[-1])
+    return list(zip(stats, summaries))
+
+
 def _grid_search(series_list):
     # grid search(es) for the specified hyperparameter groups
     if not config.filename:
@@ -956,7 +1023,7 @@ def _grid_search(series_list):
         stats_dict = mlearn.grid_search(
             config.grid_search_profile, _detect_subimgs,
             config.filename, series, config.subimg_offsets,
-            config.subimg_sizes)
+            config.subimg_sizes, combos_fnc=_detect_subimgs_combos)
         parsed_dict, stats_dfs = mlearn.parse_grid_stats(stats_dict)
         for stats_df in stats_dfs:
             # plot ROC curve
@@ -1030,10 +1097,15 @@ def process_file(path, proc_mode, series=None, subimg_offset=None,
             subimg_size, proc_type is config.ProcessTypes.ANIMATED,
             config.suffix)
     
-    elif proc_type is config.ProcessTypes.EXPORT_BLOBS:
-        # export blobs to CSV file
+    elif proc_type in (
+            config.ProcessTypes.EXPORT_BLOBS,
+            config.ProcessTypes.EXPORT_BLOBS_CSV):
+        # export blobs to a columnar table or CSV file
         from magmap.io import export_rois
-        export_rois.blobs_to_csv(config.blobs.blobs, filename_base)
+        export_rois.export_blobs(
+            config.blobs.blobs, filename_base,
+            "csv" if proc_type is config.ProcessTypes.EXPORT_BLOBS_CSV
+            else "npz")
         
     elif proc_type in (
             config.ProcessTypes.DETECT, config.ProcessTypes.DETECT_COLOC):
@@ -1067,6 +1139,12 @@ def process_file(path, proc_mode, series=None, subimg_offset=None,
         libmag.backup_file(out_path)
         np_io.write_raw_file(config.image5d, out_path)
 
+    elif proc_type is config.ProcessTypes.EXPORT_CHUNKED:
+        # export the main image to a chunked store alongside the NPY file
+        out_path = chunked_io.get_store_path(
+            importer.make_filenames(config.filename, config.series)[0])
+        chunked_io.save_chunked(config.image5d, out_path)
+
     elif proc_type is config.ProcessTypes.PREPROCESS:
         # pre-process a whole image and save to file
         # TODO: consider chunking option for larger images
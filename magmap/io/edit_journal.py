@@ -0,0 +1,243 @@
+# Image edit journal
+# Copyright The MagellanMapper Contributors
+"""Journal of edited image regions for incremental saving.
+
+Regions edited since an image was last saved are appended to a sidecar
+journal file as compressed patches with their offsets rather than
+rewriting the whole image. The journal is replayed onto the saved image
+to recover the edits, or it is compacted by saving the full image and
+removing the journal.
+
+Each journal record is a little-endian 32-bit header length, a JSON header
+with the patch offset, shape, data type, and compressed size, and the
+zlib-compressed patch.
+"""
+
+import json
+import os
+import struct
+import zlib
+
+import numpy as np
+
+#: str: Extension appended to an image path for its journal.
+JOURNAL_EXT = ".journal"
+
+#: int: Default zlib compression level.
+COMPRESSION_LEVEL = 1
+
+# header length format
+_HEADER_LEN = struct.Struct("<I")
+
+
+def get_journal_path(path):
+    """Get the journal path for an image.
+
+    Args:
+        path (str): Path to the image.
+
+    Returns:
+        str: Path to the image's journal.
+
+    """
+    return path + JOURNAL_EXT
+
+
+def remove_journal(path):
+    """Remove the journal for an image, such as after saving the full image.
+
+    Args:
+        path (str): Path to the image.
+
+    Returns:
+        bool: True if a journal was removed.
+
+    """
+    journal_path = get_journal_path(path)
+    if not os.path.exists(journal_path):
+        return False
+    os.remove(journal_path)
+    print("removed edit journal", journal_path)
+    return True
+
+
+def append_patches(path, img, regions, compression=COMPRESSION_LEVEL):
+    """Append patches of image regions to a journal.
+
+    Args:
+        path (str): Path to the journal, which will be created if necessary.
+        img (:obj:`np.ndarray`): Image from which to extract patches.
+        regions (List[Sequence[slice]]): Sequence of regions, each given
+            as slices with explicit start and stop values for each axis.
+        compression (int): zlib compression level; defaults to
+            :const:`COMPRESSION_LEVEL`.
+
+    Returns:
+        int: Number of bytes written.
+
+    """
+    nbytes = 0
+    with open(path, "ab") as f:
+        for slices in regions:
+            patch = np.ascontiguousarray(img[tuple(slices)])
+            data = zlib.compress(patch.tobytes(), compression)
+            header = json.dumps({
+                "offset": [int(s.start) for s in slices],
+                "shape": list(patch.shape),
+                "dtype": patch.dtype.str,
+                "nbytes": len(data),
+            }).encode()
+            f.write(_HEADER_LEN.pack(len(header)))
+            f.write(header)
+            f.write(data)
+            nbytes += _HEADER_LEN.size + len(header) + len(data)
+    return nbytes
+
+
+def iter_patches(path):
+    """Iterate over the patches in a journal.
+
+    Reading stops at an incomplete record, such as a record truncated
+    by an interrupted save.
+
+    Args:
+        path (str): Path to the journal.
+
+    Yields:
+        tuple[slice], :obj:`np.ndarray`: Slices of the patch's region and
+        the patch.
+
+    """
+    with open(path, "rb") as f:
+        while True:
+            buf = f.read(_HEADER_LEN.size)
+            if not buf:
+                break
+            try:
+                if len(buf) < _HEADER_LEN.size:
+                    raise ValueError("incomplete header length")
+                header = json.loads(f.read(_HEADER_LEN.unpack(buf)[0]))
+                data = f.read(header["nbytes"])
+                if len(data) < header["nbytes"]:
+                    raise ValueError("incomplete patch")
+                patch = np.frombuffer(
+                    zlib.decompress(data), dtype=header["dtype"]).reshape(
+                    header["shape"])
+            except (ValueError, KeyError, zlib.error) as e:
+                print("stopping at incomplete record in {}: {}"
+                      .format(path, e))
+                break
+            yield tuple(slice(o, o + n) for o, n in zip(
+                header["offset"], patch.shape)), patch
+
+
+def replay(img, path):
+    """Replay a journal onto an image.
+
+    Args:
+        img (:obj:`np.ndarray`): Image, typically as last saved in full,
+            which will be updated in place.
+        path (str): Path to the journal.
+
+    Returns:
+        int: Number of patches applied.
+
+    """
+    npatches = 0
+    for slices, patch in iter_patches(path):
+        img[slices] = patch
+        npatches += 1
+    return npatches
+
+
+class EditJournal:
+    """Track edited regions of an image to journal them when saving.
+
+    Edits are tracked as the bounding box of the edits within each plane
+    along the first axis so that edits in separate planes do not expand
+    one another's regions.
+
+    Attributes:
+        saved_path (str): Path to which the full image was last saved,
+            onto which the journal applies; defaults to None.
+
+    """
+    def __init__(self):
+        """Initialize the journal without any edits."""
+        self.saved_path = None
+        # plane index to box of edits in the remaining axes, given as
+        # the min values for each axis followed by the max values
+        self._dirty = {}
+
+    def mark(self, slices):
+        """Mark a region as edited.
+
+        Args:
+            slices (Sequence[slice]): Slices of the edited region with
+                explicit start and stop values for each axis.
+
+        """
+        dims = len(slices) - 1
+        bbox = (*[int(s.start) for s in slices[1:]],
+                *[int(s.stop) for s in slices[1:]])
+        for i in range(int(slices[0].start), int(slices[0].stop)):
+            prev = self._dirty.get(i)
+            if prev is not None:
+                bbox_plane = (
+                    *[min(a, b) for a, b in zip(prev[:dims], bbox[:dims])],
+                    *[max(a, b) for a, b in zip(prev[dims:], bbox[dims:])])
+            else:
+                bbox_plane = bbox
+            self._dirty[i] = bbox_plane
+
+    def is_dirty(self):
+        """Check whether any edits are tracked.
+
+        Returns:
+            bool: True if any region has been marked since the last clear.
+
+        """
+        return bool(self._dirty)
+
+    def clear(self):
+        """Clear tracked edits, such as after saving the full image."""
+        self._dirty = {}
+
+    def get_regions(self):
+        """Get the edited regions.
+
+        Returns:
+            List[tuple[slice]]: Slices for each edited region, where
+            adjacent planes with the same box are merged into one region.
+
+        """
+        regions = []
+        for i in sorted(self._dirty):
+            bbox = self._dirty[i]
+            if regions and regions[-1][1] == bbox and regions[-1][0][1] == i:
+                regions[-1][0][1] = i + 1
+            else:
+                regions.append(([i, i + 1], bbox))
+        slices = []
+        for planes, bbox in regions:
+            dims = len(bbox) // 2
+            slices.append((slice(*planes), *[
+                slice(bbox[j], bbox[j + dims]) for j in range(dims)]))
+        return slices
+
+    def write(self, img, path, compression=COMPRESSION_LEVEL):
+        """Append the edited regions to a journal and clear them.
+
+        Args:
+            img (:obj:`np.ndarray`): Edited image.
+            path (str): Path to the journal.
+            compression (int): zlib compression level; defaults to
+                :const:`COMPRESSION_LEVEL`.
+
+        Returns:
+            int: Number of bytes written.
+
+        """
+        nbytes = append_patches(path, img, self.get_regions(), compression)
+        self.clear()
+        return nbytes
@@ -10,6 +10,7 @@ import os
 import glob
 
 import numpy as np
+import pandas as pd
 from matplotlib import pyplot as plt
 import SimpleITK as sitk
 
@@ -89,7 +90,7 @@ def export_rois(db, image5d, channel, path, padding=None, unit_factor=None,
             # image5d, eg verified DBs from many truth sets
             continue
         rois = sqlite.select_rois(db.cur, exp["id"])
-        for roi in rois:
+        for roi, blobs, _ in db.iter_blobs_by_rois(rois):
             # get ROI as a small image
             size = sqlite.get_roi_size(roi)
             offset = sqlite.get_roi_offset(roi)
@@ -98,7 +99,6 @@ def export_rois(db, image5d, channel, path, padding=None, unit_factor=None,
             # get blobs and change confirmation flag to avoid confirmation 
             # color in 2D plots
             roi_id = roi["id"]
-            blobs = db.select_blobs_by_roi(roi_id)[0]
             blobs_detected = None
             if truth_mode is config.TruthDBModes.VERIFIED:
                 # verified DBs use a truth value of -1 to indicate "detected",
@@ -266,6 +266,126 @@ def _test_loading_rois(db, channel, path):
         roi_ed.plot_roi(blobs, channel, show=True, title=path_base)
 
 
+#: tuple[str]: Names of the standard blob columns in export tables, as
+# formatted by :meth:`detector.format_blobs`.
+BLOB_COLS = (
+    "z", "y", "x", "radius", "confirmed", "truth", "channel",
+    "abs_z", "abs_y", "abs_x")
+
+#: dict[str, str]: Blob export formats to their file extensions.
+BLOB_EXPORT_EXTS = {
+    "npz": ".npz",
+    "parquet": ".parquet",
+    "feather": ".feather",
+    "csv": ".csv.gz",
+}
+
+# key in the blobs table archive storing the column order
+_TABLE_COLS_KEY = "columns"
+
+
+def get_blob_cols(blobs, cols=None):
+    """Get column names for a blobs array.
+    
+    Args:
+        blobs (:obj:`np.ndarray`): Blobs array in
+            ``[[z, y, x, radius, ...], ...]`` format.
+        cols (Sequence[str]): Names of columns beyond the standard
+            :const:`BLOB_COLS`, such as label or region IDs; defaults to
+            None to name these columns by index.
+    
+    Returns:
+        list[str]: Column name for each column in ``blobs``.
+    
+    """
+    names = list(BLOB_COLS[:blobs.shape[1]])
+    nextra = blobs.shape[1] - len(names)
+    if cols is None:
+        cols = ["col{}".format(i) for i in range(len(names), blobs.shape[1])]
+    elif len(cols) != nextra:
+        raise ValueError("{} extra column names given for {} extra columns"
+                         .format(len(cols), nextra))
+    names.extend(cols)
+    return names
+
+
+def export_blobs(blobs, path, fmt="npz", cols=None):
+    """Export blobs to a table with named columns.
+    
+    The default format is a compressed Numpy archive with an array for
+    each column, which preserves the blobs' data type and is much faster
+    to write than text.
+    
+    Args:
+        blobs (:obj:`np.ndarray`): Blobs array in
+            ``[[z, y, x, radius, ...], ...]`` format.
+        path (str): Path to blobs file. The output file will be the same as
+            this path except replacing the extension with ``_blobs`` and
+            the format extension given in :const:`BLOB_EXPORT_EXTS`.
+        fmt (str): Format, which is a key in :const:`BLOB_EXPORT_EXTS`;
+            defaults to "npz". "parquet" and "feather" require Pandas'
+            optional PyArrow dependency, and "csv" exports the coordinates
+            and radius through :meth:`blobs_to_csv`.
+        cols (Sequence[str]): Names of columns beyond the standard
+            :const:`BLOB_COLS`; defaults to None.
+    
+    Returns:
+        str: The output path.
+    
+    Raises:
+        ValueError: if ``fmt`` is not a supported format.
+    
+    """
+    if fmt not in BLOB_EXPORT_EXTS:
+        raise ValueError("{} is not a supported blobs export format; use one "
+                         "of {}".format(fmt, list(BLOB_EXPORT_EXTS.keys())))
+    if fmt == "csv":
+        return blobs_to_csv(blobs, path)
+    
+    path_out = "{}_blobs{}".format(
+        os.path.splitext(path)[0], BLOB_EXPORT_EXTS[fmt])
+    names = get_blob_cols(blobs, cols)
+    if fmt == "npz":
+        # store each column as a separate array, along with the column order
+        np.savez_compressed(
+            path_out, **{_TABLE_COLS_KEY: np.array(names)},
+            **{n: blobs[:, i] for i, n in enumerate(names)})
+    else:
+        df = pd.DataFrame(blobs, columns=names)
+        if fmt == "parquet":
+            df.to_parquet(path_out)
+        else:
+            df.to_feather(path_out)
+    print("Exported {} blobs to {}".format(len(blobs), path_out))
+    return path_out
+
+
+def load_blobs_table(path):
+    """Load blobs exported by :meth:`export_blobs`.
+    
+    Args:
+        path (str): Path to the exported blobs file, with the format
+            determined by its extension.
+    
+    Returns:
+        :obj:`np.ndarray`, list[str]: The blobs array and its column names.
+    
+    """
+    if path.endswith(BLOB_EXPORT_EXTS["csv"]):
+        blobs = np.loadtxt(path, delimiter=",", ndmin=2)
+        return blobs, list(BLOB_COLS[:blobs.shape[1]])
+    if path.endswith(BLOB_EXPORT_EXTS["npz"]):
+        with np.load(path) as archive:
+            names = archive[_TABLE_COLS_KEY].tolist()
+            blobs = np.column_stack([archive[n] for n in names])
+        return blobs, names
+    if path.endswith(BLOB_EXPORT_EXTS["parquet"]):
+        df = pd.read_parquet(path)
+    else:
+        df = pd.read_feather(path)
+    return df.to_numpy(), df.columns.tolist()
+
+
 def blobs_to_csv(blobs, path):
     """Exports blob coordinates and radius to CSV file, compressed with GZIP.
     
@@ -274,10 +394,14 @@ def blobs_to_csv(blobs, path):
             format.
         path: Path to blobs file. The CSV file will be the same as this path 
             except replacing the extension with ``.csv.gz``.
+    
+    Returns:
+        str: The output path.
     """
     path_out = "{}_blobs.csv.gz".format(os.path.splitext(path)[0])
     header = "z,y,x,r"
     np.savetxt(path_out, blobs[:, :4], delimiter=",", header=header)
+    return path_out
 
 
 if __name__ == "__main__":
@@ -104,6 +104,48 @@ class StackPlaneIO(object):
                 #img = img[:-50]
                 imgs_proc[j] = img
         return i, imgs_proc
+    
+    @classmethod
+    def export_plane(cls, i, path, ext, channels=None, plane=None):
+        """Export a plane to 2D image files.
+        
+        Assumes that :attr:``imgs`` is a list whose first element is a
+        3D image with optional channel dimension, from which the plane is
+        accessed by index if not given.
+        
+        Args:
+            i (int): Index of the plane within the first image of
+                :attr:``imgs``.
+            path (str): Output path without extension.
+            ext (str): Save format given as an extension without period.
+            channels (List[int]): Sequence of channels to save as separate
+                files; defaults to None to save the plane as a single file.
+            plane (:obj:`np.ndarray`): Plane to export; defaults to None to
+                access the plane from :attr:``imgs``, such as in forked
+                multiprocessing to avoid pickling the plane.
+        
+        Returns:
+            List[str]: Paths of the saved files.
+        
+        """
+        if plane is None:
+            plane = cls.imgs[0][i]
+        paths = []
+        if channels is not None:
+            for chl in channels:
+                # save each channel as separate file
+                path_chl = "{}{}{}.{}".format(
+                    path, importer.CHANNEL_SEPARATOR, chl, ext)
+                print("Saving image plane {} to {}".format(i, path_chl))
+                io.imsave(path_chl, plane[..., chl])
+                paths.append(path_chl)
+        else:
+            # save single channel plane
+            path = "{}.{}".format(path, ext)
+            print("Saving image plane {} to {}".format(i, path))
+            io.imsave(path, plane)
+            paths.append(path)
+        return paths
 
 
 def _build_stack(ax, images, process_fnc, rescale=1, aspect=None, 
@@ -534,6 +576,9 @@ def reg_planes_to_img(imgs, path=None, ax=None):
 
 def export_planes(image5d, ext, channel=None, separate_chls=False):
     """Export each plane and channel combination into separate 2D image files
+    
+    Planes are encoded in parallel by multiprocessing, with the number of
+    processes set by :attr:`config.cpus`.
 
     Args:
         image5d (:obj:`np.ndarray`): Image in ``t,z,y,x[,c]`` format.
@@ -541,6 +586,9 @@ def export_planes(image5d, ext, channel=None, separate_chls=False):
         channel (int): Channel to save; defaults to None for all channels.
         separate_chls (bool): True to export all channels from each plane to
             a separate image; defaults to False. 
+    
+    Returns:
+        List[str]: Paths of the saved files, in order of planes and channels.
 
     """
     suffix = "_export" if config.suffix is None else config.suffix 
@@ -552,22 +600,30 @@ def export_planes(image5d, ext, channel=None, separate_chls=False):
     roi = image5d[0]
     multichannel, channels = plot_3d.setup_channels(roi, channel, 3)
     num_digits = len(str(len(roi)))
-    for i, plane in enumerate(roi):
+    chls = channels if separate_chls and multichannel else None
+    
+    is_fork = chunking.is_fork()
+    if is_fork:
+        # access planes by index in forked processes to avoid pickling
+        StackPlaneIO.set_data([roi])
+    pool = chunking.get_mp_pool()
+    pool_results = []
+    for i in range(len(roi)):
         path = os.path.join(output_dir, "{}_{:0{}d}".format(
             basename, i, num_digits))
-        if separate_chls and multichannel:
-            for chl in channels:
-                # save each channel as separate file
-                plane_chl = plane[..., chl]
-                path_chl = "{}{}{}.{}".format(
-                    path, importer.CHANNEL_SEPARATOR, chl, ext)
-                print("Saving image plane {} to {}".format(i, path_chl))
-                io.imsave(path_chl, plane_chl)
-        else:
-            # save single channel plane
-            path = "{}.{}".format(path, ext)
-            print("Saving image plane {} to {}".format(i, path))
-            io.imsave(path, plane)
+        args = [i, path, ext, chls]
+        if not is_fork:
+            # for spawned methods, need to pickle the plane
+            args.append(roi[i])
+        pool_results.append(
+            pool.apply_async(StackPlaneIO.export_plane, args=args))
+    
+    paths = []
+    for result in pool_results:
+        paths.extend(result.get())
+    pool.close()
+    pool.join()
+    return paths
 
 
 if __name__ == "__main__":
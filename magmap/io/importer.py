@@ -15,6 +15,7 @@ Attributes:
 """
 
 from collections import OrderedDict
+from concurrent import futures
 import os
 from time import time
 import glob
@@ -23,7 +24,8 @@ from xml import etree as et
 import warnings
 
 from magmap.settings import config
-from magmap.io import np_io
+from magmap.cv import chunking
+from magmap.io import chunked_io, np_io
 from magmap.plot import plot_3d
 from magmap.io import libmag
 
@@ -77,6 +79,9 @@ DEFAULT_IMG_STACK_NAME = "myvolume"
 
 _KEY_ANY_CHANNEL = "1+"  # 1+ channel files
 
+#: int: Number of pixels per slab when streaming intensity bounds.
+_STREAM_SLAB_SIZE = 2 ** 24
+
 
 def is_javabridge_loaded():
     """Check if Javabridge and Python-Bioformats have been loaded.
@@ -447,9 +452,9 @@ def _update_image5d_np_ver(curr_ver, image5d, info, filename_info_npz):
             image5d_orig = img5d.img
             scaling = calc_scaling(image5d_orig, image5d)
             # image5d is a scaled, smaller image, so bounds will be 
-            # calculated since the calculation requires loading full image 
-            # into memory; otherwise, defer to re-importing the image
-            lows, highs = calc_intensity_bounds(image5d)
+            # calculated by streaming the image; otherwise, defer to
+            # re-importing the image
+            lows, highs = calc_intensity_bounds(image5d, stream=True)
         elif image5d.ndim >= 5:
             # recalculate near min/max for multichannel
             print("updating near min/max (this may take awhile)")
@@ -612,7 +617,14 @@ def read_file(filename, series=None, offset=None, size=None, return_info=False,
 
         # load original image, using mem-mapped accessed for the image
         # file to minimize memory requirement, only loading on-the-fly
-        image5d = np.load(filename_image5d, mmap_mode="r")
+        path_chunked = chunked_io.get_store_path(filename_image5d)
+        if not os.path.exists(filename_image5d) and os.path.isdir(
+                path_chunked):
+            # fall back to a chunked store, accessed like a memmap
+            image5d = chunked_io.ChunkedImage(path_chunked)
+            filename_image5d = path_chunked
+        else:
+            image5d = np.load(filename_image5d, mmap_mode="r")
         print("image5d shape: {}".format(image5d.shape))
         if offset is not None and size is not None:
             # simplifies to reducing the image to a subset as an ROI if
@@ -826,6 +838,164 @@ def _update_shape_for_channels(shape, chl_paths, channel):
     return shape_in, shape_out
 
 
+def _num_import_slabs(nz, paths):
+    """Get the number of z-plane slabs to import in parallel.
+    
+    Bioformats readers each require a JVM, which cannot be shared with
+    forked processes, so files other than RAW files are only imported in
+    parallel when processes are spawned.
+    
+    Args:
+        nz (int): Number of z-planes.
+        paths (List[str]): Paths of files to import.
+
+    Returns:
+        int: Number of slabs, which is 1 to import all planes in the
+        current process.
+
+    """
+    if chunking.is_fork() and not all([_is_raw(p) for p in paths]):
+        return 1
+    cpus = config.cpus if config.cpus else os.cpu_count()
+    return max(min(cpus, nz), 1)
+
+
+def _open_import_reader(img_path, dtype, shape_in):
+    """Open a reader for importing image planes.
+    
+    Args:
+        img_path (str): Path to image file.
+        dtype (str): Data type for RAW files.
+        shape_in (List[int]): Shape of the input file.
+
+    Returns:
+        :obj:`bf.ImageReader`, :obj:`np.memmap`: Python-Bioformats reader,
+        or None if the file could not be opened by Bioformats, in which
+        case the file is opened as a RAW memory-mapped array instead.
+
+    """
+    rdr = None
+    img_raw = None
+    if not _is_raw(img_path):
+        # open non-RAW image with Python-Bioformats
+        try:
+            rdr = bf.ImageReader(img_path, perform_init=True)
+        except (jb.JavaException, AttributeError) as err:
+            print(err)
+    if rdr is None:
+        # open image file as a RAW 3D array
+        img_raw = np.memmap(
+            img_path, dtype=dtype, shape=tuple(shape_in[1:]), mode="r")
+    return rdr, img_raw
+
+
+def _read_import_plane(rdr, img_raw, shape_in, series, offset, t, z,
+                       chl_load):
+    """Read a plane from an image being imported.
+    
+    Args:
+        rdr (:obj:`bf.ImageReader`): Python-Bioformats reader; ignored if
+            ``img_raw`` is given.
+        img_raw (:obj:`np.memmap`): RAW memory-mapped image.
+        shape_in (List[int]): Shape of the input file.
+        series (int): Series index.
+        offset (int): z-plane offset from which import starts.
+        t (int): Time index.
+        z (int): z-plane index.
+        chl_load (int): Channel index.
+
+    Returns:
+        :obj:`np.ndarray`: The plane.
+
+    """
+    if img_raw is not None:
+        # access plane from RAW memmapped file
+        return (img_raw[z, ..., chl_load] if len(shape_in) >= 5
+                else img_raw[z])
+    # read plane with Bioformats reader; chl_load may be ignored for some
+    # formats, yielding multichannel planes
+    return rdr.read(z=(z + offset), t=t, c=chl_load, series=series,
+                    rescale=False)
+
+
+def _import_plane_range(img_path, filename_image5d, import_md, shape_in,
+                        series, offset, t, z_range, chl_load, chli,
+                        rdr=None, img_raw=None, fn_feedback=None,
+                        plane_first=None):
+    """Import a contiguous range of planes into a pre-allocated image file.
+    
+    Args:
+        img_path (str): Path to image file to import.
+        filename_image5d (str): Path to the output NPY file, which should
+            already be allocated.
+        import_md (dict[:obj:`config.MetaKeys`]): Import metadata dictionary.
+        shape_in (List[int]): Shape of the input file.
+        series (int): Series index.
+        offset (int): z-plane offset from which import starts.
+        t (int): Time index.
+        z_range (tuple[int, int]): Start and end z-plane indices.
+        chl_load (int): Channel index to load.
+        chli (int): Output channel index for files with a single channel.
+        rdr (:obj:`bf.ImageReader`): Python-Bioformats reader; defaults
+            to None to open a reader for this range.
+        img_raw (:obj:`np.memmap`): RAW memory-mapped image; defaults
+            to None to open a reader for this range.
+        fn_feedback (func): Callback function to give feedback strings
+            during import; defaults to None.
+        plane_first (:obj:`np.ndarray`): First plane of the range if
+            already read; defaults to None to read it.
+
+    Returns:
+        List[List[float]], List[List[float]], tuple[int]: Lists of near
+        low and near high intensities per plane, and the shape of the
+        last plane.
+
+    """
+    jb_attached = False
+    close_rdr = rdr is None and img_raw is None
+    if close_rdr:
+        # open a separate reader when running in a separate process
+        if not _is_raw(img_path):
+            start_jvm()
+            jb.attach()
+            jb_attached = True
+        rdr, img_raw = _open_import_reader(
+            img_path, import_md[config.MetaKeys.DTYPE], shape_in)
+    image5d = np.load(filename_image5d, mmap_mode="r+")
+    
+    lows = []
+    highs = []
+    plane_shape = None
+    for z in range(*z_range):
+        # import by channel plane
+        libmag.printcb(
+            "loading planes from time {}, z {}, channel {}"
+            .format(t, z, chl_load), fn_feedback)
+        if plane_first is not None and z == z_range[0]:
+            img = plane_first
+        else:
+            img = _read_import_plane(
+                rdr, img_raw, shape_in, series, offset, t, z, chl_load)
+        plane_shape = img.shape
+        
+        # near max/min bounds per channel for the given plane
+        low, high = calc_intensity_bounds(img, dim_channel=2)
+        lows.append(low)
+        highs.append(high)
+        if image5d.ndim >= 5 and img.ndim == 2:
+            # squeeze 2D plane inside if separate file per channel
+            image5d[t, z, :, :, chli] = img
+        else:
+            image5d[t, z] = img
+    image5d.flush()
+    
+    if close_rdr and rdr is not None:
+        rdr.close()
+    if jb_attached:
+        jb.detach()
+    return lows, highs, plane_shape
+
+
 def import_multiplane_images(chl_paths, prefix, import_md, series=None,
                              offset=0, channel=None, fn_feedback=None):
     """Imports single or multiplane file(s) into Numpy format.
@@ -835,6 +1005,10 @@ def import_multiplane_images(chl_paths, prefix, import_md, series=None,
     channel. Files will be loaded by Bioformats, with fallback by Numpy
     as RAW files. Output files are written plane-by-plane to memory-mapped
     files to bypass keeping the full input or output image in RAM.
+    
+    Planes are imported in contiguous z-slabs by a multiprocessing pool,
+    where each process opens its own reader and writes directly into the
+    pre-allocated output file.
 
     Args:
         chl_paths (dict[Any, List[str]]): Ordered dictionary of channel
@@ -855,7 +1029,8 @@ def import_multiplane_images(chl_paths, prefix, import_md, series=None,
         :obj:`np_io.Image5d: The 5D image object.
     
     """
-    if not is_javabridge_loaded():
+    paths = [p for chl_p in chl_paths.values() for p in chl_p]
+    if not all([_is_raw(p) for p in paths]) and not is_javabridge_loaded():
         return None
 
     time_start = time()
@@ -888,6 +1063,11 @@ def import_multiplane_images(chl_paths, prefix, import_md, series=None,
     near_mins = []
     near_maxs = []
     chli = 0
+    pool = None
+    nslabs = _num_import_slabs(
+        shape[1], [p[0] for p in chl_paths.values()])
+    if nslabs > 1:
+        pool = chunking.get_mp_pool()
     for chl, paths in chl_paths.items():
         # assume only one file per channel, ignoring others in same channel
         img_path = paths[0]
@@ -898,69 +1078,69 @@ def import_multiplane_images(chl_paths, prefix, import_md, series=None,
             shape = tuple(shape)
         
         # set up image reader
-        rdr = None
-        img_raw = None
         libmag.printcb(
             "Loading file {} for import".format(img_path), fn_feedback)
-        if not _is_raw(img_path):
-            # open non-RAW image with Python-Bioformats
-            try:
-                if not jb_attached:
-                    # start JVM and attach to current thread
-                    start_jvm()
-                    jb.attach()
-                    jb_attached = True
-                rdr = bf.ImageReader(img_path, perform_init=True)
-            except (jb.JavaException, AttributeError) as err:
-                print(err)
-        if rdr is None:
-            # open image file as a RAW 3D array
-            img_raw = np.memmap(
-                img_path, dtype=import_md[config.MetaKeys.DTYPE],
-                shape=tuple(shape_in[1:]), mode="r")
+        rdr = None
+        img_raw = None
+        if pool is None or image5d is None:
+            # open a reader in this process to import planes serially or
+            # to get the data type from the first plane
+            if not jb_attached and not _is_raw(img_path):
+                # start JVM and attach to current thread
+                start_jvm()
+                jb.attach()
+                jb_attached = True
+            rdr, img_raw = _open_import_reader(
+                img_path, import_md[config.MetaKeys.DTYPE], shape_in)
         
-        len_shape = len(shape)
-        len_shape_in = len(shape_in)
         plane_shape = None
+        plane_first = None
         for chl_load in chls_load:
             lows = []
             highs = []
             for t in range(shape[0]):
-                for z in range(shape[1]):
-                    # import by channel plane
-                    libmag.printcb(
-                        "loading planes from time {}, z {}, channel {}"
-                        .format(t, z, chl_load), fn_feedback)
-                    if img_raw is not None:
-                        # access plane from RAW memmapped file
-                        img = (img_raw[z, ..., chl_load] if len_shape_in >= 5
-                               else img_raw[z])
-                    else:
-                        # read plane with Bioformats reader; chl_load may be
-                        # ignored for some formats, yielding multichannel planes
-                        img = rdr.read(z=(z + offset), t=t, c=chl_load,
-                                       series=series, rescale=False)
-                    plane_shape = img.shape
-                    
-                    if image5d is None:
-                        # open output file as memmap to directly write to disk,
-                        # much faster than outputting to RAM first; supports
-                        # NPY directly, unlike np.memmap
-                        image5d = np.lib.format.open_memmap(
-                            filename_image5d, mode="w+", dtype=img.dtype,
-                            shape=shape)
-                        print("setting image5d array for series {} with shape: "
-                              "{}".format(series, image5d.shape))
-                    
-                    # near max/min bounds per channel for the given plane
-                    low, high = calc_intensity_bounds(img, dim_channel=2)
-                    lows.append(low)
-                    highs.append(high)
-                    if len_shape >= 5 and len(img.shape) == 2:
-                        # squeeze 2D plane inside if separate file per channel
-                        image5d[t, z, :, :, chli] = img
-                    else:
-                        image5d[t, z] = img
+                if image5d is None:
+                    # open output file as memmap to directly write to disk,
+                    # much faster than outputting to RAM first; supports
+                    # NPY directly, unlike np.memmap; get the data type
+                    # from the first plane
+                    plane_first = _read_import_plane(
+                        rdr, img_raw, shape_in, series, offset, t, 0,
+                        chl_load)
+                    image5d = np.lib.format.open_memmap(
+                        filename_image5d, mode="w+", dtype=plane_first.dtype,
+                        shape=shape)
+                    print("setting image5d array for series {} with shape: "
+                          "{}".format(series, image5d.shape))
+                
+                # import contiguous slabs of planes, each in a separate
+                # process with its own reader writing directly to the output
+                # file, merging the per-plane bounds in z-order
+                slabs = np.array_split(np.arange(shape[1]), nslabs)
+                z_ranges = [(s[0], s[-1] + 1) for s in slabs if len(s) > 0]
+                # reuse the first plane, which is only read for the first
+                # slab of the first channel
+                if pool is None:
+                    results = [_import_plane_range(
+                        img_path, filename_image5d, import_md, shape_in,
+                        series, offset, t, z_range, chl_load, chli, rdr,
+                        img_raw, fn_feedback,
+                        plane_first if i == 0 else None)
+                        for i, z_range in enumerate(z_ranges)]
+                else:
+                    results = [pool.apply_async(
+                        _import_plane_range,
+                        args=(img_path, filename_image5d, import_md,
+                              shape_in, series, offset, t, z_range,
+                              chl_load, chli),
+                        kwds=dict(plane_first=plane_first if i == 0
+                                  else None))
+                        for i, z_range in enumerate(z_ranges)]
+                    results = [r.get() for r in results]
+                plane_first = None
+                for slab_lows, slab_highs, plane_shape in results:
+                    lows.extend(slab_lows)
+                    highs.extend(slab_highs)
             if len(plane_shape) > 2 and plane_shape[2] > 1:
                 # assume all planes were multichannel so all channels imported
                 print("Multiple channels imported per plane, will assume "
@@ -973,6 +1153,9 @@ def import_multiplane_images(chl_paths, prefix, import_md, series=None,
             rdr.close()
         if img_raw is not None:
             img_raw.flush()
+    if pool is not None:
+        pool.close()
+        pool.join()
     
     # finalize import and save metadata
     image5d.flush()  # may not be necessary but ensure contents to disk
@@ -1060,7 +1243,9 @@ def import_planes_to_stack(chl_paths, prefix, import_md, rgb_to_grayscale=True,
     """Import single plane image files into a single volumetric image stack.
 
     Each file in ``chl_paths`` is assumed to be a 2D plane in a volumetric
-    image with either a single channel or an RGB channel.
+    image with either a single channel or an RGB channel. Planes are
+    decoded by a thread pool and written into the output memory-mapped file
+    as they arrive, limiting the number of planes held in memory.
 
     Args:
         chl_paths (dict[int, List[str]]): Ordered dictionary of channel
@@ -1082,45 +1267,52 @@ def import_planes_to_stack(chl_paths, prefix, import_md, rgb_to_grayscale=True,
         :obj:`np_io.Image5d: The 5D image object.
 
     """
+    def read_plane(file):
+        # decode a plane, which releases the GIL for most formats
+        libmag.printcb("importing {}".format(file), fn_feedback)
+        img = io.imread(file)
+        if rgb_to_grayscale and img.ndim >= 3 and img.shape[2] == 3:
+            # assume that 3-value 3rd channel images are RGB
+            # TODO: remove rgb_to_grayscale since must give single channel?
+            print("converted from 3-channel (assuming RGB) to grayscale")
+            img = color.rgb2gray(img)
+        return img
+    
+    def import_plane(img, filei):
+        # insert plane, without using channel dimension if no channel
+        # designators were found in file names
+        if num_chls > 1:
+            image5d[0, filei, ..., chli] = img
+        else:
+            image5d[0, filei] = img
+
+        # measure near low/high intensity values
+        return np.percentile(img, (0.5, 99.5))
+    
+    def import_file(file, filei):
+        return import_plane(read_plane(file), filei)
+    
     def import_files():
-        # import files for the current channel
+        # import files for the current channel, decoding and inserting
+        # planes in a thread pool with a bounded number of planes in flight
         lows = []
         highs = []
-        img5d = image5d
+        futs = set()
         for filei, file in enumerate(chl_files):
-            libmag.printcb("importing {}".format(file), fn_feedback)
-            img = io.imread(file)
-            if rgb_to_grayscale and img.ndim >= 3 and img.shape[2] == 3:
-                # assume that 3-value 3rd channel images are RGB
-                # TODO: remove rgb_to_grayscale since must give single channel?
-                print("converted from 3-channel (assuming RGB) to grayscale")
-                img = color.rgb2gray(img)
-
-            if img5d is None:
-                # generate an array for all planes and channels based on
-                # dimensions of the first extracted plane and any channel keys
-                shape = [1, len(chl_files), *img.shape]
-                if num_chls > 1:
-                    shape.append(num_chls)
-                img5d = np.lib.format.open_memmap(
-                    filename_image5d_npz, mode="w+", dtype=img.dtype,
-                    shape=tuple(shape))
-
-            # insert plane, without using channel dimension if no channel
-            # designators were found in file names
-            if num_chls > 1:
-                img5d[0, filei, ..., chli] = img
-            else:
-                img5d[0, filei] = img
-
-            # measure near low/high intensity values
-            low, high = np.percentile(img, (0.5, 99.5))
+            if len(futs) >= max_planes:
+                done, futs = futures.wait(
+                    futs, return_when=futures.FIRST_COMPLETED)
+                for fut in done:
+                    low, high = fut.result()
+                    lows.append(low)
+                    highs.append(high)
+            futs.add(executor.submit(import_file, file, filei))
+        for fut in futures.as_completed(futs):
+            low, high = fut.result()
             lows.append(low)
             highs.append(high)
-
         lows_chls.append(min(lows))
         highs_chls.append(max(highs))
-        return img5d
     
     # each key is assumed to represent a distinct channel
     num_chls = len(chl_paths.keys())
@@ -1134,14 +1326,29 @@ def import_planes_to_stack(chl_paths, prefix, import_md, rgb_to_grayscale=True,
     filename_image5d_npz, filename_info_npz = make_filenames(prefix + ".")
     libmag.printcb("Importing single-plane images into multiplane Numpy format "
                    "file: {}".format(filename_image5d_npz), fn_feedback)
-    image5d = None
     lows_chls = []
     highs_chls = []
-    chli = 0
-    for chl_files in chl_paths.values():
-        # import files for the given channel
-        image5d = import_files()
-        chli += 1
+    
+    # generate an array for all planes and channels based on dimensions
+    # of the first plane and any channel keys
+    chl_files = tuple(chl_paths.values())[0]
+    img = read_plane(chl_files[0])
+    shape = [1, len(chl_files), *img.shape]
+    if num_chls > 1:
+        shape.append(num_chls)
+    image5d = np.lib.format.open_memmap(
+        filename_image5d_npz, mode="w+", dtype=img.dtype, shape=tuple(shape))
+    del img
+    
+    # limit planes in flight to a few per thread to bound memory
+    max_workers = config.cpus if config.cpus else min(
+        32, os.cpu_count() + 4)
+    max_planes = 2 * max_workers
+    with futures.ThreadPoolExecutor(max_workers) as executor:
+        for chli, chl_files in enumerate(chl_paths.values()):
+            # import files for the given channel
+            import_files()
+    image5d.flush()
 
     # save metadata and load for immediate use
     md = save_image_info(
@@ -1156,13 +1363,162 @@ def import_planes_to_stack(chl_paths, prefix, import_md, rgb_to_grayscale=True,
         image5d, filename_image5d_npz, filename_info_npz, config.LoadIO.NP)
 
 
-def calc_intensity_bounds(image5d, lower=0.5, upper=99.5, dim_channel=4):
+class IntensityAccumulator:
+    """Accumulate image intensities in a bounded amount of memory to
+    calculate percentiles in a single pass.
+    
+    Integer images are accumulated into an exact histogram so that
+    percentiles match those from :meth:`np.percentile` with linear
+    interpolation. Integer types wider than 2 bytes are kept as sorted
+    arrays of unique values and counts until they exceed
+    :attr:`MAX_UNIQUE` values, after which they are converted to the
+    sketch used for float images. Float images are summarized by a
+    mergeable sketch of quantiles from each added array, with a rank
+    error within :attr:`SKETCH_RANK_TOL`.
+    
+    Attributes:
+        SKETCH_QUANTILES (int): Number of quantiles summarizing each
+            array added to the sketch for float images.
+        SKETCH_RANK_TOL (float): Maximum error in percentile rank for
+            float images.
+        MAX_UNIQUE (int): Maximum number of unique values kept exactly
+            for wide integer types.
+        dtype (:obj:`np.dtype`): Data type of the accumulated intensities.
+        count (int): Number of accumulated intensities.
+    
+    """
+    SKETCH_QUANTILES = 2001
+    SKETCH_RANK_TOL = 100 / (SKETCH_QUANTILES - 1)
+    MAX_UNIQUE = 2 ** 20
+    
+    def __init__(self, dtype):
+        """Initialize the accumulator.
+        
+        Args:
+            dtype (:obj:`np.dtype`): Data type of intensities to accumulate.
+        
+        """
+        self.dtype = np.dtype(dtype)
+        self.count = 0
+        self._hist = None
+        self._hist_min = 0
+        self._vals = None
+        self._counts = None
+        self._sketch_vals = []
+        self._sketch_wts = []
+        if self.dtype.kind in "biu" and self.dtype.itemsize <= 2:
+            # fixed histogram over the full range of small integer types
+            if self.dtype.kind != "b":
+                self._hist_min = int(np.iinfo(self.dtype).min)
+            self._hist = np.zeros(
+                2 if self.dtype.kind == "b" else 2 ** (8 * self.dtype.itemsize),
+                dtype=np.int64)
+        elif self.dtype.kind in "iu":
+            # sorted unique values and counts for larger integer types
+            self._vals = np.zeros(0, dtype=self.dtype)
+            self._counts = np.zeros(0, dtype=np.int64)
+    
+    def add(self, arr):
+        """Add intensities.
+        
+        Args:
+            arr (:obj:`np.ndarray`): Array of intensities.
+        
+        """
+        arr = np.asarray(arr).ravel()
+        if arr.size == 0:
+            return
+        self.count += arr.size
+        if self._hist is not None:
+            # shift to non-negative bins
+            self._hist += np.bincount(
+                arr.astype(np.int64) - self._hist_min,
+                minlength=len(self._hist))
+        elif self._vals is not None:
+            # merge unique values and counts into the accumulated arrays
+            vals, counts = np.unique(arr, return_counts=True)
+            vals, inv = np.unique(
+                np.concatenate((self._vals, vals)), return_inverse=True)
+            self._counts = np.bincount(
+                inv, np.concatenate((self._counts, counts)),
+                len(vals)).astype(np.int64)
+            self._vals = vals
+            if len(vals) > self.MAX_UNIQUE:
+                # too many unique values to keep exactly
+                self._to_sketch()
+        else:
+            # summarize the array by evenly spaced quantiles, each
+            # weighted by its share of the array
+            self._sketch_vals.append(np.percentile(
+                arr, np.linspace(0, 100, self.SKETCH_QUANTILES)))
+            self._sketch_wts.append(arr.size / self.SKETCH_QUANTILES)
+    
+    def _to_sketch(self):
+        # summarize the accumulated unique values as the first sketch entry
+        ranks = np.linspace(0, self.count - 1, self.SKETCH_QUANTILES)
+        self._sketch_vals.append(
+            self._value_at(self._vals, self._counts, ranks).astype(float))
+        self._sketch_wts.append(self.count / self.SKETCH_QUANTILES)
+        self._vals = None
+        self._counts = None
+    
+    def _value_at(self, vals, counts, ranks):
+        # get values at the given 0-based ranks from a sorted histogram
+        return vals[np.searchsorted(np.cumsum(counts), ranks, side="right")]
+    
+    def percentile(self, q):
+        """Get percentiles of the accumulated intensities.
+        
+        Args:
+            q (Sequence[float]): Percentiles to calculate.
+
+        Returns:
+            :obj:`np.ndarray`: Array of percentiles as floats.
+
+        """
+        q = np.true_divide(q, 100)
+        if self.count == 0:
+            return np.full(q.shape, np.nan)
+        if self._hist is None and self._vals is None:
+            # float sketch, interpolating between weighted quantiles
+            vals = np.concatenate(self._sketch_vals)
+            wts = np.repeat(self._sketch_wts, self.SKETCH_QUANTILES)
+            sort = np.argsort(vals, kind="stable")
+            vals = vals[sort]
+            cum = np.cumsum(wts[sort]) - wts[sort] / 2
+            return np.interp(q * self.count, cum, vals)
+        
+        if self._hist is not None:
+            vals = np.arange(len(self._hist)) + self._hist_min
+            counts = self._hist
+        else:
+            vals = self._vals
+            counts = self._counts
+        
+        # replicate linear interpolation between neighboring ranks
+        # in np.percentile
+        virtual = (self.count - 1) * q
+        prev_ranks = np.floor(virtual)
+        next_ranks = np.minimum(prev_ranks + 1, self.count - 1)
+        gamma = virtual - prev_ranks
+        prev_vals = self._value_at(vals, counts, prev_ranks).astype(float)
+        next_vals = self._value_at(vals, counts, next_ranks).astype(float)
+        diff = next_vals - prev_vals
+        lerp = prev_vals + diff * gamma
+        return np.where(
+            gamma >= 0.5, next_vals - diff * (1 - gamma), lerp)
+
+
+def calc_intensity_bounds(image5d, lower=0.5, upper=99.5, dim_channel=4,
+                          stream=False):
     """Calculate image intensity boundaries for the given percentiles, 
     including boundaries for each channel in multichannel images.
     
-    Assume that the image will be small enough to load entirely into 
-    memory rather than calculating bounds plane-by-plane, but can also 
-    be given an individual plane. Also assume that bounds for all channels 
+    By default, assume that the image will be small enough to load entirely
+    into memory rather than calculating bounds plane-by-plane, but can also 
+    be given an individual plane. For large images such as memory-mapped
+    files, the image can instead be streamed in z-slabs into an
+    :class:`IntensityAccumulator`. Also assume that bounds for all channels 
     will be calculated.
     
     Args:
@@ -1172,6 +1528,12 @@ def calc_intensity_bounds(image5d, lower=0.5, upper=99.5, dim_channel=4):
         upper: Upper bound as a percentile; defaults to 99.5.
         dim_channel: Axis number of channel; defaults to 4, where the
             channel value is collapsed into the x-axis.
+        stream (bool): True to calculate bounds in a single pass through
+            z-slabs with bounded memory; defaults to False. Bounds for
+            integer images are identical to those from the full image,
+            while float images and integer images with more than
+            :attr:`IntensityAccumulator.MAX_UNIQUE` unique values are within
+            :attr:`IntensityAccumulator.SKETCH_RANK_TOL` percentile ranks.
     
     Returns:
         Tuple of ``lows`` and ``highs``, each of which is a list of the 
@@ -1180,6 +1542,24 @@ def calc_intensity_bounds(image5d, lower=0.5, upper=99.5, dim_channel=4):
     multichannel, channels = plot_3d.setup_channels(image5d, None, dim_channel)
     lows = []
     highs = []
+    if stream:
+        # accumulate intensities by slab along the z-axis, or the first
+        # axis if the image has fewer dimensions
+        accums = [IntensityAccumulator(image5d.dtype) for _ in channels]
+        axis = max(dim_channel - 3, 0)
+        nplanes = max(1, _STREAM_SLAB_SIZE // max(
+            1, image5d.size // max(1, image5d.shape[axis])))
+        for start in range(0, image5d.shape[axis], nplanes):
+            slab = image5d[
+                (slice(None),) * axis + (slice(start, start + nplanes),)]
+            for accum, i in zip(accums, channels):
+                accum.add(slab[..., i] if multichannel else slab)
+        for accum in accums:
+            low, high = accum.percentile((lower, upper))
+            lows.append(low)
+            highs.append(high)
+        return lows, highs
+    
     for i in channels:
         image5d_show = image5d[..., i] if multichannel else image5d
         low, high = np.percentile(image5d_show, (lower, upper))
@@ -1225,7 +1605,7 @@ def save_np_image(image, filename, series=None):
 
     # save a metadata file using the current settings and updating the
     # near min/max values
-    lows, highs = calc_intensity_bounds(image)
+    lows, highs = calc_intensity_bounds(image, stream=True)
     save_image_info(
         filename_info_npz, [os.path.basename(filename)], [image.shape], 
         config.resolutions, config.magnification, config.zoom, 
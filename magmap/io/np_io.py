@@ -234,6 +234,7 @@ def setup_images(path=None, series=None, offset=None, size=None,
             config.ProcessTypes.COLOC_MATCH,
             config.ProcessTypes.EXPORT_ROIS,
             config.ProcessTypes.EXPORT_BLOBS,
+            config.ProcessTypes.EXPORT_BLOBS_CSV,
             config.ProcessTypes.DETECT):
         # load a blobs archive
         blobs = detector.Blobs()
@@ -261,7 +262,8 @@ def setup_images(path=None, series=None, offset=None, size=None,
         except (FileNotFoundError, KeyError) as e2:
             print("Unable to load blobs file")
             if proc_type in (
-                    config.ProcessTypes.LOAD, config.ProcessTypes.EXPORT_BLOBS):
+                    config.ProcessTypes.LOAD, config.ProcessTypes.EXPORT_BLOBS,
+                    config.ProcessTypes.EXPORT_BLOBS_CSV):
                 # blobs expected but not found
                 raise e2
     
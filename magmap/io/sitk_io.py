@@ -4,14 +4,19 @@
 
 Manage import and export of :class:`simpleitk.Image` objects.
 """
+from collections import deque
+from concurrent import futures
 import os
+import queue
 import shutil
+import threading
 
 import numpy as np
 import SimpleITK as sitk
 from skimage import transform
 
 from magmap.settings import config
+from magmap.io import edit_journal
 from magmap.io import importer
 from magmap.io import libmag
 
@@ -105,6 +110,8 @@ def read_sitk(path, dryrun=False):
         or None if no matching, existing path is found. If a file at
         ``path`` cannot be found, its extension is replaced successively
         with remaining extensions in :const:``EXTS_3D`` until a file is found.
+        Edits in a journal alongside the loaded file are replayed onto the
+        image.
     
     """
     # prioritize given extension
@@ -121,7 +128,7 @@ def read_sitk(path, dryrun=False):
         if os.path.exists(img_path):
             if not dryrun:
                 print("Loading image with SimpleITK:", img_path)
-                img_sitk = sitk.ReadImage(img_path)
+                img_sitk = _replay_journal(sitk.ReadImage(img_path), img_path)
             path_loaded = img_path
             break
     if not dryrun and img_sitk is None:
@@ -130,6 +137,17 @@ def read_sitk(path, dryrun=False):
     return img_sitk, path_loaded
 
 
+def _replay_journal(img_sitk, path):
+    # apply any edits journaled since the image was last saved in full
+    journal_path = edit_journal.get_journal_path(path)
+    if not os.path.exists(journal_path):
+        return img_sitk
+    img_np = sitk.GetArrayFromImage(img_sitk)
+    npatches = edit_journal.replay(img_np, journal_path)
+    print("replayed {} edits from {}".format(npatches, journal_path))
+    return replace_sitk_with_numpy(img_sitk, img_np)
+
+
 def _load_reg_img_to_combine(path, reg_name, img_nps):
     # load registered image in sitk format to combine with other images 
     # by resizing to the shape of the first image
@@ -141,18 +159,100 @@ def _load_reg_img_to_combine(path, reg_name, img_nps):
         path, reg_name, get_sitk=True, return_path=True)
     img_np = sitk.GetArrayFromImage(img_sitk)
     if img_np_base is not None:
-        if img_np_base.shape != img_np.shape:
-            # resize to first image
-            img_np = transform.resize(
-                img_np, img_np_base.shape, preserve_range=True, 
-                anti_aliasing=True, mode="reflect")
-        # normalize to max of first image to make comparable when combining
-        img_np = libmag.normalize(
-            img_np * 1.0, 0, np.amax(img_np_base))
+        img_np = _match_img_to_combine(
+            img_np, img_np_base.shape, np.amax(img_np_base))
     img_nps.append(img_np)
     return img_sitk, loaded_path
 
 
+def _match_img_to_combine(img_np, shape, max_val):
+    # resize to the shape of the first image and normalize to its max to
+    # make the images comparable when combining
+    if shape != img_np.shape:
+        img_np = transform.resize(
+            img_np, shape, preserve_range=True, 
+            anti_aliasing=True, mode="reflect")
+    return libmag.normalize(img_np * 1.0, 0, max_val)
+
+
+class ImageAccumulator:
+    """Accumulate images one at a time into running statistics.
+    
+    Only running buffers the size of a single image are kept, rather than
+    all the images.
+    
+    Attributes:
+        count (int): Number of images added.
+        sum (:obj:`np.ndarray`): Running sum, with data type promoted as
+            in :func:`np.sum`.
+        mean (:obj:`np.ndarray`): Running mean as floats.
+    
+    """
+    def __init__(self, variance=False):
+        """Construct an image accumulator.
+        
+        Args:
+            variance (bool): True to also track the variance through
+                Welford's algorithm; defaults to False.
+        
+        """
+        self.count = 0
+        self.sum = None
+        self.mean = None
+        self._m2 = None
+        self._track_var = variance
+    
+    def add(self, img):
+        """Add an image.
+        
+        Args:
+            img (:obj:`np.ndarray`): Image of the same shape as prior images.
+
+        """
+        self.count += 1
+        if self.sum is None:
+            self.sum = np.sum(img[None], axis=0)
+            self.mean = img.astype(np.float64)
+            if self._track_var:
+                self._m2 = np.zeros_like(self.mean)
+            return
+        self.sum = self.sum + img
+        delta = img - self.mean
+        self.mean += delta / self.count
+        if self._track_var:
+            self._m2 += delta * (img - self.mean)
+    
+    @property
+    def variance(self):
+        """Population variance, as in :func:`np.var`, or None if not
+        tracked or no images have been added."""
+        if self._m2 is None:
+            return None
+        return self._m2 / self.count
+    
+    def get_stat(self, fn_combine):
+        """Get the statistic corresponding to a combining function.
+        
+        Args:
+            fn_combine (func): One of the functions in
+                :const:`ACCUMULATOR_STATS`.
+
+        Returns:
+            :obj:`np.ndarray`: The statistic.
+
+        """
+        return getattr(self, ACCUMULATOR_STATS[fn_combine])
+
+
+#: dict[func, str]: Combining functions that can be computed by streaming
+# images through :class:`ImageAccumulator`, mapped to their statistics.
+ACCUMULATOR_STATS = {
+    np.sum: "sum",
+    np.mean: "mean",
+    np.var: "variance",
+}
+
+
 def read_sitk_files(filename_sitk, reg_names=None, return_sitk=False):
     """Read an image file through SimpleITK and export to Numpy array format,
     with support for combining multiple registered image files into a single
@@ -264,6 +364,130 @@ def load_registered_img(img_path, reg_name, get_sitk=False, return_path=False):
     return (reg_img, reg_img_path) if return_path else reg_img
 
 
+class PrefetchLoader:
+    """Load samples in a background thread ahead of their use.
+    
+    Samples are loaded in order into a bounded queue while the current
+    sample is being processed. At most ``prefetch`` samples are loaded
+    ahead of the sample in use, so that no more than ``prefetch + 1``
+    samples are resident at a time. A sample is released when the next
+    one is requested. Loading can be paused, such as while forking
+    processes that should not inherit a thread in the middle of a read.
+    
+    Attributes:
+        fn_load (func): Function to load a sample.
+        args (List[Sequence]): Sequence of arguments to ``fn_load`` for
+            each sample.
+        prefetch (int): Maximum number of samples to load ahead.
+        max_bytes (int): Memory cap for Numpy arrays in resident samples;
+            a sample will not be loaded ahead once the resident samples
+            reach this cap. Defaults to None for no cap.
+    
+    """
+    def __init__(self, fn_load, args, prefetch=1, max_bytes=None):
+        """Construct the loader."""
+        self.fn_load = fn_load
+        self.args = args
+        self.prefetch = max(0, prefetch)
+        self.max_bytes = max_bytes
+        self._queue = queue.Queue()
+        self._cond = threading.Condition()
+        self._resident = []
+        self._closed = False
+        self._paused = False
+        self._loading = False
+        self._thread = None
+    
+    @staticmethod
+    def _get_nbytes(sample):
+        # estimate the memory for Numpy arrays in a sample
+        if isinstance(sample, np.ndarray):
+            return sample.nbytes
+        if isinstance(sample, (tuple, list)):
+            return sum([PrefetchLoader._get_nbytes(s) for s in sample])
+        if isinstance(sample, dict):
+            return sum([PrefetchLoader._get_nbytes(s)
+                        for s in sample.values()])
+        return 0
+    
+    def _can_load(self):
+        # check whether another sample can be loaded ahead of the loaded,
+        # unreleased samples
+        if self._closed:
+            return True
+        if self._paused:
+            return False
+        if not self._resident:
+            return True
+        if len(self._resident) > self.prefetch:
+            return False
+        return (self.max_bytes is None
+                or sum(self._resident) < self.max_bytes)
+    
+    def _load(self):
+        # load samples in order, waiting for resident samples to be released
+        for args in self.args:
+            with self._cond:
+                self._cond.wait_for(self._can_load)
+                if self._closed:
+                    return
+                self._loading = True
+            try:
+                sample = self.fn_load(*args)
+            except Exception as e:
+                sample = e
+            with self._cond:
+                self._loading = False
+                if not isinstance(sample, Exception):
+                    self._resident.append(self._get_nbytes(sample))
+                self._cond.notify_all()
+            if isinstance(sample, Exception):
+                self._queue.put(sample)
+                return
+            self._queue.put((sample,))
+    
+    def _release(self):
+        # release the sample in use
+        with self._cond:
+            if self._resident:
+                self._resident.pop(0)
+            self._cond.notify_all()
+    
+    def pause(self):
+        """Stop loading further samples and wait for any sample being
+        loaded to finish.
+        """
+        with self._cond:
+            self._paused = True
+            self._cond.wait_for(lambda: not self._loading)
+    
+    def resume(self):
+        """Resume loading samples after :meth:`pause`."""
+        with self._cond:
+            self._paused = False
+            self._cond.notify_all()
+    
+    def close(self):
+        """Stop loading samples."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+    
+    def __iter__(self):
+        self._thread = threading.Thread(target=self._load, daemon=True)
+        self._thread.start()
+        try:
+            for i in range(len(self.args)):
+                if i > 0:
+                    self._release()
+                sample = self._queue.get()
+                if isinstance(sample, Exception):
+                    raise sample
+                yield sample[0]
+        finally:
+            self.close()
+
+
 def find_atlas_labels(labels_ref_path, drawn_labels_only, labels_ref_lookup):
     """Find atlas label IDs from the labels directory.
     
@@ -354,6 +578,8 @@ def write_registered_image(img_np, img_path, reg_name, img_sitk=None,
         reg_img = replace_sitk_with_numpy(img_sitk, img_np)
         sitk.WriteImage(reg_img, reg_img_path, False)
         print("wrote {} with current registered image".format(reg_img_path))
+        # the full image supersedes any journaled edits
+        edit_journal.remove_journal(reg_img_path)
         return reg_img
     else:
         raise FileNotFoundError(
@@ -392,6 +618,7 @@ def write_reg_images(imgs_write, prefix, copy_to_suffix=False, ext=None,
         out_path = reg_out_path(prefix, suffix)
         sitk.WriteImage(img, out_path, False)
         print("wrote registered image to", out_path)
+        edit_journal.remove_journal(out_path)
         if copy_to_suffix:
             # copy metadata file to allow opening images from bare suffix name, 
             # such as when this atlas becomes the new atlas for registration
@@ -401,11 +628,14 @@ def write_reg_images(imgs_write, prefix, copy_to_suffix=False, ext=None,
 
 
 def merge_images(img_paths, reg_name, prefix=None, suffix=None, 
-                 fn_combine=np.sum):
+                 fn_combine=np.sum, prefetch=1):
     """Merge images from multiple paths.
     
     Assumes that the images are relatively similar in size, but will resize 
-    them to the size of the first image to combine the images.
+    them to the size of the first image to combine the images. Images
+    combined by functions in :const:`ACCUMULATOR_STATS` are streamed
+    through an :class:`ImageAccumulator` to hold only one image at a time
+    aside from those being prefetched.
     
     Args:
         img_paths: Paths from which registered paths will be found.
@@ -418,26 +648,57 @@ def merge_images(img_paths, reg_name, prefix=None, suffix=None,
         fn_combine: Function to apply to combine images with ``axis=0``. 
             Defaults to :func:``np.sum``. If None, each image will be 
             inserted as a separate channel.
+        prefetch (int): Number of images to load ahead in separate threads
+            while combining images; defaults to 1.
     
     Returns:
         The combined image in SimpleITK format.
     """
     if len(img_paths) < 1: return None
     
-    img_sitk = None
-    img_nps = []
-    for img_path in img_paths:
+    def load_img(img_path, shape=None, max_val=None):
         mod_path = img_path
         if suffix is not None:
             # adjust image path with suffix
             mod_path = libmag.insert_before_ext(mod_path, suffix)
         print("loading", mod_path)
-        # load and resize images to shape of first loaded image
-        img, _ = _load_reg_img_to_combine(mod_path, reg_name, img_nps)
-        if img_sitk is None: img_sitk = img
+        img = load_registered_img(mod_path, reg_name, get_sitk=True)
+        img_np = sitk.GetArrayFromImage(img)
+        if shape is not None:
+            img_np = _match_img_to_combine(img_np, shape, max_val)
+        return img, img_np
+    
+    # load the first image as the basis for resizing the other images
+    img_sitk, img_np = load_img(img_paths[0])
+    img_np_shape = img_np.shape
+    img_np_max = np.amax(img_np)
+    
+    accum = None
+    img_nps = []
+    add_img = img_nps.append
+    if fn_combine in ACCUMULATOR_STATS:
+        # add images one at a time to running buffers
+        accum = ImageAccumulator(fn_combine is np.var)
+        add_img = accum.add
+    add_img(img_np)
+    del img_np
+    
+    # load and resize images to shape of first loaded image in threads,
+    # adding images in order as they are loaded
+    loads = deque()
+    with futures.ThreadPoolExecutor(max(1, prefetch)) as executor:
+        for img_path in img_paths[1:]:
+            loads.append(executor.submit(
+                load_img, img_path, img_np_shape, img_np_max))
+            if len(loads) > prefetch:
+                add_img(loads.popleft().result()[1])
+        while loads:
+            add_img(loads.popleft().result()[1])
     
     # combine images and write single combo image
-    if fn_combine is None:
+    if accum is not None:
+        img_combo = accum.get_stat(fn_combine)
+    elif fn_combine is None:
         # combine raw images into separate channels
         img_combo = np.stack(img_nps, axis=img_nps[0].ndim)
     else:
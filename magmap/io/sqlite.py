@@ -20,11 +20,27 @@ DB_NAME_BASE = "magmap"
 DB_NAME_VERIFIED = "{}_verified.db".format(DB_NAME_BASE)
 DB_NAME_MERGED = "{}_merged.db".format(DB_NAME_BASE)
 DB_SUFFIX_TRUTH = "_truth.db"
-DB_VERSION = 4
+DB_VERSION = 5
 
 _COLS_BLOBS = "roi_id, z, y, x, radius, confirmed, truth, channel"
 _COLS_BLOB_MATCHES = "roi_id, blob1, blob2, dist"
 
+# blob columns in the order parsed into blob arrays
+_COLS_BLOB_ARR = ("z", "y", "x", "radius", "confirmed", "truth", "channel")
+_COLS_BLOBS_SELECT = "{}, id".format(", ".join(_COLS_BLOB_ARR))
+
+# blob match columns joined with the columns of both matched blobs
+_COLS_BLOB_MATCHES_JOIN = ", ".join(
+    ["m.id", "m.roi_id", "m.blob1", "m.blob2", "m.dist"]
+    + ["b1.{}".format(c) for c in _COLS_BLOB_ARR]
+    + ["b2.{}".format(c) for c in _COLS_BLOB_ARR])
+
+# max params of 999 in sqlite < v3.32.0, leaving room for other params
+_MAX_PARAMS = 990
+
+# number of rows to fetch at a time when streaming selections
+_FETCH_SIZE = 10000
+
 
 def _create_db(path):
     """Creates the database including initial schema insertion.
@@ -45,6 +61,7 @@ def _create_db(path):
     _create_table_experiments(cur)
     _create_table_rois(cur)
     _create_table_blobs(cur)
+    _create_index_blobs(cur)
     _create_table_blob_matches(cur)
     
     # store DB version information
@@ -82,6 +99,12 @@ def _create_table_blobs(cur):
                 "UNIQUE (roi_id, x, y, z, truth, channel))")
 
 
+def _create_index_blobs(cur):
+    # index blob positions for box queries within ROIs
+    cur.execute("CREATE INDEX IF NOT EXISTS blobs_position "
+                "ON blobs (roi_id, z, y, x)")
+
+
 def _create_table_blob_matches(cur):
     cur.execute("CREATE TABLE blob_matches ("
                 "id INTEGER PRIMARY KEY AUTOINCREMENT, "
@@ -142,6 +165,11 @@ def upgrade_db(conn, cur):
         print("upgrading DB version from {} to 4".format(db_ver))
         _create_table_blob_matches(cur)
     
+    if db_ver < 5:
+        print("upgrading DB version from {} to 5".format(db_ver))
+        print("indexing blob positions")
+        _create_index_blobs(cur)
+    
     # record database upgrade version and time
     insert_about(conn, cur, DB_VERSION, datetime.datetime.now())
     
@@ -312,7 +340,7 @@ def _update_experiments(db_dir):
         db.conn.commit()
 
 
-def insert_roi(conn, cur, exp_id, series, offset, size):
+def insert_roi(conn, cur, exp_id, series, offset, size, commit=True):
     """Inserts an ROI into the database.
     
     Args:
@@ -323,6 +351,7 @@ def insert_roi(conn, cur, exp_id, series, offset, size):
             the series will be set to 0.
         offset (List[int): ROI offset as (x, y, z).
         size (List[int): ROI size as (x, y, z)
+        commit (bool): True to commit the insertion; defaults to True.
     
     Returns:
         int, str: ID of the selected or inserted row and the feedback string.
@@ -337,7 +366,8 @@ def insert_roi(conn, cur, exp_id, series, offset, size):
                 (exp_id, series, *offset, *size))
     feedback = "ROI inserted with offset {} and size {}".format(offset, size)
     print(feedback)
-    conn.commit()
+    if commit:
+        conn.commit()
     return cur.lastrowid, feedback
 
 
@@ -430,7 +460,7 @@ def select_roi(cur, roi_id):
     return row
 
 
-def insert_blobs(conn, cur, roi_id, blobs):
+def insert_blobs(conn, cur, roi_id, blobs, commit=True):
     """Inserts blobs into the database, replacing any duplicate blobs.
     
     Args:
@@ -440,6 +470,7 @@ def insert_blobs(conn, cur, roi_id, blobs):
         blobs: Array of blobs arrays, assumed to be formatted according to
             :func:``detector.format_blob``. "Confirmed" is given as 
             -1 = unconfirmed, 0 = incorrect, 1 = correct.
+        commit (bool): True to commit the insertion; defaults to True.
     """
     blobs_list = []
     confirmed = 0
@@ -455,7 +486,8 @@ def insert_blobs(conn, cur, roi_id, blobs):
                     .format(_COLS_BLOBS, match_elements(
                             _COLS_BLOBS, ", ", "?")), blobs_list)
     print("{} blobs inserted, {} confirmed".format(cur.rowcount, confirmed))
-    conn.commit()
+    if commit:
+        conn.commit()
 
 
 def delete_blobs(conn, cur, roi_id, blobs):
@@ -487,28 +519,101 @@ def delete_blobs(conn, cur, roi_id, blobs):
 
 
 def _parse_blobs(rows):
-    """Parse blobs to Numpy arrow.
+    """Parse blobs to Numpy array.
+    
+    Rows are converted in a single array conversion rather than by column
+    name lookups.
     
     Args:
-        rows (List[:obj:`sqlite3.Row`]): Sequence of rows.
+        rows (List[Union[tuple, :obj:`sqlite3.Row`]]): Sequence of rows,
+            with columns in the order of :const:`_COLS_BLOB_ARR`, optionally
+            followed by the blob ID as in :const:`_COLS_BLOBS_SELECT`.
 
     Returns:
         :obj:`np.ndarray`, List[int]: Blobs as a Numpy array. List of
         blob IDs if available.
 
     """
-    blobs = np.empty((len(rows), 7))
+    nblob = len(_COLS_BLOB_ARR)
+    if len(rows) == 0:
+        return np.empty((0, nblob)), []
+    blobs = np.array(rows, dtype=float)
     ids = []
-    for i, row in enumerate(rows):
-        blobs[i] = [
-            row["z"], row["y"], row["x"], row["radius"], row["confirmed"], 
-            row["truth"], row["channel"]
-        ]
-        if "id" in row.keys():
-            ids.append(row["id"])
+    if blobs.shape[1] > nblob:
+        # separate IDs from blob columns
+        ids = blobs[:, nblob].astype(int).tolist()
+        blobs = np.ascontiguousarray(blobs[:, :nblob])
     return blobs, ids
 
 
+def _iter_blobs(cur, chunk_size=None):
+    """Generate blobs from an executed selection in chunks.
+    
+    Args:
+        cur (:obj:`sqlite3.Cursor`): Cursor with an executed blob selection
+            in the column order accepted by :meth:`_parse_blobs`.
+        chunk_size (int): Number of rows to fetch per chunk; defaults to
+            None to use :const:`_FETCH_SIZE`.
+
+    Yields:
+        :obj:`np.ndarray`, List[int]: Blobs and blob IDs for each chunk
+        as given by :meth:`_parse_blobs`.
+
+    """
+    if chunk_size is None:
+        chunk_size = _FETCH_SIZE
+    while True:
+        rows = cur.fetchmany(chunk_size)
+        if not rows: break
+        yield _parse_blobs(rows)
+
+
+def _concat_blobs(chunks):
+    """Concatenate blob chunks.
+    
+    Args:
+        chunks (Iterable[tuple[:class:`numpy.ndarray`, list[int]]]):
+            Blob chunks and IDs as generated by :meth:`_iter_blobs`.
+
+    Returns:
+        :class:`numpy.ndarray`, list[int]: The combined blobs and IDs.
+
+    """
+    blobs = []
+    ids = []
+    for chunk, chunk_ids in chunks:
+        blobs.append(chunk)
+        ids.extend(chunk_ids)
+    if len(blobs) == 0:
+        return _parse_blobs([])
+    return np.concatenate(blobs) if len(blobs) > 1 else blobs[0], ids
+
+
+def _select_blobs(conn, where, params, chunk_size=None):
+    """Select blobs through a cursor that returns plain tuples.
+    
+    Args:
+        conn (:obj:`sqlite3.Connection`): Connection object.
+        where (str): ``WHERE`` clause conditions.
+        params (Sequence): Parameters for ``where``.
+        chunk_size (int): Number of rows per chunk; defaults to None to
+            use :const:`_FETCH_SIZE`.
+
+    Yields:
+        :obj:`np.ndarray`, List[int]: Blobs and blob IDs for each chunk
+        as given by :meth:`_parse_blobs`.
+
+    """
+    cur = conn.cursor()
+    cur.row_factory = None
+    cur.execute("SELECT {} FROM blobs WHERE {}".format(
+        _COLS_BLOBS_SELECT, where), params)
+    try:
+        yield from _iter_blobs(cur, chunk_size)
+    finally:
+        cur.close()
+
+
 def select_blobs_confirmed(cur, confirmed):
     """Selects ROIs from the given experiment
     
@@ -519,10 +624,8 @@ def select_blobs_confirmed(cur, confirmed):
     Returns:
         Blobs in the given ROI.
     """
-    cur.execute(
-        "SELECT {} FROM blobs WHERE confirmed = ?".format(_COLS_BLOBS), 
-        (confirmed, ))
-    return _parse_blobs(cur.fetchall())[0]
+    return _concat_blobs(_select_blobs(
+        cur.connection, "confirmed = ?", (confirmed, )))[0]
 
 
 def verification_stats(cur, exp_name, treat_maybes=0):
@@ -544,12 +647,8 @@ def verification_stats(cur, exp_name, treat_maybes=0):
     # and blobs within them
     exp = select_experiment(cur, exp_name)
     rois = select_rois(cur, exp[0][0])
-    blobs = []
-    for roi in rois:
-        #print("got roi_id: {}".format(roi[0]))
-        bb = config.db.select_blobs_by_roi(roi[0])[0]
-        blobs.extend(bb)
-    blobs = np.array(blobs)
+    blobs = _concat_blobs(
+        (b, i) for _, b, i in config.db.iter_blobs_by_rois(rois))[0]
     return verifier.meas_detection_accuracy(
         blobs, config.verified_db is not None, treat_maybes)
 
@@ -637,6 +736,64 @@ def _test_db():
     conn.close()
 
 
+def _benchmark_select_blobs_by_position(path, nblobs=5000000, shape=None,
+                                        roi_size=(50, 50, 10), nrois=100):
+    """Benchmark selecting blobs by position in a synthetic database.
+    
+    Args:
+        path (str): Path to the database to create.
+        nblobs (int): Number of blobs to insert; defaults to 5 million.
+        shape (List[int]): Image shape in x,y,z; defaults to None to use
+            a shape with about 1 blob per 20 voxels.
+        roi_size (List[int]): ROI size in x,y,z for each query.
+        nrois (int): Number of ROIs to query.
+
+    Returns:
+        float, float: Mean query times in seconds without and with the
+        position index.
+
+    """
+    from time import time
+    if shape is None:
+        side = int(round((nblobs * 40) ** (1 / 3)))
+        shape = (side, side, side // 2)
+    db = ClrDB()
+    db.load_db(path, True)
+    exp_id = insert_experiment(db.conn, db.cur, "benchmark")
+    roi_id, _ = insert_roi(db.conn, db.cur, exp_id, 0, (0, 0, 0), (0, 0, 0))
+    
+    # insert blobs at random, unique positions
+    rng = np.random.default_rng(0)
+    coords = np.unique(rng.integers(
+        0, shape, size=(nblobs, 3)), axis=0)[:, ::-1]
+    blobs = np.zeros((len(coords), 7))
+    blobs[:, :3] = coords
+    blobs[:, 3:6] = (1, -1, -1)
+    print("inserting {} blobs in shape {} (x,y,z)".format(len(blobs), shape))
+    db.cur.executemany(
+        "INSERT INTO blobs ({}) VALUES ({})".format(
+            _COLS_BLOBS, match_elements(_COLS_BLOBS, ", ", "?")),
+        ((roi_id, *b) for b in blobs.tolist()))
+    db.conn.commit()
+    offsets = rng.integers(0, np.subtract(shape, roi_size), size=(nrois, 3))
+    
+    def query():
+        start = time()
+        for offset in offsets:
+            db.select_blobs_by_position(roi_id, offset, roi_size)
+        return (time() - start) / nrois
+    
+    db.cur.execute("DROP INDEX blobs_position")
+    times = [query()]
+    _create_index_blobs(db.cur)
+    db.conn.commit()
+    times.append(query())
+    print("mean query times without and with position index (s): {}"
+          .format(times))
+    db.conn.close()
+    return times
+
+
 def load_truth_db(filename_base):
     """Convenience function to load a truth database associated with an 
     image.
@@ -768,9 +925,9 @@ class ClrDB:
 
         """
         self.cur.execute(
-            "SELECT {}, id FROM blobs WHERE roi_id = ? AND z = ? AND y = ? "
+            "SELECT {} FROM blobs WHERE roi_id = ? AND z = ? AND y = ? "
             "AND x = ? AND confirmed = ? AND truth = ? AND channel = ?"
-            .format(_COLS_BLOBS), (roi_id, *blob[:3], *blob[4:7]))
+            .format(_COLS_BLOBS_SELECT), (roi_id, *blob[:3], *blob[4:7]))
         return self._get_blob(self.cur.fetchall())
 
     def select_blob_by_id(self, blob_id):
@@ -784,8 +941,8 @@ class ClrDB:
 
         """
         self.cur.execute(
-            "SELECT {}, id FROM blobs WHERE id = ?"
-                .format(_COLS_BLOBS), (blob_id,))
+            "SELECT {} FROM blobs WHERE id = ?".format(_COLS_BLOBS_SELECT),
+            (blob_id,))
         return self._get_blob(self.cur.fetchall())
 
     def select_blobs_by_roi(self, roi_id):
@@ -799,11 +956,42 @@ class ClrDB:
             of blob IDs if available.
 
         """
-        self.cur.execute(
-            "SELECT {}, id FROM blobs WHERE roi_id = ?".format(_COLS_BLOBS),
-            (roi_id,))
-        return _parse_blobs(self.cur.fetchall())
+        return _concat_blobs(self.iter_blobs_by_roi(roi_id))
+    
+    def iter_blobs_by_roi(self, roi_id, chunk_size=None):
+        """Generate blobs from the given ROI in chunks.
+        
+        Allows processing blobs from large databases without loading the
+        full selection at once.
 
+        Args:
+            roi_id (int): ROI ID.
+            chunk_size (int): Number of blobs per chunk; defaults to None
+                to use :const:`_FETCH_SIZE`.
+
+        Yields:
+            :class:`numpy.ndarray`, list[int]: Blobs in each chunk and
+            their blob IDs.
+
+        """
+        yield from _select_blobs(
+            self.conn, "roi_id = ?", (roi_id,), chunk_size)
+    
+    def iter_blobs_by_rois(self, rois):
+        """Generate blobs for each ROI.
+        
+        Args:
+            rois (List[:obj:`sqlite3.Row`]): Sequence of ROI rows, such as
+                those from :meth:`select_rois`.
+
+        Yields:
+            :obj:`sqlite3.Row`, :class:`numpy.ndarray`, list[int]: The ROI
+            row, its blobs, and their blob IDs.
+
+        """
+        for roi in rois:
+            yield (roi, *self.select_blobs_by_roi(roi["id"]))
+    
     def select_blobs_by_position(self, roi_id, offset, size):
         """Select blobs from the given region defined by offset and size.
         
@@ -820,22 +1008,21 @@ class ClrDB:
             by coordinates. List of blob IDs if available.
         
         """
-        # convert ROI parameters to boundaries and flatten; str required for
-        # comparison for some reason
-        bounds = zip(offset, np.add(offset, size))
-        bounds = [str(b) for bound in bounds for b in bound]
-        self.cur.execute(
-            "SELECT {}, id FROM blobs WHERE roi_id = ? AND x >= ? AND x < ? "
-            "AND y >= ? AND y < ? AND z >= ? AND z < ?"
-            .format(_COLS_BLOBS), (roi_id, *bounds))
-        return _parse_blobs(self.cur.fetchall())
-
-    def insert_blob_matches(self, roi_id, matches):
+        # convert ROI parameters to integer boundaries in z,y,x order to
+        # match the position index
+        bounds = zip(offset[::-1], np.add(offset, size)[::-1])
+        bounds = [int(b) for bound in bounds for b in bound]
+        return _concat_blobs(_select_blobs(
+            self.conn, "roi_id = ? AND z >= ? AND z < ? "
+            "AND y >= ? AND y < ? AND x >= ? AND x < ?", (roi_id, *bounds)))
+
+    def insert_blob_matches(self, roi_id, matches, commit=True):
         """Insert blob matches.
         
         Args:
             roi_id (int): ROI ID.
             matches (:class:`magmap.cv.colocalizer.BlobMatch`): Blob matches object.
+            commit (bool): True to commit the insertion; defaults to True.
 
         Returns:
             list[int]: List of blob match IDs.
@@ -867,36 +1054,99 @@ class ClrDB:
                           "blob 2 ID {}".format(roi_id, blob1_id, blob2_id))
             else:
                 print("Could not find blobs for match:", match)
-        self.conn.commit()
+        if commit:
+            self.conn.commit()
         print("Blob matches inserted:", len(ids))
         return ids
     
-    def _parse_blob_matches(self, rows):
-        """Parse blob match selection.
+    def _fill_temp_ids(self, ids):
+        """Fill a temporary table with IDs for joins in place of long
+        ``IN`` clauses.
         
         Args:
-            rows (List[:obj:`sqlite3.Row`]): Sequence of rows.
+            ids (Sequence[int]): IDs to insert.
 
         Returns:
-            :class:`magmap.cv.colocalizer.BlobMatch`: Blob match object.
+            str: Name of the temporary table, which has a single ``id``
+            column.
 
         """
-        # build list of blob matches, which contain matching blobs and their
-        # distances, converting blob IDs to full blobs
-        matches = []
-        for row in rows:
-            matches.append((
-                self.select_blob_by_id(row["blob1"])[0],
-                self.select_blob_by_id(row["blob2"])[0], row["dist"]))
+        table = "temp.tmp_ids"
+        self.cur.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS tmp_ids (id INTEGER PRIMARY KEY)")
+        self.cur.execute("DELETE FROM {}".format(table))
+        self.cur.executemany(
+            "INSERT OR IGNORE INTO {} (id) VALUES (?)".format(table),
+            ((i,) for i in ids))
+        self.conn.commit()
+        return table
+    
+    def _clear_temp_ids(self):
+        """Clear the temporary IDs table filled by :meth:`_fill_temp_ids`."""
+        self.cur.execute("DELETE FROM temp.tmp_ids")
+        self.conn.commit()
+    
+    def _select_blob_matches_joined(self, where, params, join=""):
+        """Select blob matches along with both of their blobs in a single
+        query.
+        
+        Rows are streamed from the cursor into preallocated arrays rather
+        than selecting each matched blob separately.
+        
+        Args:
+            where (str): ``WHERE`` clause conditions, where the blob matches
+                table is aliased as ``m``.
+            params (Sequence): Parameters for ``where`` and ``join``.
+            join (str): Additional ``JOIN`` clause; defaults to an empty
+                string.
+
+        Returns:
+            :class:`magmap.cv.colocalizer.BlobMatch`: Blob match object,
+            which is empty if no matches are found.
+
+        """
+        from_clause = (
+            "FROM blob_matches AS m "
+            "JOIN blobs AS b1 ON m.blob1 = b1.id "
+            "JOIN blobs AS b2 ON m.blob2 = b2.id "
+            "{} WHERE {}".format(join, where))
         
-        if len(rows) > 0:
-            # convert to data frame to access by named columns
-            df = df_io.dict_to_data_frame(rows, records_cols=rows[0].keys())
-            blob_matches = colocalizer.BlobMatch(
-                matches, df["id"], df["roi_id"], df["blob1"], df["blob2"])
-        else:
-            blob_matches = colocalizer.BlobMatch()
-        return blob_matches
+        # use a separate cursor returning plain tuples to avoid row lookups
+        cur = self.conn.cursor()
+        cur.row_factory = None
+        cur.execute("SELECT COUNT(*) {}".format(from_clause), params)
+        nrows = cur.fetchone()[0]
+        if nrows == 0:
+            return colocalizer.BlobMatch()
+        
+        # fill preallocated array by batches of rows
+        nblob = len(_COLS_BLOB_ARR)
+        rows = np.empty((nrows, 5 + 2 * nblob))
+        cur.execute("SELECT {} {} ORDER BY m.id".format(
+            _COLS_BLOB_MATCHES_JOIN, from_clause), params)
+        i = 0
+        while i < nrows:
+            batch = cur.fetchmany(_FETCH_SIZE)
+            if not batch: break
+            rows[i:i + len(batch)] = batch
+            i += len(batch)
+        cur.close()
+        rows = rows[:i]
+        
+        ids = rows[:, :4].astype(int)
+        blobs1 = rows[:, 5:5 + nblob]
+        blobs2 = rows[:, 5 + nblob:]
+        cols = colocalizer.BlobMatch.Cols
+        df = df_io.dict_to_data_frame({
+            cols.MATCH_ID: ids[:, 0],
+            cols.ROI_ID: ids[:, 1],
+            cols.BLOB1_ID: ids[:, 2],
+            cols.BLOB1: list(blobs1),
+            cols.BLOB2_ID: ids[:, 3],
+            cols.BLOB2: list(blobs2),
+            cols.DIST: rows[:, 4],
+        })
+        return colocalizer.BlobMatch(df=df)
     
     def select_blob_matches(self, roi_id):
         """Select blob matches for the given ROI.
@@ -905,17 +1155,19 @@ class ClrDB:
             roi_id (int): ROI ID.
 
         Returns:
-            List[:obj:`BlobMatch`]: List of blob matches.
+            :class:`magmap.cv.colocalizer.BlobMatch`: Blob match object,
+            which is empty if not matches are found.
 
         """
-        self.cur.execute(
-            "SELECT {}, id FROM blob_matches WHERE roi_id = ?"
-            .format(_COLS_BLOB_MATCHES), (roi_id,))
-        return self._parse_blob_matches(self.cur.fetchall())
+        return self._select_blob_matches_joined("m.roi_id = ?", (roi_id,))
 
     def select_blob_matches_by_blob_id(self, row_id, blobn, blob_ids):
         """Select blob matches corresponding to the given blob IDs in the
         given blob column.
+        
+        Small sets of IDs are selected through an ``IN`` clause, while
+        larger sets are joined through a temporary table to avoid
+        exceeding the SQLite parameter limit.
 
         Args:
             row_id (int): Row ID.
@@ -928,27 +1180,27 @@ class ClrDB:
             which is empty if not matches are found.
 
         """
-        matches = []
+        if blobn not in (1, 2):
+            raise ValueError("blobn must be 1 or 2, got {}".format(blobn))
         if isinstance(blob_ids, np.ndarray):
             blob_ids = blob_ids.tolist()
-        max_params = 990  # max params of 999 in sqlite < v3.32.0
-        for i in range(len(blob_ids) // max_params + 1):
-            # select blob matches by block to avoid exceeding sqlite parameter
-            # limit
-            ids = blob_ids[i*max_params:(i+1)*max_params]
-            ids.insert(0, row_id)
-            self.cur.execute(
-                "SELECT {}, id FROM blob_matches WHERE roi_id = ?"
-                "AND blob{} IN ({})"
-                .format(_COLS_BLOB_MATCHES, blobn,
-                        ",".join("?" * (len(ids) - 1))),
-                ids)
-            df = self._parse_blob_matches(self.cur.fetchall()).df
-            if df is not None:
-                matches.append(df)
-        if len(matches) > 0:
-            return colocalizer.BlobMatch(df=df_io.data_frames_to_csv(matches))
-        return colocalizer.BlobMatch()
+        if len(blob_ids) == 0:
+            return colocalizer.BlobMatch()
+        
+        if len(blob_ids) <= _MAX_PARAMS:
+            return self._select_blob_matches_joined(
+                "m.roi_id = ? AND m.blob{} IN ({})".format(
+                    blobn, ",".join("?" * len(blob_ids))),
+                (row_id, *blob_ids))
+        
+        # join with temp table of IDs
+        table = self._fill_temp_ids(blob_ids)
+        try:
+            return self._select_blob_matches_joined(
+                "m.roi_id = ?", (row_id,),
+                "JOIN {} AS t ON m.blob{} = t.id".format(table, blobn))
+        finally:
+            self._clear_temp_ids()
 
 
 def main():
@@ -967,6 +1219,7 @@ def main():
     #merge_truth_dbs(config.filenames)
     #clean_up_blobs(config.truth_db)
     #_update_experiments(config.filename)
+    #_benchmark_select_blobs_by_position(config.db_name)
 
 
 if __name__ == "__main__":
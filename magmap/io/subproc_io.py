@@ -2,18 +2,143 @@
 # Author: David Young, 2020
 """File management using underlying system commands accessed through the
 Python :mod:`subprocess` module.
+
+Archives are compressed in-process with the ``zstandard`` library when it
+is available, falling back to the ``tar`` and ``pzstd`` shell commands.
 """
 
 import os
 import subprocess
+import tarfile
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 from magmap.io import libmag
+from magmap.settings import config
+
+#: int: Default ZSTD compression level, matching that of ``pzstd``.
+ZSTD_LEVEL = 3
+
+# errors from corrupted or truncated archives
+_INTEGRITY_ERRORS = (subprocess.CalledProcessError, tarfile.TarError, OSError)
+if zstandard is not None:
+    _INTEGRITY_ERRORS += (zstandard.ZstdError,)
+
+
+class _ProgressFile:
+    """Wrapper for a file-like object to report progress of reads or writes.
+    
+    Attributes:
+        fileobj (file): File-like object to wrap.
+        total (int): Total number of expected bytes.
+        fn_progress (func): Function taking the number of bytes processed
+            so far and :attr:`total`.
+        nbytes (int): Number of bytes processed so far.
+    
+    """
+    def __init__(self, fileobj, total, fn_progress):
+        self.fileobj = fileobj
+        self.total = total
+        self.fn_progress = fn_progress
+        self.nbytes = 0
+    
+    def _update(self, n):
+        self.nbytes += n
+        if self.fn_progress is not None:
+            self.fn_progress(min(self.nbytes, self.total), self.total)
+    
+    def read(self, size=-1):
+        data = self.fileobj.read(size)
+        self._update(len(data))
+        return data
+    
+    def write(self, data):
+        n = self.fileobj.write(data)
+        self._update(len(data))
+        return n
 
 
-def compress_file(path_in, path_out=None):
-    """Compress a file or files by tar archving and compressing with.
+def _get_paths_size(paths):
+    # get the total size of files in the given paths
+    size = 0
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                size += sum([os.path.getsize(os.path.join(root, f))
+                             for f in files])
+        else:
+            size += os.path.getsize(path)
+    return size
+
+
+def _get_zstd_threads(threads):
+    # get number of compression threads, where -1 uses all cores
+    if threads is None:
+        threads = -1 if config.cpus is None else config.cpus
+    return threads
+
+
+def _compress_zstd(paths, path_out, threads=None, level=ZSTD_LEVEL,
+                   fn_progress=None):
+    """Archive and compress files in-process with ``tarfile`` and
+    ``zstandard``.
+    
+    Args:
+        paths (List[str]): Input paths, archived by their basenames.
+        path_out (str): Output path.
+        threads (int): Number of compression threads; defaults to None
+            to use :attr:`config.cpus`, or all cores if not set.
+        level (int): Compression level; defaults to :const:`ZSTD_LEVEL`.
+        fn_progress (func): Function taking the number of uncompressed bytes
+            archived so far and the total; defaults to None.
+    
+    """
+    cctx = zstandard.ZstdCompressor(
+        level=level, threads=_get_zstd_threads(threads), write_checksum=True)
+    with open(path_out, "wb") as f:
+        with cctx.stream_writer(f, closefd=False) as writer:
+            progress = _ProgressFile(
+                writer, _get_paths_size(paths), fn_progress)
+            with tarfile.open(fileobj=progress, mode="w|") as tar:
+                for path in paths:
+                    tar.add(path, arcname=os.path.basename(path))
 
-    Assumes that ``tar`` and ``zstd`` are available shell commands.
+
+def _decompress_zstd(path_in, dir_out, fn_progress=None):
+    """Decompress and unarchive a file in-process with ``zstandard`` and
+    ``tarfile``.
+    
+    Args:
+        path_in (str): Input path.
+        dir_out (str): Output directory path.
+        fn_progress (func): Function taking the number of compressed bytes
+            read so far and the total; defaults to None.
+    
+    """
+    dctx = zstandard.ZstdDecompressor()
+    with open(path_in, "rb") as f:
+        progress = _ProgressFile(f, os.path.getsize(path_in), fn_progress)
+        # archives from pzstd consist of multiple frames
+        with dctx.stream_reader(
+                progress, read_across_frames=True) as reader:
+            with tarfile.open(fileobj=reader, mode="r|") as tar:
+                if hasattr(tarfile, "data_filter"):
+                    # avoid extracting files outside of the output directory
+                    tar.extractall(dir_out, filter="data")
+                else:
+                    tar.extractall(dir_out)
+
+
+def compress_file(path_in, path_out=None, threads=None, level=ZSTD_LEVEL,
+                  fn_progress=None, use_subprocess=False):
+    """Compress a file or files by tar archving and compressing with ZSTD.
+
+    Compresses in-process with multiple threads if ``zstandard`` is
+    available, otherwise assumes that ``tar`` and ``pzstd`` are available
+    shell commands.
 
     Args:
         path_in (str, List[str]): Input file path; can be a sequence of paths,
@@ -21,17 +146,30 @@ def compress_file(path_in, path_out=None):
             and the default ``path_out`` if none is given.
         path_out (str): Output file path; defaults to None to use the
             same path as ``path_in`` with ``.tar.zstd`` appended.
+        threads (int): Number of compression threads when compressing
+            in-process; defaults to None to use :attr:`config.cpus`.
+        level (int): Compression level when compressing in-process;
+            defaults to :const:`ZSTD_LEVEL`.
+        fn_progress (func): Function taking the number of uncompressed bytes
+            archived so far and the total when compressing in-process;
+            defaults to None.
+        use_subprocess (bool): True to compress with shell commands even
+            if ``zstandard`` is available; defaults to False.
+
+    Returns:
+        str: The output path.
 
     """
     tar_args = ["tar", "cfv", "-"]
     if libmag.is_seq(path_in):
         # set up sequence of paths, using the first path as template
         path_first = path_in[0]
-        tar_args.extend([os.path.basename(p) for p in path_in])
+        paths = path_in
     else:
         # set up a single path
         path_first = path_in
-        tar_args.append(os.path.basename(path_in))
+        paths = [path_in]
+    tar_args.extend([os.path.basename(p) for p in paths])
     if path_out is None:
         # default to using the first path for compressed file name
         path_out = os.path.splitext(path_first)[0] + ".tar.zst"
@@ -40,8 +178,12 @@ def compress_file(path_in, path_out=None):
     if not wd:
         wd = None
 
-    # archive with tar and pipe to zstd for compression
     print("Compressing \"{}\" to \"{}\"".format(path_in, path_out))
+    if zstandard is not None and not use_subprocess:
+        _compress_zstd(paths, path_out, threads, level, fn_progress)
+        return path_out
+
+    # archive with tar and pipe to zstd for compression
     tar = subprocess.Popen(
         tar_args, cwd=wd, stdout=subprocess.PIPE, bufsize=0)
     with open(path_out, "wb") as f:
@@ -53,13 +195,20 @@ def compress_file(path_in, path_out=None):
         stderr = zstd.communicate()[1]
         if stderr:
             print(stderr)
+    return path_out
 
 
-def test_compression(path):
+def test_compression(path, use_subprocess=False):
     """Test the integrity of a file compressed by ZSTD.
 
+    When testing in-process with ``zstandard``, the file is decompressed
+    to verify its frame checksums, and each archived file is read to check
+    that the archive is complete.
+
     Args:
         path (str): Path to compressed file.
+        use_subprocess (bool): True to test with shell commands even
+            if ``zstandard`` is available; defaults to False.
 
     Returns:
         bool: True if the integrity check completed without error; False
@@ -68,25 +217,44 @@ def test_compression(path):
     """
     print("Testing integrity of compressed file:", path)
     try:
-        subprocess.check_call(["pzstd", "-t", path])
+        if zstandard is not None and not use_subprocess:
+            dctx = zstandard.ZstdDecompressor()
+            with open(path, "rb") as f:
+                with dctx.stream_reader(f, read_across_frames=True) as reader:
+                    with tarfile.open(fileobj=reader, mode="r|") as tar:
+                        for member in tar:
+                            if member.isfile():
+                                data = tar.extractfile(member)
+                                while data.read(2 ** 20):
+                                    pass
+        else:
+            subprocess.check_call(["pzstd", "-t", path])
         print("Integrity test of \"{}\" completed without error".format(path))
         return True
-    except subprocess.CalledProcessError as e:
+    except _INTEGRITY_ERRORS as e:
         print(e)
         print("Error during compression integrity testing of", path)
     return False
 
 
-def decompress_file(path_in, dir_out=None):
+def decompress_file(path_in, dir_out=None, fn_progress=None,
+                    use_subprocess=False):
     """Decompress and unarchive a file.
 
     Assumes that the file has been archived by ``tar`` and compressed
-    by ``zstd``, both available as shell commands.
+    by ``zstd``. Decompresses in-process if ``zstandard`` is available,
+    otherwise assumes that ``tar`` and ``pzstd`` are available as shell
+    commands.
 
     Args:
         path_in (str): Input path.
         dir_out (str): Output directory path; defaults to None to output
             to the current directory.
+        fn_progress (func): Function taking the number of compressed bytes
+            read so far and the total when decompressing in-process;
+            defaults to None.
+        use_subprocess (bool): True to decompress with shell commands even
+            if ``zstandard`` is available; defaults to False.
 
     """
     tar_args = ["tar", "xvf", "-"]
@@ -97,6 +265,9 @@ def decompress_file(path_in, dir_out=None):
     else:
         dir_out = "."
     print("decompressing {} to {}".format(path_in, dir_out))
+    if zstandard is not None and not use_subprocess:
+        _decompress_zstd(path_in, dir_out, fn_progress)
+        return
     zst = subprocess.Popen(
         ["pzstd", "-dc", path_in], stdout=subprocess.PIPE, bufsize=0)
     tar = subprocess.Popen(tar_args, stdin=zst.stdout, bufsize=0)
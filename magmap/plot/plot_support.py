@@ -13,6 +13,7 @@ from matplotlib import gridspec
 from matplotlib import pyplot as plt
 from skimage import transform
 
+from magmap.cv import cv_nd
 from magmap.plot import colormaps
 from magmap.settings import config
 from magmap.io import libmag
@@ -396,6 +397,11 @@ def extract_planes(image5d, plane_n, plane=None, max_intens_proj=False):
     aspect, origin = get_aspect_ratio(plane)
     img3d = arrs_3d[0]
     img2d = img3d[plane_n]
+    if (plane is not None and plane != config.PLANE[0]
+            and isinstance(img2d, np.memmap) and img2d.ndim >= 3):
+        # copy stacks of orthogonal planes in blocks to avoid reading
+        # the memory-mapped file with large strides
+        img2d = cv_nd.transpose_blocked(img2d)
     if max_intens_proj:
         # max intensity projection assumes axis 0 is the "z" axis
         img2d = np.amax(img2d, axis=0)
@@ -864,6 +870,73 @@ def show():
     plt.show()
 
 
+def downsample_planes(img3d, factor):
+    """Downsample an image in ``y,x`` by block-means for 2D planes.
+    
+    The image is not downsampled along ``z`` so that it can be viewed
+    plane by plane. Partial blocks at the ends of ``y,x`` are padded by
+    their edge values so that the output has the same shape as strided
+    planes, ``img3d[:, ::factor, ::factor]``. Blocks are averaged in slabs
+    of planes to limit memory usage for memmapped images.
+    
+    Args:
+        img3d (:obj:`np.ndarray`): Image in ``z,y,x[,c]``.
+        factor (int): Downsampling factor in both ``y`` and ``x``.
+    
+    Returns:
+        :obj:`np.ndarray`: The downsampled image in the data type of
+        ``img3d``, rounded for integer types.
+    
+    """
+    shape = (img3d.shape[0], *[-(-n // factor) for n in img3d.shape[1:3]],
+             *img3d.shape[3:])
+    pad = [(0, 0), *[(0, n * factor - m) for n, m in zip(
+        shape[1:3], img3d.shape[1:3])], *[(0, 0)] * (img3d.ndim - 3)]
+    downsampled = np.empty(shape, dtype=img3d.dtype)
+    slab_size = 64
+    for z in range(0, shape[0], slab_size):
+        # average each block in the slab
+        slab = np.pad(np.asarray(
+            img3d[z:z + slab_size], dtype=np.float64), pad, mode="edge")
+        slab = slab.reshape(
+            (len(slab), shape[1], factor, shape[2], factor,
+             *shape[3:])).mean(axis=(2, 4))
+        if np.issubdtype(img3d.dtype, np.integer):
+            slab = np.round(slab)
+        downsampled[z:z + slab_size] = slab
+    return downsampled
+
+
+def make_plane_pyramid(img3d, max_size=None, nlevels=None):
+    """Make a pyramid of an image downsampled in ``y,x`` for 2D planes.
+    
+    Each level is downsampled by 2x block-means of the previous level
+    through :meth:`downsample_planes`.
+    
+    Args:
+        img3d (:obj:`np.ndarray`): Image in ``z,y,x[,c]``.
+        max_size (int): Stop once the largest side of a level is within
+            this size; defaults to None.
+        nlevels (int): Maximum number of levels, excluding the original
+            image; defaults to None to downsample until the largest side
+            is within ``max_size`` or a side cannot be halved further.
+    
+    Returns:
+        List[:obj:`np.ndarray`]: Sequence of downsampled images, each
+        downsampled by 2x from the previous one, in the data type of
+        ``img3d``, rounded for integer types.
+    
+    """
+    levels = []
+    src = img3d
+    while (nlevels is None or len(levels) < nlevels) and min(
+            src.shape[1:3]) > 1 and (
+            max_size is None or max(src.shape[1:3]) > max_size):
+        src = downsample_planes(src, 2)
+        levels.append(src)
+    return levels
+
+
 def get_downsample_max_sizes():
     """Get the maximum sizes by axis to keep an image within size limits
     during downsampling as set in the current atlas profile based on whether
@@ -167,7 +167,8 @@ zoom = 1.0  #: float: objective zoom
 # ``transpose`` transposes the Numpy image file associated with 
 # ``filename`` with the ``--rescale`` option. ``animated`` generates 
 # an animated GIF with the ``--interval`` and ``--rescale`` options. 
-# ``export_blobs`` exports blob coordinates/radii to compressed CSV file.
+# ``export_blobs`` exports blobs to a compressed table with named columns,
+# and ``export_blobs_csv`` exports blob coordinates/radii to compressed CSV.
 ProcessTypes = Enum(
     "ProcessTypes", (
         "IMPORT_ONLY",
@@ -179,10 +180,12 @@ ProcessTypes = Enum(
         "EXPORT_ROIS",
         "TRANSFORM",
         "ANIMATED",
-        "EXPORT_BLOBS",
+        "EXPORT_BLOBS",  # export blobs to a columnar table
+        "EXPORT_BLOBS_CSV",  # export blobs to a CSV file
         "EXPORT_PLANES",  # export a 3D+ image to individual planes
         "EXPORT_PLANES_CHANNELS",  # also export channels to separate files
         "EXPORT_RAW",  # export an array as a raw data file
+        "EXPORT_CHUNKED",  # export to a chunked, multiscale store
         "PREPROCESS",  # pre-process whole image
     )
 )
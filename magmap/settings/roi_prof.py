@@ -47,6 +47,11 @@ class ROIProfile(profiles.SettingsDict):
 
         self["vis_3d"] = "points"  # "points" or "surface" 3D visualization
         self["points_3d_thresh"] = 0.85  # frac of thresh (changed in v.0.6.6)
+        self["points_3d_max"] = 10000  # max num of 3D points to show
+        # num of blobs in ROI above which to aggregate 3D blobs into bins
+        # outside of a detail region, or None to always show all blobs
+        self["blobs_3d_lod_thresh"] = 20000
+        self["blobs_3d_lod_bin"] = 10  # size of aggregated blob bins in px
         self["channel_colors"] = (
             config.Cmaps.CMAP_GRBK_NAME, config.Cmaps.CMAP_RDBK_NAME)
         self["scale_bar_color"] = "w"
@@ -109,6 +114,8 @@ class ROIProfile(profiles.SettingsDict):
         # z,y,x tolerances for pruning duplicates in overlapped regions
         self["prune_tol_factor"] = (1, 1, 1)
         self["verify_tol_factor"] = (1, 1, 1)
+        # True to verify truth set ROIs in a multiprocessing pool
+        self["verify_mp"] = False
         
         # module level variable will take precedence
         self["sub_stack_max_pixels"] = (1000, 1000, 1000)
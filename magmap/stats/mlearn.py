@@ -8,7 +8,7 @@ from enum import Enum
 
 import numpy as np
 
-from magmap.settings import config
+from magmap.settings import config, roi_prof
 from magmap.io import libmag
 from magmap.io import df_io
 
@@ -26,7 +26,62 @@ class GridSearchStats(Enum):
     FDR = "FDR"  # false discovery rate
 
 
-def grid_search(roc_dict, fnc, *fnc_args):
+class GridSearchStages(Enum):
+    """Detection pipeline stages affected by hyperparameters, ordered
+    from upstream to downstream."""
+    BLOCKS = "Blocks"  # block processing sizes
+    PREPROCESS = "Preprocess"  # saturation and denoising
+    DETECT = "Detect"  # blob detection and later stages
+
+
+def get_param_stage(key):
+    """Get the earliest pipeline stage affected by a hyperparameter.
+    
+    Args:
+        key (str): :class:`magmap.settings.roi_prof.ROIProfile` key.
+
+    Returns:
+        :class:`GridSearchStages`: The pipeline stage.
+
+    """
+    if key in roi_prof.ROIProfile.BLOCK_SIZES or key == "exclude_border":
+        return GridSearchStages.BLOCKS
+    if key in roi_prof.ROIProfile.BLOB_PREPROCESSING:
+        return GridSearchStages.PREPROCESS
+    return GridSearchStages.DETECT
+
+
+def group_combos_by_stage(combos, stage=GridSearchStages.DETECT):
+    """Group hyperparameter combinations that share all parameters for the
+    stages upstream of the given stage.
+    
+    Combinations in each group can reuse outputs from the upstream stages,
+    such as preprocessed blocks when only detection settings change.
+    
+    Args:
+        combos (list[dict]): Sequence of hyperparameter combinations, each
+            given as a dictionary of profile keys to values.
+        stage (:class:`GridSearchStages`): Combinations are grouped by the
+            parameters of all stages before this stage; defaults to
+            :attr:`GridSearchStages.DETECT`.
+
+    Returns:
+        list[list[int]]: List of groups, each given as a list of indices
+        in ``combos``, with groups in order of first appearance.
+
+    """
+    stages = list(GridSearchStages)
+    upstream = stages[:stages.index(stage)]
+    groups = OrderedDict()
+    for i, combo in enumerate(combos):
+        # key by string representation to support sequence values
+        key = repr([(k, np.asarray(v).tolist()) for k, v in combo.items()
+                    if get_param_stage(k) in upstream])
+        groups.setdefault(key, []).append(i)
+    return list(groups.values())
+
+
+def grid_search(roc_dict, fnc, *fnc_args, combos_fnc=None):
     """Perform a grid search for hyperparameter optimization.
 
     A separate grid search will be performed for each item in ``roc_dict``.
@@ -40,6 +95,12 @@ def grid_search(roc_dict, fnc, *fnc_args):
         fnc (func): Function to call during the grid search, which must
             return ``stats, summaries``.
         *fnc_args: Arguments to pass to ``fnc``.
+        combos_fnc (func): Function to evaluate all hyperparameter
+            combinations of each grid search at once in place of ``fnc``,
+            such as to share stage outputs among combinations. Takes a list
+            of combinations, each as a dictionary of profile keys to values,
+            followed by ``fnc_args`` and must return a list of
+            ``stats, summaries`` for each combination. Defaults to None.
 
     Returns:
         :dict: Dictionary of stats suitable for parsing in
@@ -65,12 +126,15 @@ def grid_search(roc_dict, fnc, *fnc_args):
             else:
                 print("adding iterable setting {}".format(key2))
                 iterable_keys.append(key2)
-                
+        
+        # hyperparameter combinations given as tuples of the group name,
+        # last parameter value, and the values of all iterable parameters
+        combos = []
+        
         def grid_iterate(i, iterable_keys, grid_dict, name, parent_params):
             key = iterable_keys[i]
             name = key if name is None else name + "-" + key
             print("name: {}".format(name))
-            stats = []
             if i < len(iterable_keys) - 1:
                 name += "("
                 for j in grid_dict[key]:
@@ -88,21 +152,31 @@ def grid_search(roc_dict, fnc, *fnc_args):
                     grid_iterate(
                         i + 1, iterable_keys, grid_dict, name, parent_params)
             else:
-                # process each value in parameter array
-                stats = []
+                # gather each value in parameter array
                 last_param_vals = grid_dict[key]
                 for param in last_param_vals:
-                    print("===============================================\n"
-                          "Grid search hyperparameters {} for {}"
-                          .format(name, libmag.format_num(param, 3)))
                     settings[key] = param
-                    stat, summaries = fnc(*fnc_args)
-                    stats.append(stat)
-                    file_summaries.extend(summaries)
+                    combos.append((name, param, OrderedDict(
+                        (k, settings[k]) for k in iterable_keys)))
                 iterable_dict[name] = (
-                    stats, last_param_vals, key, parent_params)
+                    [], last_param_vals, key, parent_params)
         
         grid_iterate(0, iterable_keys, hyperparams, None, OrderedDict())
+        
+        # evaluate all combinations
+        if combos_fnc is None:
+            results = []
+            for name, param, combo in combos:
+                print("===============================================\n"
+                      "Grid search hyperparameters {} for {}"
+                      .format(name, libmag.format_num(param, 3)))
+                settings.update(combo)
+                results.append(fnc(*fnc_args))
+        else:
+            results = combos_fnc([c[2] for c in combos], *fnc_args)
+        for (name, _, _), (stat, summaries) in zip(combos, results):
+            iterable_dict[name][0].append(stat)
+            file_summaries.extend(summaries)
         stats_dict[key] = iterable_dict
     # summary of each file collected together
     for summary in file_summaries:
@@ -0,0 +1,77 @@
+# Chunked image storage unit testing
+# Copyright The MagellanMapper Contributors
+"""Unit testing for chunked, multiscale image storage."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from skimage import measure
+
+from magmap.io import chunked_io, importer
+
+
+class TestChunkedImage(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        rng = np.random.default_rng(0)
+        self.img = rng.integers(0, 4000, (2, 37, 45, 51, 2), dtype=np.uint16)
+        self.path = os.path.join(self.tmp_dir, "img.chunks")
+        self.chunked = chunked_io.save_chunked(
+            self.img, self.path, (1, 8, 16, 16))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_slices(self):
+        self.assertEqual(self.chunked.shape, self.img.shape)
+        self.assertEqual(self.chunked.dtype, self.img.dtype)
+        np.testing.assert_array_equal(np.asarray(self.chunked), self.img)
+        keys = (
+            0,
+            -1,
+            (1, 20),
+            (0, slice(3, 30), slice(None, None, 3), 7),
+            (slice(None), slice(30, 2, -4), slice(-20, None), slice(5, 6)),
+            (Ellipsis, 1),
+            (0, Ellipsis, slice(10, 40, 7), 0),
+            (slice(5, 5),),
+            (1, 36, 44, 50, 1),
+        )
+        for key in keys:
+            np.testing.assert_array_equal(
+                self.chunked[key], self.img[key], err_msg=str(key))
+        with self.assertRaises(IndexError):
+            self.chunked[2]
+
+    def test_levels(self):
+        self.assertEqual(self.chunked.nlevels, 4)
+        img = self.img
+        for level in range(1, self.chunked.nlevels):
+            # block-mean downsample after cropping to even sizes
+            shape = np.floor_divide(img.shape[1:4], 2) * 2
+            img = np.round(measure.block_reduce(
+                img[:, :shape[0], :shape[1], :shape[2]], (1, 2, 2, 2, 1),
+                np.mean)).astype(self.img.dtype)
+            np.testing.assert_array_equal(
+                np.asarray(self.chunked.get_level(level)), img)
+
+    def test_read_file(self):
+        # load the store in place of a missing NPY file
+        prefix = os.path.join(self.tmp_dir, "img")
+        path_img, path_meta = importer.make_filenames(prefix)
+        importer.save_image_info(
+            path_meta, ["img"], [self.img.shape], [(5., 1., 1.)], 1., 1.,
+            [0, 0], [4000, 4000])
+        chunked_io.save_chunked(
+            self.img, chunked_io.get_store_path(path_img), (1, 8, 16, 16))
+        img5d = importer.read_file(prefix, update_info=False)
+        self.assertIsInstance(img5d.img, chunked_io.ChunkedImage)
+        np.testing.assert_array_equal(img5d.img[0, 10:20], self.img[0, 10:20])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,127 @@
+# N-dimensional image processing unit testing
+# Copyright The MagellanMapper Contributors
+"""Unit testing for n-dimensional image processing."""
+
+import itertools
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from magmap.cv import cv_nd
+
+
+class TestTransposeBlocked(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _make_memmap(self, name, shape):
+        img = np.lib.format.open_memmap(
+            os.path.join(self.tmp_dir, "{}.npy".format(name)), mode="w+",
+            dtype=np.uint16, shape=shape)
+        img[:] = np.arange(img.size).reshape(shape)
+        return img
+
+    def test_transpose_blocked(self):
+        for shape in ((13, 17, 19), (1, 11, 9, 14, 2)):
+            img = self._make_memmap("img", shape)
+            for axes in itertools.permutations(range(len(shape))):
+                expected = np.transpose(img, axes)
+                out = self._make_memmap("out", expected.shape)
+                for max_bytes in (1, 64, 1000, None):
+                    out[:] = 0
+                    cv_nd.transpose_blocked(img, axes, out, max_bytes)
+                    np.testing.assert_array_equal(out, expected)
+
+    def test_transpose_blocked_views(self):
+        img = self._make_memmap("img", (1, 12, 15, 10))
+        
+        # flipped and already transposed views
+        flipped = np.flip(img, 2)
+        axes = (0, 3, 2, 1)
+        np.testing.assert_array_equal(
+            cv_nd.transpose_blocked(flipped, axes, max_bytes=100),
+            np.transpose(flipped, axes))
+        view = np.swapaxes(img, 1, 2)[:, 3:9]
+        np.testing.assert_array_equal(
+            cv_nd.transpose_blocked(view, max_bytes=100), view)
+
+
+def _make_labels(shape, label_ids, nboxes, seed=0):
+    # make a labels image from randomly placed boxes of the given labels
+    rng = np.random.default_rng(seed)
+    labels = np.zeros(shape, dtype=np.int32)
+    for _ in range(nboxes):
+        start = rng.integers(0, shape)
+        stop = start + rng.integers(1, np.divide(shape, 3).astype(int))
+        labels[tuple(slice(a, b) for a, b in zip(start, stop))] = \
+            rng.choice(label_ids)
+    return labels
+
+
+class TestLabelBBoxIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.label_ids = [0, 3, -7, 1000, 123456789]
+        self.labels = _make_labels((30, 40, 50), self.label_ids, 40)
+        self.bbox_index = cv_nd.LabelBBoxIndex(self.labels)
+
+    def _check_bboxes(self, label_ids):
+        # compare boxes from the index with those from region properties
+        for label_id in label_ids:
+            self.assertEqual(
+                self.bbox_index.get_bbox(label_id),
+                cv_nd.get_label_bbox(self.labels, label_id), label_id)
+
+    def test_get_bbox(self):
+        self._check_bboxes(self.label_ids + [5, self.label_ids[1:3]])
+        self.assertIsNone(self.bbox_index.get_bbox(5))
+        self.assertEqual(
+            cv_nd.get_label_bbox(self.labels, 3, self.bbox_index),
+            cv_nd.get_label_bbox(self.labels, 3))
+
+    def test_update(self):
+        rng = np.random.default_rng(1)
+        label_ids = self.label_ids + [42]
+        self._check_bboxes(label_ids)
+        for i in range(30):
+            # paint a box with an existing or new label
+            start = rng.integers(0, self.labels.shape)
+            stop = start + rng.integers(1, 12, 3)
+            slices = tuple(slice(a, b) for a, b in zip(start, stop))
+            self.labels[slices] = rng.choice(label_ids)
+            self.bbox_index.update(slices)
+            if i % 3 == 0:
+                # check after a few edits at a time
+                self._check_bboxes(label_ids)
+        
+        # overwrite a label completely
+        label_id = np.unique(self.labels)[-1]
+        bbox = self.bbox_index.get_bbox(label_id)
+        self.labels[self.labels == label_id] = 3
+        self.bbox_index.update(cv_nd.get_bbox_region(bbox)[1])
+        self._check_bboxes(label_ids)
+        self.assertIsNone(self.bbox_index.get_bbox(label_id))
+
+    def test_interpolate_label_between_planes(self):
+        # paint a label on two planes and interpolate between them
+        labels = np.copy(self.labels)
+        for img in (labels, self.labels):
+            img[5, 10:20, 10:20] = 42
+            img[15, 14:30, 12:25] = 42
+        self.bbox_index.update((slice(5, 16),))
+        cv_nd.interpolate_label_between_planes(labels, 42, 0, [5, 15])
+        cv_nd.interpolate_label_between_planes(
+            self.labels, 42, 0, [5, 15], self.bbox_index)
+        np.testing.assert_array_equal(self.labels, labels)
+        self._check_bboxes(self.label_ids + [42])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,154 @@
+# Image edit journal unit testing
+# Copyright The MagellanMapper Contributors
+"""Unit testing for journaling image edits."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import matplotlib
+matplotlib.use("Agg")
+from matplotlib import figure
+from matplotlib.widgets import Button
+import numpy as np
+import SimpleITK as sitk
+
+from magmap.gui import atlas_editor
+from magmap.io import edit_journal, sitk_io
+from magmap.settings import config
+
+
+class TestEditJournal(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.rng = rng
+        self.img = rng.integers(0, 50, (20, 30, 40), dtype=np.int32)
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, "labels.mhd")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _edit(self, img, journal, nedits):
+        # paint random boxes, marking each box in the journal
+        for _ in range(nedits):
+            start = [self.rng.integers(0, n) for n in img.shape]
+            stop = [self.rng.integers(s + 1, n + 1)
+                    for s, n in zip(start, img.shape)]
+            slices = tuple(slice(s, e) for s, e in zip(start, stop))
+            img[slices] = self.rng.integers(0, 100)
+            journal.mark(slices)
+
+    def test_replay(self):
+        # journal random edits over several saves and replay them onto
+        # the original image
+        img = np.copy(self.img)
+        journal = edit_journal.EditJournal()
+        journal_path = edit_journal.get_journal_path(self.path)
+        for _ in range(4):
+            self._edit(img, journal, 5)
+            self.assertTrue(journal.is_dirty())
+            self.assertGreater(journal.write(img, journal_path), 0)
+            self.assertFalse(journal.is_dirty())
+        
+        replayed = np.copy(self.img)
+        self.assertGreater(edit_journal.replay(replayed, journal_path), 0)
+        np.testing.assert_array_equal(replayed, img)
+        self.assertTrue(edit_journal.remove_journal(self.path))
+        self.assertFalse(edit_journal.remove_journal(self.path))
+
+    def test_truncated(self):
+        # ignore a final record truncated by an interrupted save
+        img = np.copy(self.img)
+        journal = edit_journal.EditJournal()
+        journal_path = edit_journal.get_journal_path(self.path)
+        self._edit(img, journal, 3)
+        journal.write(img, journal_path)
+        img_saved = np.copy(img)
+        
+        # a single box is journaled as a single record
+        self._edit(img, journal, 1)
+        self.assertEqual(len(journal.get_regions()), 1)
+        journal.write(img, journal_path)
+        with open(journal_path, "r+b") as f:
+            f.truncate(os.path.getsize(journal_path) - 5)
+        
+        replayed = np.copy(self.img)
+        edit_journal.replay(replayed, journal_path)
+        np.testing.assert_array_equal(replayed, img_saved)
+
+    def test_regions(self):
+        # merge adjacent planes with the same box
+        journal = edit_journal.EditJournal()
+        journal.mark((slice(2, 5), slice(1, 3), slice(4, 6)))
+        journal.mark((slice(5, 6), slice(1, 3), slice(4, 6)))
+        journal.mark((slice(8, 9), slice(0, 2), slice(0, 2)))
+        journal.mark((slice(8, 9), slice(3, 4), slice(5, 7)))
+        self.assertListEqual(journal.get_regions(), [
+            (slice(2, 6), slice(1, 3), slice(4, 6)),
+            (slice(8, 9), slice(0, 4), slice(0, 7)),
+        ])
+
+    def test_sitk_io(self):
+        # load edits journaled alongside a saved image
+        sitk.WriteImage(sitk.GetImageFromArray(self.img), self.path)
+        img = np.copy(self.img)
+        journal = edit_journal.EditJournal()
+        self._edit(img, journal, 5)
+        journal.write(img, edit_journal.get_journal_path(self.path))
+        img_sitk = sitk_io.read_sitk(self.path)[0]
+        np.testing.assert_array_equal(sitk.GetArrayFromImage(img_sitk), img)
+        
+        # saving the full image removes the journal
+        reg_name = os.path.basename(self.path)
+        sitk_io.write_registered_image(
+            img, self.tmp_dir, reg_name, img_sitk, overwrite=True)
+        self.assertFalse(os.path.exists(
+            edit_journal.get_journal_path(self.path)))
+        img_sitk = sitk_io.read_sitk(self.path)[0]
+        np.testing.assert_array_equal(sitk.GetArrayFromImage(img_sitk), img)
+
+    def test_atlas_editors(self):
+        # save edits from one Atlas Editor through another sharing its journal
+        config_orig = (
+            config.filename, config.labels_img_sitk,
+            config.reg_suffixes[config.RegSuffixes.ANNOTATION])
+        try:
+            config.filename = self.tmp_dir
+            config.labels_img_sitk = sitk.GetImageFromArray(self.img)
+            config.reg_suffixes[config.RegSuffixes.ANNOTATION] = (
+                os.path.basename(self.path))
+            img = np.copy(self.img)
+            journal = edit_journal.EditJournal()
+            eds = [atlas_editor.AtlasEditor(
+                None, img, None, None, None, labels_journal=journal)
+                for _ in range(2)]
+            for ed in eds:
+                ed.save_btn = Button(figure.Figure().add_subplot(), "Save")
+            
+            # first save writes the full image
+            self._edit(img, journal, 3)
+            eds[0].save_atlas(None)
+            self.assertEqual(journal.saved_path, self.path)
+            self.assertFalse(os.path.exists(
+                edit_journal.get_journal_path(self.path)))
+            
+            # edits marked through the first editor are journaled when
+            # saving from the second editor
+            self._edit(img, journal, 3)
+            eds[1].save_atlas(None)
+            self.assertFalse(journal.is_dirty())
+            self.assertTrue(os.path.exists(
+                edit_journal.get_journal_path(self.path)))
+            img_sitk = sitk_io.read_sitk(self.path)[0]
+            np.testing.assert_array_equal(
+                sitk.GetArrayFromImage(img_sitk), img)
+        finally:
+            (config.filename, config.labels_img_sitk,
+             config.reg_suffixes[config.RegSuffixes.ANNOTATION]) = config_orig
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,66 @@
+# Blobs export unit testing
+# Copyright The MagellanMapper Contributors
+"""Unit testing for exporting blobs to tables."""
+
+import os
+import shutil
+import tempfile
+from time import time
+import unittest
+
+import numpy as np
+
+from magmap.io import export_rois
+
+
+class TestExportBlobs(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, "sample.npy")
+        
+        # make formatted blobs with fractional radii and an extra column
+        rng = np.random.default_rng(0)
+        n = 20000
+        self.blobs = np.full((n, 11), -1.)
+        self.blobs[:, :3] = rng.integers(0, (500, 2000, 2000), (n, 3))
+        self.blobs[:, 3] = rng.random(n) * 5
+        self.blobs[:, 6] = rng.integers(0, 2, n)
+        self.blobs[:, 7:10] = self.blobs[:, :3] + 100
+        self.blobs[:, 10] = rng.integers(-300, 300, n)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_export_blobs(self):
+        start = time()
+        path = export_rois.export_blobs(
+            self.blobs, self.path, cols=["label_id"])
+        elapsed = time() - start
+        blobs, cols = export_rois.load_blobs_table(path)
+        np.testing.assert_array_equal(blobs, self.blobs)
+        self.assertEqual(blobs.dtype, self.blobs.dtype)
+        self.assertListEqual(
+            cols, [*export_rois.BLOB_COLS, "label_id"])
+        
+        # compare with the text export of the same columns
+        start = time()
+        np.savetxt(os.path.join(self.tmp_dir, "blobs.csv.gz"), self.blobs,
+                   delimiter=",")
+        self.assertGreater(time() - start, 3 * elapsed)
+        
+        # CSV export is limited to coordinates and radii
+        path = export_rois.export_blobs(self.blobs, self.path, "csv")
+        self.assertTrue(path.endswith(".csv.gz"))
+        blobs, cols = export_rois.load_blobs_table(path)
+        np.testing.assert_array_equal(blobs, self.blobs[:, :4])
+        self.assertListEqual(cols, ["z", "y", "x", "radius"])
+        
+        with self.assertRaises(ValueError):
+            export_rois.export_blobs(self.blobs, self.path, "txt")
+        with self.assertRaises(ValueError):
+            export_rois.export_blobs(self.blobs, self.path, cols=["a", "b"])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,74 @@
+# Stack export unit testing
+# Copyright The MagellanMapper Contributors
+"""Unit testing for exporting image stacks."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from skimage import io
+
+from magmap.io import cli, export_stack
+from magmap.settings import config
+
+
+class TestExportPlanes(unittest.TestCase):
+
+    def setUp(self):
+        cli.setup_roi_profiles(None)
+        self.tmp_dir = tempfile.mkdtemp()
+        self.config_orig = (config.filename, config.prefix, config.suffix,
+                            config.cpus)
+        config.prefix = None
+        config.suffix = None
+        
+        # read a multichannel image from a memmap as for loaded images
+        rng = np.random.default_rng(0)
+        path = os.path.join(self.tmp_dir, "img.npy")
+        np.save(path, rng.integers(
+            0, 4000, (1, 12, 25, 31, 2), dtype=np.uint16))
+        self.image5d = np.load(path, mmap_mode="r")
+
+    def tearDown(self):
+        (config.filename, config.prefix, config.suffix,
+         config.cpus) = self.config_orig
+        shutil.rmtree(self.tmp_dir)
+
+    def _export(self, cpus, ext, separate_chls):
+        # export planes to a separate directory for the number of workers
+        config.cpus = cpus
+        out_dir = os.path.join(self.tmp_dir, "cpus{}".format(cpus))
+        config.filename = os.path.join(out_dir, "img.npy")
+        paths = export_stack.export_planes(
+            self.image5d, ext, separate_chls=separate_chls)
+        self.assertListEqual(
+            sorted(paths), sorted(
+                [os.path.join(out_dir, f) for f in os.listdir(out_dir)]))
+        return paths, [io.imread(p) for p in paths], out_dir
+
+    def test_export_planes(self):
+        for ext, separate_chls in (("tif", False), ("png", True)):
+            paths, imgs, out_dir = self._export(1, ext, separate_chls)
+            paths_par, imgs_par, out_dir_par = self._export(
+                4, ext, separate_chls)
+            
+            # same file names and decoded planes by number of workers
+            self.assertListEqual(
+                [os.path.relpath(p, out_dir) for p in paths],
+                [os.path.relpath(p, out_dir_par) for p in paths_par])
+            nchls = self.image5d.shape[-1] if separate_chls else 1
+            self.assertEqual(len(paths), len(self.image5d[0]) * nchls)
+            for i, (img, img_par) in enumerate(zip(imgs, imgs_par)):
+                plane = self.image5d[0, i // nchls]
+                if separate_chls:
+                    plane = plane[..., i % nchls]
+                np.testing.assert_array_equal(img, plane)
+                np.testing.assert_array_equal(img_par, plane)
+            shutil.rmtree(out_dir)
+            shutil.rmtree(out_dir_par)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,190 @@
+# Image import unit testing
+# Copyright The MagellanMapper Contributors
+"""Unit testing for importing images into Numpy format."""
+
+import os
+import shutil
+import tempfile
+import tracemalloc
+import unittest
+from time import time
+
+import numpy as np
+from skimage import io
+
+from magmap.cv import chunking
+from magmap.io import cli, importer
+from magmap.settings import config
+
+
+class TestIntensityBounds(unittest.TestCase):
+
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+        # stream in small slabs to merge several slabs
+        self.slab_size = importer._STREAM_SLAB_SIZE
+        importer._STREAM_SLAB_SIZE = 5000
+
+    def tearDown(self):
+        importer._STREAM_SLAB_SIZE = self.slab_size
+
+    def _check_bounds(self, img, dim_channel=4):
+        bounds = importer.calc_intensity_bounds(img, dim_channel=dim_channel)
+        bounds_stream = importer.calc_intensity_bounds(
+            img, dim_channel=dim_channel, stream=True)
+        return bounds, bounds_stream
+
+    def test_int_bounds(self):
+        for dtype, high in ((np.uint8, 256), (np.uint16, 5000),
+                            (np.int32, 100000)):
+            img = self.rng.integers(0, high, (1, 13, 40, 50, 2), dtype=dtype)
+            bounds, bounds_stream = self._check_bounds(img)
+            self.assertEqual(bounds, bounds_stream)
+
+            # single channel image and plane
+            bounds, bounds_stream = self._check_bounds(img[..., 0])
+            self.assertEqual(bounds, bounds_stream)
+            bounds, bounds_stream = self._check_bounds(img[0, 0], 2)
+            self.assertEqual(bounds, bounds_stream)
+
+    def test_wide_int_bounds(self):
+        # wide range of int32 values exceeding the unique value limit
+        img = self.rng.integers(
+            -2 ** 30, 2 ** 30, (20, 512, 512), dtype=np.int32)
+        accum = importer.IntensityAccumulator(img.dtype)
+        max_unique = 0
+        start = time()
+        for plane in img:
+            accum.add(plane)
+            if accum._vals is not None:
+                max_unique = max(max_unique, len(accum._vals))
+        lows, highs = accum.percentile((0.5, 99.5))
+        self.assertLess(time() - start, 3)
+        self.assertLessEqual(
+            max_unique, importer.IntensityAccumulator.MAX_UNIQUE)
+        self.assertIsNone(accum._vals)
+
+        # check that the percentile ranks are within the tolerance
+        tol = importer.IntensityAccumulator.SKETCH_RANK_TOL
+        self.assertAlmostEqual(np.mean(img <= lows) * 100, 0.5, delta=tol)
+        self.assertAlmostEqual(np.mean(img <= highs) * 100, 99.5, delta=tol)
+
+    def test_float_bounds(self):
+        img = self.rng.normal(100, 20, (1, 13, 40, 50)).astype(np.float32)
+        lows, highs = importer.calc_intensity_bounds(img, stream=True)
+        
+        # check that the percentile ranks are within the tolerance
+        tol = importer.IntensityAccumulator.SKETCH_RANK_TOL
+        self.assertAlmostEqual(
+            np.mean(img <= lows[0]) * 100, 0.5, delta=tol)
+        self.assertAlmostEqual(
+            np.mean(img <= highs[0]) * 100, 99.5, delta=tol)
+
+
+class TestImportMultiplane(unittest.TestCase):
+
+    def setUp(self):
+        cli.setup_roi_profiles(None)
+        chunking.set_mp_start_method()
+        self.cpus = config.cpus
+        self.tmp_dir = tempfile.mkdtemp()
+        
+        # make a multichannel, multiplane RAW file
+        self.shape = (1, 11, 30, 40, 2)
+        rng = np.random.default_rng(0)
+        self.img = rng.integers(
+            0, 4000, self.shape[1:], dtype=np.uint16)
+        self.path = os.path.join(self.tmp_dir, "test.raw")
+        self.img.tofile(self.path)
+        self.import_md = dict.fromkeys(config.MetaKeys)
+        self.import_md[config.MetaKeys.SHAPE] = self.shape
+        self.import_md[config.MetaKeys.DTYPE] = "uint16"
+        self.import_md[config.MetaKeys.RESOLUTIONS] = (5., 1.2, 1.2)
+        self.import_md[config.MetaKeys.MAGNIFICATION] = 1.
+        self.import_md[config.MetaKeys.ZOOM] = 1.
+
+    def tearDown(self):
+        config.cpus = self.cpus
+        shutil.rmtree(self.tmp_dir)
+
+    def _import(self, name, cpus):
+        config.cpus = cpus
+        # use the same base name for identical metadata
+        os.mkdir(os.path.join(self.tmp_dir, name))
+        prefix = os.path.join(self.tmp_dir, name, "img")
+        img5d = importer.import_multiplane_images(
+            {importer._KEY_ANY_CHANNEL: [self.path]}, prefix, self.import_md)
+        with open(img5d.path_img, "rb") as f:
+            img_bytes = f.read()
+        md = importer.load_metadata(img5d.path_meta, assign=False)[0]
+        return img_bytes, md
+
+    def test_import_multiplane_parallel(self):
+        img_bytes, md = self._import("serial", 1)
+        img_bytes_mp, md_mp = self._import("parallel", 4)
+        self.assertEqual(img_bytes, img_bytes_mp)
+        path_img = importer.make_filenames(
+            os.path.join(self.tmp_dir, "serial", "img"))[0]
+        np.testing.assert_array_equal(np.load(path_img)[0], self.img)
+        
+        # metadata archives embed timestamps, so compare their contents
+        self.assertListEqual(list(md.keys()), list(md_mp.keys()))
+        for key, val in md.items():
+            np.testing.assert_array_equal(val, md_mp[key])
+
+
+class TestImportPlanes(unittest.TestCase):
+
+    def setUp(self):
+        self.cpus = config.cpus
+        self.tmp_dir = tempfile.mkdtemp()
+        
+        # make a directory of planes in two channels
+        self.img_dir = os.path.join(self.tmp_dir, "planes")
+        os.mkdir(self.img_dir)
+        rng = np.random.default_rng(0)
+        self.img = rng.integers(0, 4000, (40, 128, 96, 2), dtype=np.uint16)
+        for i, plane in enumerate(self.img):
+            for chl in range(plane.shape[-1]):
+                io.imsave(os.path.join(
+                    self.img_dir, "plane{:03d}{}{}.tif".format(
+                        i, importer.CHANNEL_SEPARATOR, chl)),
+                    plane[..., chl], check_contrast=False)
+        self.chl_paths, self.import_md = importer.setup_import_dir(
+            self.img_dir)
+        self.import_md[config.MetaKeys.RESOLUTIONS] = (5., 1.2, 1.2)
+
+    def tearDown(self):
+        config.cpus = self.cpus
+        shutil.rmtree(self.tmp_dir)
+
+    def _import(self, name, cpus):
+        config.cpus = cpus
+        tracemalloc.start()
+        img5d = importer.import_planes_to_stack(
+            self.chl_paths, os.path.join(self.tmp_dir, name), self.import_md)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        md = importer.load_metadata(img5d.path_meta, assign=False)[0]
+        return np.load(img5d.path_img), md, peak
+
+    def test_import_planes_threaded(self):
+        img, md, _ = self._import("serial", 1)
+        cpus = 4
+        img_mt, md_mt, peak = self._import("threaded", cpus)
+        np.testing.assert_array_equal(img[0], self.img)
+        np.testing.assert_array_equal(img, img_mt)
+        for key in ("near_min", "near_max", "sizes"):
+            np.testing.assert_array_equal(md[key], md_mt[key])
+        np.testing.assert_array_equal(
+            md["near_min"], np.amin(np.percentile(
+                self.img, 0.5, axis=(1, 2)), axis=0))
+        
+        # memory should be bounded by planes in flight rather than the stack
+        plane_nbytes = self.img[0, ..., 0].nbytes
+        self.assertLess(peak, 4 * 2 * cpus * plane_nbytes)
+        self.assertLess(peak, self.img.nbytes / 2)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
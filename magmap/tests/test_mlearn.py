@@ -0,0 +1,201 @@
+# Grid search unit testing
+# Copyright The MagellanMapper Contributors
+"""Unit testing for grid search hyperparameter tuning."""
+
+from collections import OrderedDict
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+from scipy import ndimage
+
+from magmap.cv import chunking, stack_detect
+from magmap.io import cli, importer, np_io, sqlite
+from magmap.settings import config
+from magmap.stats import mlearn
+
+
+def _detect():
+    # deterministic stats based on the current settings
+    settings = config.roi_profile
+    pos = 100
+    true_pos = int(80 * settings["clip_max"] - settings["num_sigma"])
+    false_pos = int(50 * settings["detection_threshold"] + 3)
+    return np.array((pos, true_pos, false_pos)), [
+        "{} {}".format(settings["clip_max"], settings["detection_threshold"])]
+
+
+def _detect_combos(combos):
+    # evaluate combinations in a different order than given
+    results = [None] * len(combos)
+    for group in mlearn.group_combos_by_stage(combos):
+        for i in reversed(group):
+            config.roi_profile.update(combos[i])
+            results[i] = _detect()
+    config.roi_profile.update(combos[-1])
+    return results
+
+
+class TestGridSearch(unittest.TestCase):
+
+    def setUp(self):
+        cli.setup_roi_profiles(None)
+        self.roc_dict = OrderedDict([
+            ("test", OrderedDict([
+                ("num_sigma", 5),
+                ("clip_max", np.arange(0.5, 0.9, 0.1)),
+                ("detection_threshold", np.arange(0.1, 0.5, 0.1)),
+            ])),
+        ])
+        self.cwd = os.getcwd()
+        self.tmp_dir = tempfile.mkdtemp()
+        os.chdir(self.tmp_dir)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmp_dir)
+
+    def test_param_stage(self):
+        self.assertIs(mlearn.get_param_stage("segment_size"),
+                      mlearn.GridSearchStages.BLOCKS)
+        self.assertIs(mlearn.get_param_stage("clip_max"),
+                      mlearn.GridSearchStages.PREPROCESS)
+        self.assertIs(mlearn.get_param_stage("detection_threshold"),
+                      mlearn.GridSearchStages.DETECT)
+
+        combos = [
+            {"clip_max": c, "detection_threshold": d}
+            for c in (0.5, 0.6) for d in (0.1, 0.2, 0.3)]
+        self.assertListEqual(
+            mlearn.group_combos_by_stage(combos), [[0, 1, 2], [3, 4, 5]])
+        self.assertListEqual(
+            mlearn.group_combos_by_stage(
+                combos, mlearn.GridSearchStages.PREPROCESS), [list(range(6))])
+
+    def test_grid_search_combos(self):
+        stats = mlearn.grid_search(self.roc_dict, _detect)
+        settings = dict(config.roi_profile)
+        dfs = mlearn.parse_grid_stats(stats)[1]
+
+        cli.setup_roi_profiles(None)
+        stats_combos = mlearn.grid_search(
+            self.roc_dict, _detect, combos_fnc=_detect_combos)
+        self.assertDictEqual(settings, dict(config.roi_profile))
+        dfs_combos = mlearn.parse_grid_stats(stats_combos)[1]
+
+        self.assertListEqual(list(stats["test"]), list(stats_combos["test"]))
+        for df, df_combos in zip(dfs, dfs_combos):
+            self.assertTrue(df.equals(df_combos))
+
+
+class TestGridSearchDetect(unittest.TestCase):
+
+    def setUp(self):
+        cli.setup_roi_profiles(None)
+        chunking.set_mp_start_method()
+        self.config_attrs = {
+            k: getattr(config, k) for k in (
+                "cpus", "filename", "image5d", "image5d_is_roi", "near_max",
+                "resolutions", "truth_db", "truth_db_mode", "verified_db")}
+        config.cpus = 2
+        self.cwd = os.getcwd()
+        self.tmp_dir = tempfile.mkdtemp()
+        os.chdir(self.tmp_dir)
+        
+        # make a stack of blurred points as blobs, split into several blocks
+        rng = np.random.default_rng(0)
+        shape = (12, 60, 60)
+        blobs_truth = np.zeros((40, 7))
+        blobs_truth[:, :3] = rng.integers(2, np.subtract(shape, 2), (40, 3))
+        blobs_truth[:, 3:6] = (2, 1, 1)
+        img = np.zeros(shape, dtype=np.float32)
+        img[tuple(blobs_truth[:, :3].astype(int).T)] = 1
+        img = ndimage.gaussian_filter(img, 1.5)
+        img += rng.random(shape).astype(np.float32) * img.max() / 10
+        config.image5d = img[None]
+        config.image5d_is_roi = False
+        config.near_max = [-1.0]
+        config.resolutions = np.ones((1, 3))
+        config.roi_profile.update({
+            "segment_size": 40, "denoise_size": 20, "min_sigma_factor": 1,
+            "max_sigma_factor": 2, "num_sigma": 5})
+        
+        # store the blobs as a truth set for the full image
+        self.path = os.path.join(self.tmp_dir, "img.npy")
+        config.filename = self.path
+        self.filename_base = importer.filename_to_base(self.path, 0)
+        config.truth_db = sqlite.ClrDB()
+        config.truth_db.load_db(os.path.join(self.tmp_dir, "truth.db"), True)
+        exp_id = sqlite.insert_experiment(
+            config.truth_db.conn, config.truth_db.cur,
+            sqlite.get_exp_name(self.filename_base))
+        roi_id, _ = sqlite.insert_roi(
+            config.truth_db.conn, config.truth_db.cur, exp_id, 0, (0, 0, 0),
+            shape[::-1])
+        sqlite.insert_blobs(
+            config.truth_db.conn, config.truth_db.cur, roi_id, blobs_truth)
+        config.truth_db.load_truth_blobs()
+        config.verified_db = sqlite.ClrDB()
+        config.verified_db.load_db(
+            os.path.join(self.tmp_dir, "verified.db"), True)
+        config.truth_db_mode = config.TruthDBModes.VERIFY
+        
+        self.combos = [
+            {"clip_max": c, "detection_threshold": d}
+            for c in (0.5, 0.8) for d in (0.05, 0.1)]
+
+    def tearDown(self):
+        config.truth_db.conn.close()
+        config.verified_db.conn.close()
+        for key, val in self.config_attrs.items():
+            setattr(config, key, val)
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmp_dir)
+
+    def test_detect_combos_preproc_cache(self):
+        # detect blobs separately for each combination
+        stats = []
+        blobs = []
+        for combo in self.combos:
+            config.roi_profile.update(combo)
+            stat, _, blobs_roi = stack_detect.detect_blobs_stack(
+                self.filename_base, None, None)
+            stats.append(stat)
+            blobs.append(blobs_roi.blobs)
+        
+        # detect blobs for all combinations, sharing preprocessed blocks
+        blobs_combos = []
+        detect_blobs_stack = stack_detect.detect_blobs_stack
+
+        def detect(*args, **kwargs):
+            out = detect_blobs_stack(*args, **kwargs)
+            blobs_combos.append(out[2].blobs)
+            return out
+
+        preprocess = stack_detect.StackDetector.preprocess_sub_rois
+        with mock.patch.object(np_io, "setup_images"), \
+                mock.patch.object(
+                    stack_detect, "detect_blobs_stack", side_effect=detect), \
+                mock.patch.object(
+                    stack_detect.StackDetector, "preprocess_sub_rois",
+                    side_effect=preprocess) as preprocess_mock:
+            results = cli._detect_subimgs_combos(
+                self.combos, self.path, 0, None, None)
+        
+        # preprocessing runs once for each distinct clip setting
+        self.assertEqual(preprocess_mock.call_count, 2)
+        self.assertEqual(len(results), len(self.combos))
+        for (stat_combo, _), stat, blobs_combo, blobs_sep in zip(
+                results, stats, blobs_combos, blobs):
+            self.assertGreater(len(blobs_sep), 0)
+            np.testing.assert_array_equal(stat_combo, stat)
+            np.testing.assert_array_equal(blobs_combo, blobs_sep)
+        self.assertFalse(all(
+            np.array_equal(blobs[0], b) for b in blobs[1:]))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,358 @@
+# Plot Editor unit testing
+# Copyright The MagellanMapper Contributors
+"""Unit testing for the Plot Editor."""
+
+import threading
+import unittest
+
+import matplotlib
+matplotlib.use("Agg")
+from matplotlib import figure
+from matplotlib.backend_bases import MouseEvent
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+import numpy as np
+from skimage import draw, measure
+
+from magmap.cv import cv_nd
+from magmap.gui import plot_editor
+from magmap.io import cli
+from magmap.plot import colormaps, plot_support
+from magmap.settings import config
+
+
+class _ArrayProxy:
+    """Array wrapper to count the bytes read through indexing."""
+    
+    def __init__(self, arr):
+        self.arr = arr
+        self.shape = arr.shape
+        self.dtype = arr.dtype
+        self.ndim = arr.ndim
+        self.nbytes_read = 0
+    
+    def __len__(self):
+        return len(self.arr)
+    
+    def __getitem__(self, key):
+        sub = np.array(self.arr[key])
+        self.nbytes_read += sub.nbytes
+        return sub
+
+
+class TestPlotEditorPyramid(unittest.TestCase):
+
+    def setUp(self):
+        cli.setup_roi_profiles(None)
+        rng = np.random.default_rng(0)
+        self.img3d = rng.integers(0, 1000, (5, 200, 180), dtype=np.uint16)
+
+    def _make_editor(self, img3d, max_size, pyramid=None):
+        # overlay labels of the same shape as the main image
+        plot_ed = plot_editor.PlotEditor(
+            None, img3d, np.zeros(img3d.shape, dtype=np.int32), None, "xy", 1,
+            None, None,
+            max_size=max_size, img3d_pyramid=pyramid)
+        plot_ed.coord = [3, 0, 0]
+        return plot_ed
+
+    def test_make_plane_pyramid(self):
+        pyramid = plot_support.make_plane_pyramid(self.img3d, max_size=30)
+        self.assertEqual(len(pyramid), 3)
+        prev = self.img3d
+        for level in pyramid:
+            # each level is a block-mean of the previous level, padding
+            # partial blocks by their edge values
+            pad = np.remainder(prev.shape[1:], 2)
+            expected = np.round(measure.block_reduce(
+                np.pad(prev, ((0, 0), (0, pad[0]), (0, pad[1])),
+                       mode="edge").astype(np.float64),
+                (1, 2, 2), np.mean)).astype(self.img3d.dtype)
+            np.testing.assert_array_equal(level, expected)
+            prev = level
+
+    def test_pyramid_overlay_shape(self):
+        # overlays strided from the full image align with pyramid planes
+        # for sizes not divisible by the downsampling factor
+        img3d = self.img3d[:, :197, :171]
+        for factor in (2, 4, 8):
+            level = plot_support.downsample_planes(img3d, factor)
+            self.assertEqual(
+                level.shape, img3d[:, ::factor, ::factor].shape)
+        
+        # skip finer levels as when only the coarsest level is built
+        nlevels = 2
+        pyramid = [None] * (nlevels - 1) + [
+            plot_support.downsample_planes(img3d, 2 ** nlevels)]
+        for max_size in (40, 30):
+            plot_ed = self._make_editor(img3d, max_size, pyramid)
+            self.assertEqual(plot_ed._pyramid_factor, 4)
+            self.assertEqual(
+                plot_ed._get_img2d(0, img3d).shape,
+                plot_ed._get_img2d(1, plot_ed.img3d_labels).shape)
+
+    def test_get_img2d_pyramid(self):
+        pyramid = plot_support.make_plane_pyramid(self.img3d, nlevels=3)
+        for max_size, nlevels, level, factor in (
+                (60, 3, 0, 2), (45, 3, 1, 4), (30, 3, 1, 4), (20, 3, 2, 8),
+                (30, 1, 0, 6)):
+            # take the coarsest level within the downsampling factor
+            proxy = _ArrayProxy(self.img3d)
+            plot_ed = self._make_editor(proxy, max_size, pyramid[:nlevels])
+            self.assertListEqual(plot_ed._downsample[:2], [factor] * 2)
+            img2d = plot_ed._get_img2d(0, proxy)
+            stride = factor // 2 ** (level + 1)
+            np.testing.assert_array_equal(
+                img2d, pyramid[level][3, ::stride, ::stride])
+            
+            # compare bytes read with strided planes from the full image
+            proxy_strided = _ArrayProxy(self.img3d)
+            plot_ed = self._make_editor(proxy_strided, max_size)
+            plot_ed._get_img2d(0, proxy_strided)
+            self.assertLess(proxy.nbytes_read, proxy_strided.nbytes_read)
+        
+        # no downsampling without a max size
+        plot_ed = self._make_editor(self.img3d, None, pyramid)
+        np.testing.assert_array_equal(
+            plot_ed._get_img2d(0, self.img3d), self.img3d[3])
+
+
+class TestPlaneCache(unittest.TestCase):
+
+    def setUp(self):
+        cli.setup_roi_profiles(None)
+        rng = np.random.default_rng(0)
+        self.img3d = rng.integers(0, 1000, (20, 60, 50), dtype=np.uint16)
+        self.labels = rng.integers(0, 10, (20, 60, 50), dtype=np.int32)
+        self.borders = rng.integers(0, 2, (10, 30, 25), dtype=np.int8)
+        self.plot_ed = plot_editor.PlotEditor(
+            None, self.img3d, self.labels, None, "xy", 1, None, None,
+            img3d_borders=self.borders, max_size=20)
+        self.imgs = (self.img3d, self.labels, self.borders)
+
+    def _scroll(self, zs):
+        # get planes in each image and check them against direct extraction
+        for z in zs:
+            self.plot_ed.coord = [z, 0, 0]
+            for i, img in enumerate(self.imgs):
+                img2d = self.plot_ed._get_img2d(i, img)
+                down = self.plot_ed._downsample[i]
+                np.testing.assert_array_equal(
+                    img2d, img[z * len(img) // len(self.img3d),
+                               ::down, ::down])
+            self.plot_ed.prefetch()
+            self.plot_ed.plane_cache.wait()
+
+    def test_prefetch(self):
+        cache = self.plot_ed.plane_cache
+        self._scroll(range(10))
+        self.assertEqual(cache.misses, len(self.imgs))
+        self.assertEqual(cache.hits, 9 * len(self.imgs))
+        
+        # jump beyond the cached planes and change direction, where only
+        # the lower resolution borders plane is cached in the first step
+        self._scroll(range(19, 14, -1))
+        self.assertEqual(cache.misses, 2 * len(self.imgs) + 2)
+        self.assertEqual(cache.hits, 12 * len(self.imgs) + 1)
+        
+        # edited labels are extracted again
+        self.labels[15] = 3
+        self.plot_ed.refresh_img3d_labels()
+        self._scroll([15])
+        self.assertEqual(cache.misses, 2 * len(self.imgs) + 3)
+
+    def test_cancel_stale(self):
+        # block the first prefetch while requesting others
+        extracted = []
+        started = threading.Event()
+        release = threading.Event()
+        
+        def get_plane(key):
+            if not extracted:
+                started.set()
+                release.wait()
+            extracted.append(key)
+            return np.array(key)
+        
+        cache = plot_editor.PlaneCache(get_plane)
+        cache.prefetch(range(5))
+        started.wait()
+        cache.prefetch(range(-1, -3, -1))
+        release.set()
+        cache.wait()
+        self.assertListEqual(extracted, [0, -1, -2])
+        self.assertIsNone(cache._thread)
+
+    def test_clear_before_store(self):
+        # clear the cache after a plane is extracted but before it is stored
+        cache = plot_editor.PlaneCache(np.array)
+        store = cache._store
+
+        def store_after_clear(*args, **kwargs):
+            cache.clear()
+            store(*args, **kwargs)
+
+        cache._store = store_after_clear
+        cache.prefetch([1, 2])
+        cache.wait()
+        self.assertEqual(len(cache._planes), 0)
+
+
+class TestMaxIntensProjCache(unittest.TestCase):
+
+    def test_mip_cache(self):
+        rng = np.random.default_rng(0)
+        for shape in ((23, 8, 9), (16, 5, 4, 2)):
+            img3d = rng.integers(0, 1000, shape, dtype=np.uint16)
+            for nplanes in (1, 2, 5, 8, 30):
+                # compare each window, scrolling forward and backward
+                mip_cache = plot_editor.MaxIntensProjCache(img3d, nplanes)
+                zs = list(range(len(img3d)))
+                for z in zs + zs[::-1]:
+                    np.testing.assert_array_equal(
+                        mip_cache.get(z), np.max(img3d[z:z + nplanes], axis=0))
+                self.assertLessEqual(mip_cache.planes_read, 2 * len(img3d))
+
+    def test_get_img2d_mip(self):
+        cli.setup_roi_profiles(None)
+        rng = np.random.default_rng(1)
+        img3d = rng.integers(0, 1000, (20, 60, 50), dtype=np.uint16)
+        plot_ed = plot_editor.PlotEditor(
+            None, img3d, None, None, "xy", 1, None, None, max_size=20)
+        down = plot_ed._downsample[0]
+        for nplanes in (4, 7):
+            for z in range(len(img3d)):
+                plot_ed.coord = [z, 0, 0]
+                np.testing.assert_array_equal(
+                    plot_ed._get_img2d(0, img3d, nplanes),
+                    np.max(img3d[z:z + nplanes, ::down, ::down], axis=0))
+            self.assertEqual(plot_ed._mip_cache.nplanes, nplanes)
+        
+        # replacing the image resets the cache
+        img3d = img3d[::-1]
+        plot_ed.coord = [3, 0, 0]
+        np.testing.assert_array_equal(
+            plot_ed._get_img2d(0, img3d, 4),
+            np.max(img3d[3:7, ::down, ::down], axis=0))
+
+
+class TestLabelsBBoxIndex(unittest.TestCase):
+
+    def setUp(self):
+        cli.setup_roi_profiles(None)
+
+    def test_paint_planes(self):
+        rng = np.random.default_rng(0)
+        for plane in config.PLANE:
+            labels = rng.integers(1, 4, (20, 30, 40), dtype=np.int32)
+            labels[:, :, 20:] = 0
+            bbox_index = cv_nd.LabelBBoxIndex(labels)
+            bbox_index.get_bbox(0)
+            
+            # paint a label in a transposed view of the labels image
+            labels_tr = plot_support.transpose_images(plane, [labels])[0][0]
+            plot_ed = plot_editor.PlotEditor(
+                None, np.zeros(labels_tr.shape, dtype=np.uint8), labels_tr,
+                None, plane, 1, None, None, labels_bbox_index=bbox_index)
+            for label_id in (5, 0, 5):
+                plot_ed.coord = [int(rng.integers(len(labels_tr))), 0, 0]
+                rr, cc = draw.circle(
+                    *rng.integers(0, labels_tr.shape[1:]), 4,
+                    labels_tr.shape[1:])
+                labels_tr[plot_ed.coord[0], rr, cc] = label_id
+                plot_ed._mark_labels_edited(rr, cc)
+                for i in range(6):
+                    self.assertEqual(
+                        bbox_index.get_bbox(i),
+                        cv_nd.get_label_bbox(labels, i), (plane, i))
+
+
+class TestLabelsEditHistory(unittest.TestCase):
+
+    def setUp(self):
+        cli.setup_roi_profiles(None)
+        self.rng = np.random.default_rng(0)
+        self.labels = self.rng.integers(1, 4, (20, 30, 40), dtype=np.int32)
+        self.history = plot_editor.LabelsEditHistory(self.labels)
+        cmap = colormaps.DiscreteColormap(
+            self.labels, 0, 255, False, 0, 255, min_any=0)
+        
+        # set up a Plot Editor for each plane sharing the history
+        self.fig = figure.Figure()
+        FigureCanvasAgg(self.fig)
+        self.plot_eds = []
+        for i, plane in enumerate(config.PLANE):
+            ax = self.fig.add_subplot(1, len(config.PLANE), i + 1)
+            img3d_tr, labels_tr = plot_support.transpose_images(
+                plane, [np.zeros(self.labels.shape, dtype=np.uint8),
+                        self.labels])[0]
+            plot_ed = plot_editor.PlotEditor(
+                ax, img3d_tr, labels_tr, cmap, plane, 1, None,
+                lambda *args: None, labels_history=self.history)
+            plot_ed.coord = [5, 0, 0]
+            plot_ed.edit_mode = True
+            # display the labels plane directly for painting
+            plot_ed._ax_img_labels = ax.imshow(
+                cmap.convert_img_labels(labels_tr[5]))
+            self.plot_eds.append(plot_ed)
+        self.fig.canvas.draw()
+
+    def _stroke(self, plot_ed, label_id):
+        # paint a label by a press, drag, and release with the mouse
+        def event(name, loc):
+            xdisp, ydisp = plot_ed.axes.transData.transform(loc)
+            return MouseEvent(name, self.fig.canvas, xdisp, ydisp, 1)
+        
+        plot_ed.radius = int(self.rng.integers(1, 4))
+        plot_ed.intensity_spec = label_id
+        shape = plot_ed.img3d_labels.shape[2:0:-1]
+        locs = self.rng.integers(0, shape, (5, 2))
+        plot_ed.on_press(event("button_press_event", locs[0]))
+        for loc in locs:
+            plot_ed.on_motion(event("motion_notify_event", loc))
+        plot_ed.on_release(event("button_release_event", locs[-1]))
+
+    def test_undo_redo(self):
+        # paint strokes in all planes, including repainting pixels
+        states = [np.copy(self.labels)]
+        for i in range(9):
+            self._stroke(self.plot_eds[i % 3], i + 10)
+            if not np.array_equal(self.labels, states[-1]):
+                states.append(np.copy(self.labels))
+        self.assertEqual(len(self.history._undo), len(states) - 1)
+        
+        # undo to the original image and redo to the last state
+        for state in states[-2::-1]:
+            self.assertIsNotNone(self.history.undo())
+            np.testing.assert_array_equal(self.labels, state)
+        self.assertFalse(self.history.can_undo())
+        self.assertIsNone(self.history.undo())
+        for state in states[1:]:
+            self.assertIsNotNone(self.history.redo())
+            np.testing.assert_array_equal(self.labels, state)
+        self.assertIsNone(self.history.redo())
+        
+        # a new stroke after undoing clears the redo history
+        self.history.undo()
+        self._stroke(self.plot_eds[0], 30)
+        self.assertFalse(self.history.can_redo())
+        self.history.undo()
+        np.testing.assert_array_equal(self.labels, states[-2])
+
+    def test_max_bytes(self):
+        # keep only the latest strokes within the memory limit
+        self.history.max_bytes = 2000
+        states = [np.copy(self.labels)]
+        for i in range(12):
+            self._stroke(self.plot_eds[i % 3], i + 10)
+            states.append(np.copy(self.labels))
+            self.assertLessEqual(self.history.nbytes, 2000)
+        nundo = len(self.history._undo)
+        self.assertTrue(0 < nundo < len(states) - 1)
+        for state in states[-2:-nundo - 2:-1]:
+            self.history.undo()
+            np.testing.assert_array_equal(self.labels, state)
+        self.assertFalse(self.history.can_undo())
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,85 @@
+# Atlas registration unit testing
+# Copyright The MagellanMapper Contributors
+"""Unit testing for measuring registered atlas images."""
+
+import glob
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+import SimpleITK as sitk
+
+from magmap.atlas import register
+from magmap.cv import chunking
+from magmap.io import cli, sitk_io
+from magmap.settings import config
+
+
+class TestVolumesById(unittest.TestCase):
+
+    def setUp(self):
+        cli.setup_roi_profiles(None)
+        chunking.set_mp_start_method()
+        self.cpus = config.cpus
+        config.cpus = 2
+        self.cwd = os.getcwd()
+        self.tmp_dir = tempfile.mkdtemp()
+        os.chdir(self.tmp_dir)
+
+        # write a small ontology with two labels under a root label
+        self.labels_ref_path = os.path.join(self.tmp_dir, "labels.json")
+        children = [
+            {"id": i, "name": "label{}".format(i), "acronym": str(i),
+             "st_level": 1, "parent_structure_id": 1, "children": []}
+            for i in (2, 3)]
+        with open(self.labels_ref_path, "w") as f:
+            json.dump({"msg": [{
+                "id": 1, "name": "root", "acronym": "root", "st_level": 0,
+                "parent_structure_id": None, "children": children}]}, f)
+
+        # write registered intensity and labels images for two samples
+        rng = np.random.default_rng(0)
+        self.paths = []
+        for i in range(2):
+            labels = np.zeros((6, 10, 12), dtype=np.int32)
+            labels[:, :5] = 2
+            labels[:, 5:, :4 + i] = 3
+            labels[:, 5:, 8:] = -3
+            imgs = {
+                config.RegNames.IMG_EXP.value: sitk.GetImageFromArray(
+                    rng.random(labels.shape).astype(np.float32)),
+                config.RegNames.IMG_LABELS.value:
+                    sitk.GetImageFromArray(labels),
+            }
+            path = os.path.join(self.tmp_dir, "sample{}.mhd".format(i))
+            sitk_io.write_reg_images(imgs, path)
+            self.paths.append(path)
+
+    def tearDown(self):
+        config.cpus = self.cpus
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmp_dir)
+
+    def _measure(self, prefetch):
+        # remove per-sample stats from prior runs so that images are measured
+        for path in glob.glob(os.path.join(self.tmp_dir, "*.csv")):
+            os.remove(path)
+        return register.volumes_by_id(
+            self.paths, self.labels_ref_path, prefetch=prefetch)
+
+    def test_volumes_by_id_prefetch(self):
+        df, df_all = self._measure(0)
+        df_prefetch, df_all_prefetch = self._measure(1)
+        self.assertGreater(len(df), 0)
+        self.assertListEqual(
+            sorted(df["Sample"].unique()), ["sample0", "sample1"])
+        pd.testing.assert_frame_equal(df, df_prefetch)
+        pd.testing.assert_frame_equal(df_all, df_all_prefetch)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,188 @@
+# ROI Editor unit testing
+# Copyright The MagellanMapper Contributors
+"""Unit testing for the ROI Editor blob circles."""
+
+import unittest
+
+import numpy as np
+from matplotlib import figure, patches
+from matplotlib.backend_bases import MouseEvent
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from magmap.gui import roi_editor
+
+
+def _make_figure():
+    # make a headless figure with an image to set the data limits
+    fig = figure.Figure()
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    ax.imshow(np.zeros((200, 200)))
+    return fig, ax
+
+
+class TestBlobCircles(unittest.TestCase):
+
+    def setUp(self):
+        # make non-overlapping blobs on a grid in z,y,x,r,confirmed,truth,chl
+        rng = np.random.default_rng(0)
+        coords = np.arange(10, 200, 20)
+        y, x = np.meshgrid(coords, coords, indexing="ij")
+        n = y.size
+        self.blobs = np.zeros((n, 7))
+        self.blobs[:, 1] = y.flatten()
+        self.blobs[:, 2] = x.flatten()
+        self.blobs[:, 3] = rng.uniform(3, 9, n)
+        self.blobs[:, 4] = -1
+        self.blobs[:, 5] = -1
+        self.updates = []
+        self.picked = []
+        self.fig, self.ax = _make_figure()
+        self.ncallbacks = self._count_callbacks()
+        self.blob_circles = roi_editor.BlobCircles(
+            self.ax, self._update_seg, self.picked, 1)
+        self.blob_circles.add(list(self.blobs), [":"] * n)
+        self.fig.canvas.draw()
+
+    def _update_seg(self, seg, seg_old=None, remove=False):
+        self.updates.append((np.copy(seg), seg_old, remove))
+        return seg
+
+    def _count_callbacks(self):
+        # count event handlers connected to the canvas
+        return {k: len(v) for k, v in
+                self.fig.canvas.callbacks.callbacks.items()}
+
+    def _event(self, name, x, y, key=None):
+        # make a mouse event at the given data coordinates
+        xdisp, ydisp = self.ax.transData.transform((x, y))
+        return MouseEvent(name, self.fig.canvas, xdisp, ydisp, 1, key)
+
+    def test_artists(self):
+        # all blobs share a single artist without separate event handlers
+        self.assertEqual(len(self.ax.collections), 1)
+        self.assertEqual(len(self.ax.patches), 0)
+        self.assertEqual(
+            len(self.ax.collections[0].get_paths()), len(self.blobs))
+        self.assertDictEqual(self._count_callbacks(), self.ncallbacks)
+
+    def test_get_blob_at(self):
+        # compare against picking with a circle artist for each blob
+        fig, ax = _make_figure()
+        circles = []
+        for blob in self.blobs:
+            circle = patches.Circle((blob[2], blob[1]), radius=blob[3])
+            circle.set_picker(circle.radius)
+            ax.add_patch(circle)
+            circles.append(circle)
+        fig.canvas.draw()
+
+        # sample points near blob centers or outside of blobs since the
+        # artists' pick tolerance in pixels shrinks their hit area
+        rng = np.random.default_rng(1)
+        for i, blob in enumerate(self.blobs):
+            angle = rng.uniform(0, 2 * np.pi)
+            for dist in (0, 0.3 * blob[3], 9.9):
+                x = blob[2] + dist * np.cos(angle)
+                y = blob[1] + dist * np.sin(angle)
+                xdisp, ydisp = ax.transData.transform((x, y))
+                event = MouseEvent(
+                    "button_press_event", fig.canvas, xdisp, ydisp)
+                expected = [j for j, c in enumerate(circles)
+                            if c.contains(event)[0]]
+                picked = self.blob_circles.get_blob_at(x, y)
+                if dist < 9.9:
+                    self.assertListEqual(expected, [i])
+                    self.assertEqual(picked, i)
+                else:
+                    # between blobs
+                    self.assertListEqual(expected, [])
+                    self.assertIsNone(picked)
+        self.assertIsNone(self.blob_circles.get_blob_at(-50, -50))
+
+    def test_pick(self):
+        # click to cycle the confirmation flag
+        blob = self.blobs[3]
+        self.blob_circles.on_press(
+            self._event("button_press_event", blob[2], blob[1]))
+        self.assertEqual(self.blob_circles.segments[3][4], 0)
+        self.assertEqual(len(self.updates), 1)
+        self.assertEqual(self.updates[0][1][4], -1)
+        np.testing.assert_array_equal(
+            self.ax.collections[0].get_facecolor()[3], (1, 0, 0, 0.5))
+
+        # ignore ctrl-clicks, which add blobs
+        self.blob_circles.on_press(
+            self._event("button_press_event", blob[2], blob[1], "control"))
+        self.assertEqual(len(self.updates), 1)
+
+        # delete the blob
+        self.blob_circles.on_press(
+            self._event("button_press_event", blob[2], blob[1], "d"))
+        self.assertEqual(len(self.blob_circles.segments), len(self.blobs) - 1)
+        self.assertEqual(
+            len(self.ax.collections[0].get_paths()), len(self.blobs) - 1)
+        self.assertTrue(self.updates[-1][2])
+        self.assertEqual(self.picked[-1][1], roi_editor.DraggableCircle.CUT)
+        self.assertIsNone(self.blob_circles.get_blob_at(blob[2], blob[1]))
+
+    def test_drag(self):
+        # shift-click to create a draggable circle only for the picked blob
+        blob = np.copy(self.blobs[5])
+        canvas = self.fig.canvas
+        self.blob_circles.on_press(self._event(
+            "button_press_event", blob[2], blob[1], "shift"))
+        self.assertEqual(len(self.ax.patches), 1)
+
+        # move the blob and release to remove the draggable circle
+        for name in ("motion_notify_event", "button_release_event"):
+            canvas.callbacks.process(name, self._event(
+                name, blob[2] + 4, blob[1], "shift"))
+        self.assertEqual(len(self.ax.patches), 0)
+        self.assertEqual(self.blob_circles.segments[5][2], blob[2] + 4)
+        np.testing.assert_array_equal(self.updates[-1][1], blob)
+        self.assertEqual(self.blob_circles.get_blob_at(
+            blob[2] + 4, blob[1]), 5)
+        self.assertDictEqual(self._count_callbacks(), self.ncallbacks)
+
+
+class TestROIEditorPaste(unittest.TestCase):
+
+    def setUp(self):
+        self.editor = roi_editor.ROIEditor()
+        self.fig = figure.Figure()
+        FigureCanvasAgg(self.fig)
+        self.axs = [self.fig.add_subplot(1, 2, i + 1) for i in range(2)]
+        self.blobs = np.zeros((2, 7))
+        self.blobs[:, 1:3] = ((10, 20), (30, 40))
+        self.blobs[:, 3] = 5
+        self.blobs[:, 4:6] = -1
+        self.updates = []
+
+    def _update_seg(self, seg, seg_old=None, remove=False):
+        self.updates.append((np.copy(seg), seg_old, remove))
+        return seg
+
+    def test_paste_cut(self):
+        # cut both blobs and paste them one at a time in another plane
+        blob_circles = self.editor._plot_circles(
+            self.axs[0], list(self.blobs), 1, ":", self._update_seg)
+        blob_circles.pick(0, "x")
+        blob_circles.pick(0, "x")
+        self.assertEqual(len(self.editor._circle_last_picked), 2)
+        axi = self.editor._z_planes_padding + 2
+        for blob in self.blobs[::-1]:
+            seg = self.editor._paste_circle(
+                self.axs[1], axi, self._update_seg)
+            np.testing.assert_array_equal(seg[1:], blob[1:])
+            self.assertEqual(seg[0], 2)
+            np.testing.assert_array_equal(self.updates[-1][1], blob)
+        self.assertEqual(len(self.editor._circle_last_picked), 0)
+        self.assertEqual(
+            len(self.editor._blob_circles[self.axs[1]].segments), 2)
+        self.assertIsNone(self.editor._paste_circle(
+            self.axs[1], axi, self._update_seg))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
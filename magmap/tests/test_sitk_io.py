@@ -0,0 +1,160 @@
+# SimpleITK I/O unit testing
+# Copyright The MagellanMapper Contributors
+"""Unit testing for SimpleITK image I/O."""
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import numpy as np
+import SimpleITK as sitk
+
+from magmap.io import sitk_io
+
+
+class TestMergeImages(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.reg_name = "exp.mhd"
+        
+        # write random images, some in a different shape to be resized
+        rng = np.random.default_rng(0)
+        self.paths = []
+        for i in range(6):
+            shape = (12, 15, 14) if i % 3 else (10, 15, 16)
+            img = sitk.GetImageFromArray(
+                rng.integers(0, 1000, shape).astype(np.float32))
+            path = os.path.join(self.tmp_dir, "sample{}.mhd".format(i))
+            sitk_io.write_reg_images({self.reg_name: img}, path)
+            self.paths.append(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_merge_images_stream(self):
+        # combine the full stack of images as a reference
+        img_nps = []
+        for path in self.paths:
+            sitk_io._load_reg_img_to_combine(path, self.reg_name, img_nps)
+        for fn_combine in (np.sum, np.mean, np.var):
+            for prefetch in (1, 3):
+                merged = sitk.GetArrayFromImage(sitk_io.merge_images(
+                    self.paths, self.reg_name, fn_combine=fn_combine,
+                    prefetch=prefetch))
+                np.testing.assert_allclose(
+                    merged, fn_combine(img_nps, axis=0), rtol=1e-10)
+        
+        # combine into channels from the full stack
+        merged = sitk.GetArrayFromImage(sitk_io.merge_images(
+            self.paths, self.reg_name, fn_combine=None))
+        np.testing.assert_array_equal(merged, np.stack(img_nps, axis=3))
+
+    def test_accumulator(self):
+        rng = np.random.default_rng(1)
+        imgs = rng.normal(50, 10, (20, 8, 9))
+        accum = sitk_io.ImageAccumulator(variance=True)
+        for img in imgs:
+            accum.add(img)
+        self.assertEqual(accum.count, len(imgs))
+        np.testing.assert_allclose(accum.sum, np.sum(imgs, axis=0))
+        np.testing.assert_allclose(accum.mean, np.mean(imgs, axis=0))
+        np.testing.assert_allclose(accum.variance, np.var(imgs, axis=0))
+        self.assertIsNone(sitk_io.ImageAccumulator().variance)
+
+
+class TestPrefetchLoader(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        
+        # write sample sets of registered images in different formats
+        rng = np.random.default_rng(0)
+        self.reg_names = ("exp.mhd", "annotation.nrrd")
+        self.paths = []
+        for i in range(8):
+            imgs = {
+                self.reg_names[0]: sitk.GetImageFromArray(
+                    rng.random((6, 10, 12)).astype(np.float32)),
+                self.reg_names[1]: sitk.GetImageFromArray(
+                    rng.integers(0, 20, (6, 10, 12)).astype(np.int32)),
+            }
+            path = os.path.join(self.tmp_dir, "sample{}.mhd".format(i))
+            sitk_io.write_reg_images(imgs, path)
+            self.paths.append(path)
+        
+        self.lock = threading.Lock()
+        self.started = 0
+        self.released = 0
+        self.max_resident = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _load(self, path):
+        # load a sample, tracking the number of samples resident at once
+        with self.lock:
+            self.started += 1
+            self.max_resident = max(
+                self.max_resident, self.started - self.released)
+        return [sitk_io.load_registered_img(path, n) for n in self.reg_names]
+
+    def _iter(self, loader):
+        # gather samples, releasing each before requesting the next one
+        samples = []
+        for i, sample in enumerate(loader):
+            samples.append(sample)
+            with self.lock:
+                self.released = i + 1
+        return samples
+
+    def test_prefetch_loader(self):
+        serial = [self._load(p) for p in self.paths]
+        for prefetch in (0, 1, 3):
+            self.started = self.released = self.max_resident = 0
+            samples = self._iter(sitk_io.PrefetchLoader(
+                self._load, [(p,) for p in self.paths], prefetch))
+            self.assertEqual(len(samples), len(serial))
+            for sample, sample_serial in zip(samples, serial):
+                for img, img_serial in zip(sample, sample_serial):
+                    np.testing.assert_array_equal(img, img_serial)
+            self.assertLessEqual(self.max_resident, prefetch + 1)
+        
+        # memory cap below a single sample prevents loading ahead
+        self.started = self.released = self.max_resident = 0
+        samples = self._iter(sitk_io.PrefetchLoader(
+            self._load, [(p,) for p in self.paths], 3, max_bytes=1))
+        self.assertEqual(len(samples), len(serial))
+        self.assertEqual(self.max_resident, 1)
+
+    def test_prefetch_loader_error(self):
+        # errors in the background thread are raised in order
+        paths = self.paths[:2] + [os.path.join(self.tmp_dir, "none.mhd")]
+        loader = sitk_io.PrefetchLoader(self._load, [(p,) for p in paths], 2)
+        samples = []
+        with self.assertRaises(FileNotFoundError):
+            for sample in loader:
+                samples.append(sample)
+        self.assertEqual(len(samples), 2)
+
+    def test_prefetch_loader_pause(self):
+        # no samples are loaded while paused, including partially loaded ones
+        loader = sitk_io.PrefetchLoader(
+            self._load, [(p,) for p in self.paths], 3)
+        samples = []
+        for sample in loader:
+            samples.append(sample)
+            loader.pause()
+            started = self.started
+            self.assertFalse(loader._loading)
+            time.sleep(0.05)
+            self.assertEqual(self.started, started)
+            loader.resume()
+        self.assertEqual(len(samples), len(self.paths))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
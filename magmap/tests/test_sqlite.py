@@ -0,0 +1,129 @@
+# Blob database unit testing
+# Copyright The MagellanMapper Contributors
+"""Unit testing for the blob database."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from magmap.cv import colocalizer
+from magmap.io import sqlite
+
+
+def _make_blobs(n, roi_id, chl=0, seed=0):
+    """Make blobs with unique coordinates in z,y,x,r,confirmed,truth,chl."""
+    rng = np.random.default_rng(seed)
+    coords = rng.choice(100 ** 3, n, replace=False)
+    blobs = np.zeros((n, 7))
+    blobs[:, :3] = np.column_stack(np.unravel_index(coords, (100,) * 3))
+    blobs[:, 3] = rng.random(n) * 5
+    blobs[:, 4] = -1
+    blobs[:, 5] = -1
+    blobs[:, 6] = chl
+    return blobs
+
+
+class TestClrDB(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db = sqlite.ClrDB()
+        self.db.load_db(os.path.join(self.tmp_dir, "test.db"), True)
+        exp_id = sqlite.insert_experiment(
+            self.db.conn, self.db.cur, "test_exp")
+        self.roi_id, _ = sqlite.insert_roi(
+            self.db.conn, self.db.cur, exp_id, 0, (0, 0, 0), (0, 0, 0))
+
+    def tearDown(self):
+        self.db.conn.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def _insert_matches(self, n):
+        # insert pairs of blobs in two channels and their matches
+        blobs1 = _make_blobs(n, self.roi_id, 0, 1)
+        blobs2 = _make_blobs(n, self.roi_id, 1, 2)
+        sqlite.insert_blobs(
+            self.db.conn, self.db.cur, self.roi_id, np.vstack((blobs1, blobs2)))
+        matches = colocalizer.BlobMatch(
+            [(b1, b2, i) for i, (b1, b2) in enumerate(zip(blobs1, blobs2))])
+        return self.db.insert_blob_matches(self.roi_id, matches)
+
+    def _check_matches(self, matches, match_ids):
+        cols = colocalizer.BlobMatch.Cols
+        self.assertEqual(len(matches.df), len(match_ids))
+        self.assertListEqual(
+            matches.df[cols.MATCH_ID.value].tolist(), sorted(match_ids))
+        for _, match in matches.df.iterrows():
+            # compare against blobs selected individually by ID
+            for blob_col, id_col in ((cols.BLOB1, cols.BLOB1_ID),
+                                     (cols.BLOB2, cols.BLOB2_ID)):
+                blob = self.db.select_blob_by_id(match[id_col.value])[0]
+                np.testing.assert_array_equal(match[blob_col.value], blob)
+
+    def test_select_blobs(self):
+        blobs = _make_blobs(250, self.roi_id)
+        blobs[::2, 4] = 1
+        sqlite.insert_blobs(self.db.conn, self.db.cur, self.roi_id, blobs)
+        blobs_db, ids = self.db.select_blobs_by_roi(self.roi_id)
+        self.assertEqual(len(ids), len(blobs))
+        np.testing.assert_array_equal(blobs_db[np.argsort(ids)], blobs)
+
+        # chunks should combine to the full selection
+        chunks = list(self.db.iter_blobs_by_roi(self.roi_id, 100))
+        self.assertListEqual([len(c[0]) for c in chunks], [100, 100, 50])
+        np.testing.assert_array_equal(
+            np.concatenate([c[0] for c in chunks]), blobs_db)
+        self.assertListEqual([i for c in chunks for i in c[1]], ids)
+
+        confirmed = sqlite.select_blobs_confirmed(self.db.cur, 1)
+        self.assertEqual(len(confirmed), len(blobs[::2]))
+        self.assertTrue(np.all(confirmed[:, 4] == 1))
+        blob, blob_id = self.db.select_blob_by_id(ids[3])
+        np.testing.assert_array_equal(blob, blobs_db[3])
+        self.assertEqual(blob_id, ids[3])
+        self.assertEqual(
+            self.db.select_blobs_by_roi(self.roi_id + 1)[0].shape, (0, 7))
+
+    def test_select_blobs_by_position(self):
+        blobs = _make_blobs(500, self.roi_id)
+        sqlite.insert_blobs(self.db.conn, self.db.cur, self.roi_id, blobs)
+        offset = np.array((20, 30, 10))  # x,y,z
+        size = np.array((50, 40, 60))
+        selected = self.db.select_blobs_by_position(
+            self.roi_id, offset, size)[0]
+        
+        # compare with blobs in the box, converting box to z,y,x
+        start = offset[::-1]
+        end = start + size[::-1]
+        mask = np.all((blobs[:, :3] >= start) & (blobs[:, :3] < end), axis=1)
+        self.assertGreater(np.sum(mask), 0)
+        np.testing.assert_array_equal(
+            np.unique(selected, axis=0), np.unique(blobs[mask], axis=0))
+
+    def test_select_blob_matches(self):
+        match_ids = self._insert_matches(50)
+        self._check_matches(self.db.select_blob_matches(self.roi_id), match_ids)
+        self.assertIsNone(self.db.select_blob_matches(self.roi_id + 1).df)
+
+    def test_select_blob_matches_by_blob_id(self):
+        # exceed the parameter limit to join through the temp table
+        match_ids = self._insert_matches(sqlite._MAX_PARAMS + 100)
+        blobs, blob_ids = self.db.select_blobs_by_roi(self.roi_id)
+        blob_ids = np.array(blob_ids)[blobs[:, 6] == 0]
+        matches = self.db.select_blob_matches_by_blob_id(
+            self.roi_id, 1, blob_ids)
+        self._check_matches(matches, match_ids)
+
+        # select a subset through the IN clause
+        matches = self.db.select_blob_matches_by_blob_id(
+            self.roi_id, 1, blob_ids[:10])
+        self.assertEqual(len(matches.df), 10)
+        self.assertIsNone(self.db.select_blob_matches_by_blob_id(
+            self.roi_id, 2, blob_ids).df)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
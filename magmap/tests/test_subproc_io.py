@@ -0,0 +1,92 @@
+# Compressed archive unit testing
+# Copyright The MagellanMapper Contributors
+"""Unit testing for compressing and decompressing archives."""
+
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from magmap.io import subproc_io
+
+
+def _get_checksums(path):
+    # get checksums of all files within a directory by relative path
+    checksums = {}
+    for root, _, files in os.walk(path):
+        for name in files:
+            file_path = os.path.join(root, name)
+            with open(file_path, "rb") as f:
+                checksums[os.path.relpath(file_path, path)] = hashlib.md5(
+                    f.read()).hexdigest()
+    return checksums
+
+
+@unittest.skipIf(subproc_io.zstandard is None, "zstandard is not installed")
+class TestCompressFile(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        
+        # make a directory of images and archives, along with a separate file
+        rng = np.random.default_rng(0)
+        self.dir_in = os.path.join(self.tmp_dir, "in", "sample")
+        os.makedirs(os.path.join(self.dir_in, "sub"))
+        for i in range(3):
+            np.save(os.path.join(self.dir_in, "img{}.npy".format(i)),
+                    rng.integers(0, 50, (10, 100, 100), dtype=np.uint16))
+        np.savez(os.path.join(self.dir_in, "sub", "blobs.npz"),
+                 segments=rng.random((500, 10)), ver=3)
+        self.path_extra = os.path.join(self.tmp_dir, "in", "extra.npy")
+        np.save(self.path_extra, rng.random((20, 20)))
+        self.checksums = _get_checksums(os.path.dirname(self.dir_in))
+        self.progress = []
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _fn_progress(self, nbytes, total):
+        self.progress.append((nbytes, total))
+
+    def _roundtrip(self, name, compress_subproc=False,
+                   decompress_subproc=False):
+        # compress and decompress the input files, checking the output
+        path_out = subproc_io.compress_file(
+            [self.dir_in, self.path_extra],
+            os.path.join(self.tmp_dir, "{}.tar.zst".format(name)), threads=2,
+            fn_progress=self._fn_progress, use_subprocess=compress_subproc)
+        self.assertTrue(subproc_io.test_compression(path_out))
+        dir_out = os.path.join(self.tmp_dir, name)
+        subproc_io.decompress_file(
+            path_out, dir_out, use_subprocess=decompress_subproc)
+        self.assertDictEqual(_get_checksums(dir_out), self.checksums)
+        return path_out
+
+    def test_compress_file(self):
+        path_out = self._roundtrip("out")
+        nbytes, total = self.progress[-1]
+        self.assertEqual(nbytes, total)
+        self.assertEqual(total, sum([
+            os.path.getsize(os.path.join(os.path.dirname(self.dir_in), p))
+            for p in self.checksums]))
+        self.assertListEqual(
+            [p[0] for p in self.progress], sorted(p[0] for p in self.progress))
+        
+        # truncated archives fail the integrity check
+        path_trunc = os.path.join(self.tmp_dir, "trunc.tar.zst")
+        with open(path_out, "rb") as f_in, open(path_trunc, "wb") as f_out:
+            f_out.write(f_in.read()[:os.path.getsize(path_out) // 2])
+        self.assertFalse(subproc_io.test_compression(path_trunc))
+
+    @unittest.skipIf(shutil.which("pzstd") is None, "pzstd is not installed")
+    def test_compress_file_subprocess(self):
+        # archives are interchangeable with those from shell commands
+        self._roundtrip("subproc_out", compress_subproc=True)
+        self._roundtrip("subproc_in", decompress_subproc=True)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
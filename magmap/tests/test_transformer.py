@@ -0,0 +1,96 @@
+# Image transformation unit testing
+# Copyright The MagellanMapper Contributors
+"""Unit testing for transforming large images."""
+
+import os
+import shutil
+import tempfile
+import tracemalloc
+import unittest
+
+import numpy as np
+
+from magmap.atlas import transformer
+from magmap.cv import chunking
+from magmap.io import cli, importer
+from magmap.settings import config
+
+
+class TestTransposeImg(unittest.TestCase):
+
+    def setUp(self):
+        cli.setup_roi_profiles(None)
+        cli.setup_atlas_profiles(None)
+        chunking.set_mp_start_method()
+        self.cpus = config.cpus
+        config.cpus = 2
+        self.tmp_dir = tempfile.mkdtemp()
+        self.prefix = os.path.join(self.tmp_dir, "img")
+        
+        # save a volume large enough to be rescaled in several chunks
+        rng = np.random.default_rng(0)
+        self.img = rng.integers(0, 1000, (1, 2000, 40, 30), dtype=np.uint16)
+        config.resolutions = np.array([[5., 1.2, 1.2]])
+        config.magnification = 1.
+        config.zoom = 1.
+        importer.save_np_image(self.img, self.prefix, 0)
+        
+        # stream intensity bounds in small slabs
+        self.slab_size = importer._STREAM_SLAB_SIZE
+        importer._STREAM_SLAB_SIZE = 2 ** 16
+
+    def tearDown(self):
+        config.cpus = self.cpus
+        importer._STREAM_SLAB_SIZE = self.slab_size
+        shutil.rmtree(self.tmp_dir)
+
+    def test_transpose_img_resize(self):
+        target_size = (20, 25, 1000)
+        tracemalloc.start()
+        transformer.transpose_img(self.prefix, 0, target_size=target_size)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        path_img = importer.make_filenames(
+            self.prefix, 0, modifier=transformer.make_modifier_resized(
+                target_size))[0]
+        resized = np.load(path_img)
+        
+        # resize all chunks before merging them as a reference
+        shape = self.img.shape[1:]
+        num_chunks = np.ceil(np.divide(shape, (100, 500, 500)))
+        max_pixels = np.ceil(np.divide(shape, num_chunks)).astype(int)
+        sub_roi_size = np.floor(
+            np.divide(target_size[::-1], num_chunks)).astype(int)
+        sub_roi_slices = chunking.stack_splitter(shape, max_pixels)[0]
+        self.assertGreater(sub_roi_slices.size, 1)
+        sub_rois = np.zeros_like(sub_roi_slices)
+        for coord in np.ndindex(sub_roi_slices.shape):
+            sub_rois[coord] = transformer.Downsampler.rescale_sub_roi(
+                coord, sub_roi_slices[coord], None, sub_roi_size, False,
+                self.img[0][sub_roi_slices[coord]])[1]
+        expected = np.zeros(
+            (1, *chunking.get_split_stack_total_shape(sub_rois)))
+        chunking.merge_split_stack2(sub_rois, None, 1, expected)
+        np.testing.assert_array_equal(resized, expected)
+        
+        # chunks should not be held in memory until merging
+        self.assertLess(peak, resized.nbytes / 2)
+
+    def test_transpose_img_plane(self):
+        img = self.img[:, :50]
+        importer.save_np_image(img, self.prefix, 0)
+        for plane, axes in ((config.PLANE[1], (0, 2, 1, 3)),
+                            (config.PLANE[2], (0, 3, 1, 2))):
+            config.resolutions = np.array([[5., 1.2, 1.2]])
+            transformer.transpose_img(self.prefix, 0, plane)
+            path_img = importer.make_filenames(
+                self.prefix, 0,
+                modifier=transformer.make_modifier_plane(plane))[0]
+            
+            # planes are transposed and flipped upside-down
+            expected = np.flip(np.transpose(img, axes), 2)
+            np.testing.assert_array_equal(np.load(path_img), expected)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
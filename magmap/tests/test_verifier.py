@@ -0,0 +1,77 @@
+# Blob verification unit testing
+# Copyright The MagellanMapper Contributors
+"""Unit testing for blob verification against truth sets."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from magmap.cv import verifier
+from magmap.io import cli, sqlite
+from magmap.settings import config
+
+
+class TestVerifyRois(unittest.TestCase):
+
+    def setUp(self):
+        cli.setup_roi_profiles(None)
+        self.cpus = config.cpus
+        config.cpus = 2
+        self.tmp_dir = tempfile.mkdtemp()
+
+        # make truth blobs and detections shifted by noise, with some
+        # missed and extra detections
+        rng = np.random.default_rng(0)
+        n = 300
+        self.blobs_truth = np.zeros((n, 7))
+        self.blobs_truth[:, :3] = rng.integers(0, (40, 100, 100), (n, 3))
+        self.blobs_truth[:, 3:6] = (1, 1, -1)
+        self.blobs = self.blobs_truth[20:].copy()
+        self.blobs[:, :3] += rng.integers(-1, 2, (len(self.blobs), 3))
+        self.blobs[:, 4] = -1
+        self.blobs = np.vstack((self.blobs, self.blobs_truth[:10] + 20))
+        self.rois = [
+            {"offset_x": x, "offset_y": y, "offset_z": z, "size_x": 40,
+             "size_y": 40, "size_z": 20, "series": 0}
+            for z in (0, 20) for y in (0, 50) for x in (0, 50)]
+
+    def tearDown(self):
+        config.cpus = self.cpus
+        shutil.rmtree(self.tmp_dir)
+
+    def _verify(self, name, parallel):
+        db = sqlite.ClrDB()
+        db.load_db(os.path.join(self.tmp_dir, "{}.db".format(name)), True)
+        exp_id = sqlite.insert_experiment(db.conn, db.cur, "test")
+        stats, _, df = verifier.verify_rois(
+            self.rois, self.blobs.copy(), self.blobs_truth.copy(),
+            np.array((3, 2, 2)), db, exp_id, "test", None, parallel)
+
+        # gather verified blobs and matches from each ROI
+        rois = sqlite.select_rois(db.cur, exp_id)
+        blobs = [db.select_blobs_by_roi(roi["id"])[0] for roi in rois]
+        matches = [db.select_blob_matches(roi["id"]).df for roi in rois]
+        db.conn.close()
+        return stats, df, rois, blobs, matches
+
+    def test_verify_rois_parallel(self):
+        serial = self._verify("serial", False)
+        parallel = self._verify("parallel", True)
+        self.assertEqual(serial[0], parallel[0])
+        self.assertTrue(serial[1].equals(parallel[1]))
+        self.assertListEqual(
+            [tuple(r) for r in serial[2]], [tuple(r) for r in parallel[2]])
+        for blobs_serial, blobs_parallel in zip(serial[3], parallel[3]):
+            np.testing.assert_array_equal(blobs_serial, blobs_parallel)
+        for df_serial, df_parallel in zip(serial[4], parallel[4]):
+            if df_serial is None:
+                self.assertIsNone(df_parallel)
+            else:
+                self.assertTrue(df_serial.equals(df_parallel))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,191 @@
+# 3D visualization unit testing
+# Copyright The MagellanMapper Contributors
+"""Unit testing for extracting 3D visualization data."""
+
+import copy
+import unittest
+from unittest import mock
+
+import numpy as np
+from skimage import filters, restoration
+
+from magmap.gui import vis_3d
+from magmap.io import cli, libmag
+from magmap.plot import plot_3d
+from magmap.settings import config
+
+
+def _get_3d_points_loops(roi, channel, flipz=False, offset=None):
+    # reference points from the prior loop-based coordinate generation
+    roi = plot_3d.saturate_roi(roi, clip_vmax=98.5, channel=channel)
+    roi = np.clip(roi, 0.2, 0.8)
+    roi = restoration.denoise_tv_chambolle(roi, weight=0.1)
+    shape = roi.shape
+    isotropic = plot_3d.get_isotropic_vis(config.roi_profile)
+    z = np.ones((shape[0], shape[1] * shape[2]))
+    for i in range(shape[0]):
+        z[i] = z[i] * i
+    if flipz:
+        z *= -1
+        if offset is not None:
+            offset = np.copy(offset)
+            offset[0] *= -1
+    y = np.ones((shape[0] * shape[1], shape[2]))
+    for i in range(shape[0]):
+        for j in range(shape[1]):
+            y[i * shape[1] + j] = y[i * shape[1] + j] * j
+    x = np.ones((shape[0] * shape[1], shape[2]))
+    for i in range(shape[0] * shape[1]):
+        x[i] = np.arange(shape[2])
+    if offset is not None:
+        offset = np.multiply(offset, isotropic)
+    coords = [z, y, x]
+    for i, _ in enumerate(coords):
+        coords[i] *= isotropic[i]
+        if offset is not None:
+            coords[i] += offset[i]
+    
+    points = []
+    multichannel, channels = plot_3d.setup_channels(roi, channel, 3)
+    for chl in channels:
+        roi_show = roi[..., chl] if multichannel else roi
+        roi_show_1d = roi_show.reshape(roi_show.size)
+        thresh = filters.threshold_otsu(roi_show, 64)
+        thresh *= config.get_roi_profile(chl)["points_3d_thresh"]
+        remove = np.where(roi_show_1d < thresh)
+        roi_show_1d = libmag.normalize(np.delete(roi_show_1d, remove), 0.6, 1.0)
+        coords_chl = np.column_stack(
+            [np.delete(c.reshape(-1), remove) for c in coords])
+        points.append((chl, coords_chl, roi_show_1d))
+    return points
+
+
+class TestGet3dPoints(unittest.TestCase):
+
+    def setUp(self):
+        cli.setup_roi_profiles(None)
+        config.roi_profile["isotropic_vis"] = (2, 1, 1.5)
+        self.resolutions = config.resolutions
+        self.near_max = config.near_max
+        config.resolutions = np.array([[5., 0.8, 1.]])
+        config.near_max = [0.5, 0.9]
+        rng = np.random.default_rng(0)
+        self.roi = rng.random((6, 9, 11, 2))
+
+    def tearDown(self):
+        config.resolutions = self.resolutions
+        config.near_max = self.near_max
+
+    def test_get_3d_points(self):
+        for channel, flipz, offset in (
+                ([0], False, None), (None, True, (3, 4, 5)),
+                ([1], False, (2, 0, 1))):
+            points = vis_3d.get_3d_points(
+                self.roi, channel, flipz, offset, max_points=0)
+            points_ref = _get_3d_points_loops(self.roi, channel, flipz, offset)
+            self.assertEqual(len(points), len(points_ref))
+            for (chl, coords, scalars), (chl_ref, coords_ref, scalars_ref) in \
+                    zip(points, points_ref):
+                self.assertEqual(chl, chl_ref)
+                np.testing.assert_array_equal(coords, coords_ref)
+                np.testing.assert_array_equal(scalars, scalars_ref)
+
+    def test_get_3d_points_decimate(self):
+        chl, coords, scalars = vis_3d.get_3d_points(
+            self.roi, [0], max_points=0)[0]
+        
+        # take every n-th point to stay within the max
+        max_points = len(scalars) // 3
+        points = vis_3d.get_3d_points(self.roi, [0], max_points=max_points)
+        self.assertLessEqual(len(points[0][2]), max_points)
+        step = int(np.ceil(len(scalars) / max_points))
+        np.testing.assert_array_equal(points[0][1], coords[::step])
+        np.testing.assert_array_equal(points[0][2], scalars[::step])
+
+    def test_get_3d_points_max_by_channel(self):
+        # limit the points of each channel by its own profile
+        points_all = vis_3d.get_3d_points(self.roi, None, max_points=0)
+        roi_profiles = config.roi_profiles
+        try:
+            config.roi_profiles = [
+                copy.copy(config.roi_profile) for _ in points_all]
+            max_pts = (0, len(points_all[1][2]) // 4)
+            for prof, max_pt in zip(config.roi_profiles, max_pts):
+                prof["points_3d_max"] = max_pt
+            points = vis_3d.get_3d_points(self.roi, None)
+        finally:
+            config.roi_profiles = roi_profiles
+        self.assertEqual(len(points[0][2]), len(points_all[0][2]))
+        self.assertLessEqual(len(points[1][2]), max_pts[1])
+        self.assertLess(len(points[1][2]), len(points_all[1][2]))
+
+
+class TestBinBlobs(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.coords = rng.random((5000, 3)) * (50, 200, 200)
+        self.resolutions = config.resolutions
+        config.resolutions = np.array([[5., 0.8, 1.]])
+
+    def tearDown(self):
+        config.resolutions = self.resolutions
+
+    def test_bin_blobs(self):
+        offset, size = (10, 50, 50), (20, 100, 100)
+        detail_mask, centers, counts = vis_3d.bin_blobs(
+            self.coords, 10, offset, size)
+        
+        # blobs in the detail box pass through, and others are all binned
+        in_box = np.all((self.coords >= offset) & (
+            self.coords < np.add(offset, size)), axis=1)
+        np.testing.assert_array_equal(detail_mask, in_box)
+        self.assertEqual(np.sum(counts), np.sum(~in_box))
+        self.assertEqual(len(centers), len(counts))
+        self.assertLess(len(counts), np.sum(~in_box))
+
+    def test_bin_blobs_no_detail(self):
+        coords_avg = self.coords * 2
+        detail_mask, centers, counts = vis_3d.bin_blobs(
+            self.coords, (25, 100, 100), coords_avg=coords_avg)
+        self.assertFalse(np.any(detail_mask))
+        self.assertEqual(len(counts), 8)
+        self.assertEqual(np.sum(counts), len(self.coords))
+        
+        # centers should be the mean of the given coordinates in each bin
+        bins = np.floor_divide(self.coords, (25, 100, 100)).astype(int)
+        for bin_, center in zip(np.unique(bins, axis=0), centers):
+            np.testing.assert_allclose(
+                center, np.mean(coords_avg[np.all(bins == bin_, axis=1)],
+                                axis=0))
+
+    def test_show_blobs_detail(self):
+        # show blobs in the default detail box after flipping and scaling
+        cli.setup_roi_profiles(None)
+        config.roi_profile["isotropic_vis"] = (2, 1, 1.5)
+        config.roi_profile["blobs_3d_lod_thresh"] = 100
+        roi_size = (50, 200, 200)
+        segs = np.zeros((len(self.coords), 7))
+        segs[:, :3] = self.coords
+        segs[:, 3] = 2
+        scene = mock.MagicMock()
+        vis = vis_3d.Vis3D(scene)
+        # mask points in the full set of blobs but not in the detail region
+        vis._MASK_DIVIDEND = 2000
+        vis.show_blobs(
+            segs, np.ones(len(segs), dtype=bool), np.zeros((len(segs), 4)),
+            np.zeros(3, dtype=int), roi_size, flipz=True)
+        
+        # the blobs glyph shows only the blobs in the central half of the ROI
+        calls = [c for c in scene.mlab.points3d.call_args_list
+                 if c.kwargs.get("resolution") == 50]
+        self.assertEqual(len(calls), 1)
+        in_box = np.all((self.coords >= np.divide(roi_size, 4)) & (
+            self.coords < np.multiply(roi_size, 0.75)), axis=1)
+        self.assertGreater(np.sum(in_box), 0)
+        self.assertEqual(len(calls[0].args[3]), np.sum(in_box))
+        self.assertEqual(calls[0].kwargs["mask_points"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)